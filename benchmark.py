@@ -0,0 +1,278 @@
+import argparse
+import json
+import math
+import platform
+import random
+import sys
+import time
+import numpy as np
+from grid import HashGrid
+from linear import LinearQuadtree
+from node import Quadtree
+from parallel import ParallelStepper
+from particle import ParticleSystem
+
+BROAD_PHASES = {"quadtree": Quadtree, "grid": HashGrid, "linear": LinearQuadtree}
+
+
+# Seed both random generators used by the simulation.
+def seed(value):
+    random.seed(value)
+    np.random.seed(value)
+
+
+# Zone whose area is covered by count particles of the given radius at the given density (fraction of the area).
+def make_system(shape, count, density, radius, broad_phase):
+    area = count * math.pi * radius * radius / density
+    particle_system = ParticleSystem()
+    if shape == "circle":
+        size = math.sqrt(area / math.pi)
+        particle_system.make_circle(size, size, size, BROAD_PHASES[broad_phase])
+    else:
+        size = math.sqrt(area)
+        particle_system.make_rectangle(size / 2, size / 2, size, size, BROAD_PHASES[broad_phase])
+    return particle_system
+
+
+# Best time of a function over the repeats (each one gets a fresh state from setup, released by teardown).
+def timed(setup, function, repeats, teardown=None):
+    best = math.inf
+    for i in range(repeats):
+        state = setup()
+        try:
+            start = time.perf_counter()
+            function(state)
+            best = min(best, time.perf_counter() - start)
+        finally:
+            if teardown is not None:
+                teardown(state)
+    return best
+
+
+def bench_placement(case, options):
+    def setup():
+        seed(options.seed)
+        return make_system(case["shape"], case["count"], case["density"], options.radius, case["broad_phase"])
+
+    def run(particle_system):
+        case["placed"] = particle_system.add_particles(case["count"], radius=options.radius)
+    return timed(setup, run, options.repeats), case["count"]
+
+
+# A system already filled with particles (and fields of view) to time the operations on it.
+def filled_system(case, options):
+    seed(options.seed)
+    particle_system = make_system(case["shape"], case["count"], case["density"], options.radius, case["broad_phase"])
+    particle_system.add_particles(case["count"], radius=options.radius, bulk=True)
+    for particle in particle_system.particles:
+        particle.field_of_view = np.array([options.vision_range, options.vision_angle])
+        particle.rotate(random.random() * 360)
+    return particle_system
+
+
+def bench_move(case, options):
+    def setup():
+        particle_system = filled_system(case, options)
+        particles = [random.choice(particle_system.particles) for i in range(options.operations)]
+        return particles
+
+    def run(particles):
+        for particle in particles:
+            particle.move(options.speed)
+    return timed(setup, run, options.repeats), options.operations
+
+
+def bench_search(case, options):
+    def setup():
+        particle_system = filled_system(case, options)
+        return [random.choice(particle_system.particles) for i in range(options.operations)]
+
+    def run(particles):
+        for particle in particles:
+            particle.search()
+    return timed(setup, run, options.repeats), options.operations
+
+
+# One step of every particle at once, with its speedup over moving the particles one by one (the time of a move comes
+# from the move benchmark).
+def bench_step(case, options):
+    def setup():
+        return filled_system(case, options)
+
+    def run(particle_system):
+        case["moved"] = len(particle_system.store)
+        particle_system.step(speed=options.speed)
+    seconds = timed(setup, run, options.repeats)
+    move_seconds, moves = bench_move(dict(case), options)
+    case["speedup"] = move_seconds / moves * case["moved"] / seconds
+    return seconds, case["moved"]
+
+
+# Steps of every particle over worker processes, with the speedup over ParticleSystem.step. Both are timed over several
+# steps, the broad phase of the system included (the workers are started beforehand).
+def bench_parallel(case, options):
+    def serial_run(particle_system):
+        for i in range(options.steps):
+            particle_system.step(speed=options.speed)
+
+    def setup():
+        return ParallelStepper(filled_system(case, options), workers=case["workers"])
+
+    def run(stepper):
+        for i in range(options.steps):
+            stepper.step(speed=options.speed)
+        stepper.sync()
+    serial_seconds = timed(lambda: filled_system(case, options), serial_run, options.repeats)
+    seconds = timed(setup, run, options.repeats, lambda stepper: stepper.close())
+    case["speedup"] = serial_seconds / seconds
+    return seconds, case["count"] * options.steps
+
+
+def bench_rectangle_overlap(case, options):
+    def setup():
+        particle_system = filled_system(case, options)
+        movements = []
+        for i in range(options.operations):
+            particle = random.choice(particle_system.particles)
+            angle = random.random() * 2 * math.pi
+            start = particle.get_center()
+            end = start + options.speed * np.array([math.cos(angle), math.sin(angle)])
+            movements.append((start, end, particle.get_radius()))
+        return particle_system.grid, movements
+
+    def run(state):
+        quadtree, movements = state
+        for start, end, margin in movements:
+            quadtree.rectangle_overlap(start, end, margin, None)
+    return timed(setup, run, options.repeats), options.operations
+
+
+def bench_overlapped_by_circle(case, options):
+    def setup():
+        particle_system = filled_system(case, options)
+        return particle_system.grid, [random.choice(particle_system.particles) for i in range(options.operations)]
+
+    def run(state):
+        quadtree, particles = state
+        for particle in particles:
+            quadtree.overlapped_by_circle(particle, leaves_only=True)
+    return timed(setup, run, options.repeats), options.operations
+
+
+# The overlap benchmarks only apply to the quadtree.
+BENCHMARKS = {
+    "placement": (bench_placement, None),
+    "move": (bench_move, None),
+    "search": (bench_search, None),
+    "step": (bench_step, None),
+    "parallel": (bench_parallel, None),
+    "rectangle_overlap": (bench_rectangle_overlap, "quadtree"),
+    "overlapped_by_circle": (bench_overlapped_by_circle, "quadtree"),
+}
+
+
+def key(result):
+    return (result["benchmark"], result["broad_phase"], result["shape"], result["count"], result["density"]) \
+        + ((result["workers"],) if "workers" in result else ())
+
+
+# The parallel benchmark has a case per number of workers.
+def variants(name, options):
+    if name == "parallel":
+        return [{"workers": workers} for workers in options.workers]
+    return [{}]
+
+
+def run(options):
+    results = []
+    for name in options.benchmarks:
+        function, broad_phase = BENCHMARKS[name]
+        for case_broad_phase in options.broad_phases:
+            if broad_phase is not None and case_broad_phase != broad_phase:
+                continue
+            for shape in options.shapes:
+                for count in options.counts:
+                    for density in options.densities:
+                        for variant in variants(name, options):
+                            case = {"benchmark": name, "broad_phase": case_broad_phase, "shape": shape,
+                                    "count": count, "density": density}
+                            case.update(variant)
+                            seconds, operations = function(case, options)
+                            case["seconds"] = seconds
+                            case["operations"] = operations
+                            case["microseconds_per_operation"] = seconds / operations * 1e6
+                            results.append(case)
+                            if not options.quiet:
+                                line = "{benchmark:<21} {broad_phase:<9} {shape:<10} {count:>6} {density:>5} " \
+                                       "{microseconds_per_operation:>12.1f} us".format(**case)
+                                if "workers" in case:
+                                    line += " {} workers".format(case["workers"])
+                                if "speedup" in case:
+                                    line += " ({:.1f}x)".format(case["speedup"])
+                                print(line, file=sys.stderr)
+    return results
+
+
+# Results slower than the baseline by more than the tolerance (a fraction of the time of the baseline).
+def compare(results, baseline, tolerance):
+    reference = {key(result): result for result in baseline["results"]}
+    regressions = []
+    for result in results:
+        previous = reference.get(key(result))
+        if previous is not None and result["seconds"] > previous["seconds"] * (1 + tolerance):
+            regressions.append({"case": list(key(result)), "seconds": result["seconds"],
+                                "baseline": previous["seconds"], "ratio": result["seconds"] / previous["seconds"]})
+    return regressions
+
+
+def parse_arguments(arguments=None):
+    parser = argparse.ArgumentParser(description="Time the particle system without drawing anything.")
+    parser.add_argument("--benchmarks", nargs="+", choices=list(BENCHMARKS), default=list(BENCHMARKS))
+    parser.add_argument("--broad-phases", nargs="+", choices=list(BROAD_PHASES), default=["quadtree"])
+    parser.add_argument("--shapes", nargs="+", choices=["circle", "rectangle"], default=["circle", "rectangle"])
+    parser.add_argument("--counts", nargs="+", type=int, default=[100, 1000])
+    parser.add_argument("--densities", nargs="+", type=float, default=[0.05, 0.2],
+                        help="fractions of the area of the zone covered by the particles")
+    parser.add_argument("--radius", type=float, default=10)
+    parser.add_argument("--operations", type=int, default=100,
+                        help="moves, searches or queries timed per case (every particle moves in a step)")
+    parser.add_argument("--repeats", type=int, default=3, help="the best time of the repeats is kept")
+    parser.add_argument("--speed", type=float, default=50)
+    parser.add_argument("--steps", type=int, default=5, help="steps timed per case of the parallel benchmark")
+    parser.add_argument("--workers", nargs="+", type=int, default=[1, 2, 4],
+                        help="numbers of worker processes of the parallel benchmark")
+    parser.add_argument("--vision-range", type=float, default=200)
+    parser.add_argument("--vision-angle", type=float, default=90)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--compare", metavar="BASELINE", help="results of a previous run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    parser.add_argument("--quiet", action="store_true")
+    return parser.parse_args(arguments)
+
+
+def main(arguments=None):
+    options = parse_arguments(arguments)
+    results = run(options)
+    report = {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "options": vars(options),
+        "results": results,
+    }
+    status = 0
+    if options.compare:
+        with open(options.compare) as file:
+            report["regressions"] = compare(results, json.load(file), options.tolerance)
+        for regression in report["regressions"]:
+            print("Regression: {} {:.2f}x".format(" ".join(map(str, regression["case"])), regression["ratio"]),
+                  file=sys.stderr)
+        status = 1 if len(report["regressions"]) > 0 else 0
+    with open(options.output, "w") as file:
+        json.dump(report, file, indent=2)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
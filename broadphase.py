@@ -0,0 +1,55 @@
+from abc import ABCMeta
+
+
+# Spatial index of the particles of a system. The queries return the candidates near a circle, a movement or a field
+# of view (without duplicates), the exact tests are left to the caller.
+class BroadPhase(metaclass=ABCMeta):
+    @classmethod
+    def __subclasscheck__(cls, subclass):
+        return (hasattr(subclass, 'insert') and callable(subclass.insert) and
+                hasattr(subclass, 'remove') and callable(subclass.remove) and
+                hasattr(subclass, 'relocate') and callable(subclass.relocate) and
+                hasattr(subclass, 'query_circle') and callable(subclass.query_circle) and
+                hasattr(subclass, 'query_rectangle') and callable(subclass.query_rectangle) and
+                hasattr(subclass, 'query_sector') and callable(subclass.query_sector) or
+                NotImplemented)
+
+    # Create an empty index covering the rectangle centered on (x, y).
+    @classmethod
+    def from_bounds(cls, x, y, width, height, **options):
+        raise NotImplementedError
+
+    # Options passed to from_bounds to create the same kind of index.
+    def options(self):
+        raise NotImplementedError
+
+    # Every circle in the index.
+    def contents(self):
+        raise NotImplementedError
+
+    # Add a circle unless it overlaps another one (or regardless when overlap is allowed).
+    def insert(self, circle, overlap=False):
+        raise NotImplementedError
+
+    # Add circles known not to overlap, all at once.
+    def bulk_load(self, circles):
+        raise NotImplementedError
+
+    def remove(self, circle):
+        raise NotImplementedError
+
+    # Update the index after a circle has moved.
+    def relocate(self, circle):
+        raise NotImplementedError
+
+    # Circles that may collide with a circle.
+    def query_circle(self, circle):
+        raise NotImplementedError
+
+    # Circles that may collide with a circle of radius margin moving from start to end.
+    def query_rectangle(self, start, end, margin):
+        raise NotImplementedError
+
+    # Circles that may be inside the field of view facing the direction vector (its magnitude is the range).
+    def query_sector(self, center, direction, angle):
+        raise NotImplementedError
@@ -0,0 +1,32 @@
+import numpy as np
+
+
+# Fraction of the displacement of each first circle before it touches the second one, which stays still. The vectors
+# go from the second circles to the first ones and the distances are the sums of their radii. Circles that are not
+# approaching each other keep their whole displacement.
+def time_of_impact(vectors, displacements, distances):
+    a = np.einsum("ij,ij->i", displacements, displacements)
+    b = 2 * np.einsum("ij,ij->i", vectors, displacements)
+    c = np.einsum("ij,ij->i", vectors, vectors) - np.square(distances)
+    discriminant = np.square(b) - 4 * a * c
+    times = np.ones(len(a))
+    approaching = (b < 0) & (discriminant >= 0)
+    times[approaching] = (-b[approaching] - np.sqrt(discriminant[approaching])) / (2 * a[approaching])
+    return np.clip(times, 0, 1)
+
+
+# Earliest fraction of its displacement at which a circle touches one of the given circles (1 if it touches none).
+def sweep_circle(center, radius, displacement, centers, radii):
+    if len(radii) == 0:
+        return 1.0
+    vectors = center - centers
+    displacements = np.broadcast_to(displacement, vectors.shape)
+    return time_of_impact(vectors, displacements, radius + radii).min()
+
+
+# Check which of the given circles a circle overlaps (touching circles do not overlap).
+def overlapped_circles(center, radius, centers, radii):
+    vectors = centers - center
+    squared_distances = np.einsum("ij,ij->i", vectors, vectors)
+    thresholds = np.square(radius + radii)
+    return (squared_distances < thresholds) & ~np.isclose(squared_distances, thresholds, rtol=1e-09, atol=0)
@@ -92,17 +92,44 @@ def resize_vector(vector, magnitude):
     return (magnitude / math.sqrt(np.dot(vector, vector))) * vector
 
 
+# Resize each vector (a row of a (N, 2) array) to a magnitude (one per vector or the same for all). The null vectors
+# become NaN.
+def resize_vectors(vectors, magnitudes):
+    vectors = np.asarray(vectors, dtype=float).reshape(-1, 2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scales = np.asarray(magnitudes, dtype=float) / np.sqrt(np.einsum("ij,ij->i", vectors, vectors))
+        return scales[:, np.newaxis] * vectors
+
+
 def rotate_vector(vector, angle):
     radians = math.radians(angle)
     rotation = np.array([[math.cos(radians), -math.sin(radians)], [math.sin(radians), math.cos(radians)]])
     return np.dot(rotation, vector)
 
 
+# Rotate each vector by an angle in degrees (one per vector or the same for all).
+def rotate_vectors(vectors, angles):
+    vectors = np.asarray(vectors, dtype=float).reshape(-1, 2)
+    radians = np.radians(angles)
+    cosines = np.cos(radians)
+    sines = np.sin(radians)
+    return np.column_stack((cosines * vectors[:, 0] - sines * vectors[:, 1],
+                            sines * vectors[:, 0] + cosines * vectors[:, 1]))
+
+
 # Project vector u on vector v.
 def project_vector(u, v):
     return (np.dot(u, v) / np.dot(v, v)) * v
 
 
+# Project each vector of u on the vector of v in the same row (either can be a single vector). The projections on a
+# null vector are NaN.
+def project_vectors(u, v):
+    u, v = np.broadcast_arrays(np.asarray(u, dtype=float).reshape(-1, 2), np.asarray(v, dtype=float).reshape(-1, 2))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (np.einsum("ij,ij->i", u, v) / np.einsum("ij,ij->i", v, v))[:, np.newaxis] * v
+
+
 # Calculate the angle between vector u and vector v.
 def angle_between(u, v, signed=False):
     mu = math.sqrt(np.dot(u, u))
@@ -116,15 +143,40 @@ def angle_between(u, v, signed=False):
     return math.degrees(math.acos(round(np.dot(u, v) / (mu * mv), 2)))
 
 
-# TODO: Case when math.sqrt(math.pow(b, 2) - 4 * a * c) < 0
+# Angles in degrees between the vectors of u and the vectors of v in the same rows (either can be a single vector),
+# like angle_between. The angles involving a null vector are NaN.
+def angles_between(u, v, signed=False):
+    u, v = np.broadcast_arrays(np.asarray(u, dtype=float).reshape(-1, 2), np.asarray(v, dtype=float).reshape(-1, 2))
+    mu = np.sqrt(np.einsum("ij,ij->i", u, u))
+    mv = np.sqrt(np.einsum("ij,ij->i", v, v))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if signed:
+            return np.degrees(np.arccos(v[:, 0] / mv)) - np.degrees(np.arccos(u[:, 0] / mu))
+        return np.degrees(np.arccos(np.round(np.einsum("ij,ij->i", u, v) / (mu * mv), 2)))
+
+
+# Roots of ax^2 + bx + c = 0 (the smallest first when a > 0), NaN when they are not real.
 def quadratic(a, b, c):
-    discriminant = math.sqrt(math.pow(b, 2) - 4 * a * c)
+    discriminant = math.pow(b, 2) - 4 * a * c
+    if discriminant < 0:
+        return math.nan, math.nan
+    discriminant = math.sqrt(discriminant)
     v1 = (-b - discriminant) / (2 * a)
     v2 = (-b + discriminant) / (2 * a)
     return v1, v2
 
 
+# Roots of the equations of the rows of a, b and c (arrays or scalars), NaN when they are not real.
+def quadratics(a, b, c):
+    a, b, c = np.broadcast_arrays(np.asarray(a, dtype=float), np.asarray(b, dtype=float), np.asarray(c, dtype=float))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        discriminants = np.sqrt(np.square(b) - 4 * a * c)
+        return (-b - discriminants) / (2 * a), (-b + discriminants) / (2 * a)
+
+
 # Return the coordinates of a point on the outline of a circle as a function of two points along a segment.
+# When the line of the segment misses the circle (by rounding, it should be tangent), the point of the line closest
+# to the center is returned.
 def point_on_circumference(radius, center, start, end):
     ax = math.pow(end[0] - start[0], 2)
     ay = math.pow(end[1] - start[1], 2)
@@ -138,6 +190,8 @@ def point_on_circumference(radius, center, start, end):
     cy = math.pow((center[1] - start[1]), 2)
     c = cx + cy - math.pow(radius, 2)
     t1, t2 = quadratic(a, b, c)
+    if math.isnan(t1):
+        t1 = t2 = -b / (2 * a)
 
     delta = end - start
     p1 = start + t1 * delta
@@ -147,3 +201,258 @@ def point_on_circumference(radius, center, start, end):
     distance1 = np.dot(delta1, delta1)
     distance2 = np.dot(delta2, delta2)
     return p1 if distance1 < distance2 else p2
+
+
+# Points on the outlines of circles (radii and centers, one per segment or the same for all) as a function of
+# segments (rows of starts and ends), like point_on_circumference.
+def points_on_circumference(radii, centers, starts, ends):
+    starts = np.asarray(starts, dtype=float).reshape(-1, 2)
+    ends = np.asarray(ends, dtype=float).reshape(-1, 2)
+    deltas = ends - starts
+    offsets = np.asarray(centers, dtype=float).reshape(-1, 2) - starts
+    a = np.einsum("ij,ij->i", deltas, deltas)
+    b = -2 * np.einsum("ij,ij->i", deltas, offsets)
+    c = np.einsum("ij,ij->i", offsets, offsets) - np.square(radii)
+    t1, t2 = quadratics(a, b, c)
+    missed = np.isnan(t1)
+    t1[missed] = t2[missed] = -b[missed] / (2 * a[missed])
+
+    # The root closest to the end of the segment.
+    t = np.where(np.abs(1 - t1) < np.abs(1 - t2), t1, t2)
+    return starts + t[:, np.newaxis] * deltas
+
+
+# Return the pairs (i < j) of points that are at most at the given distance from each other.
+# The points are binned into square cells of that size and only neighbouring cells are compared.
+def close_pairs(points, distance):
+    points = np.asarray(points, dtype=float)
+    count = len(points)
+    if count < 2 or distance <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    cells = np.floor((points - points.min(axis=0)) / distance).astype(np.int64) + 1
+    width = cells[:, 0].max() + 2
+    keys = cells[:, 1] * width + cells[:, 0]
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    indices = np.arange(count)
+    firsts = []
+    seconds = []
+
+    # Half of the neighbouring cells is enough since every pair is found from one of its two cells.
+    for dx, dy in ((0, 0), (1, 0), (-1, 1), (0, 1), (1, 1)):
+        neighbour_keys = keys + dy * width + dx
+        start = np.searchsorted(sorted_keys, neighbour_keys, side="left")
+        end = np.searchsorted(sorted_keys, neighbour_keys, side="right")
+        counts = end - start
+        total = counts.sum()
+        if total == 0:
+            continue
+        first = np.repeat(indices, counts)
+        offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        second = order[np.repeat(start, counts) + offsets]
+        if dx == 0 and dy == 0:
+            keep = first < second
+            first = first[keep]
+            second = second[keep]
+        firsts.append(first)
+        seconds.append(second)
+    if len(firsts) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    first = np.concatenate(firsts)
+    second = np.concatenate(seconds)
+    vectors = points[first] - points[second]
+    keep = np.einsum("ij,ij->i", vectors, vectors) <= distance * distance
+    first = first[keep]
+    second = second[keep]
+    swap = first > second
+    first[swap], second[swap] = second[swap], first[swap]
+    return first, second
+
+
+# Return the pairs (i, j) of a query i and a point j that are at most at the distance of the query from each other (one
+# distance per query or the same for all). The points are binned into square cells of the largest distance and each
+# query is only compared with the points of the cells around its own.
+def close_pairs_between(queries, points, distances):
+    queries = np.asarray(queries, dtype=float).reshape(-1, 2)
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    distances = np.broadcast_to(np.asarray(distances, dtype=float), (len(queries),))
+    if len(queries) == 0 or len(points) == 0 or distances.max() <= 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    size = distances.max()
+    origin = np.minimum(points.min(axis=0), queries.min(axis=0))
+    cells = np.floor((points - origin) / size).astype(np.int64) + 1
+    query_cells = np.floor((queries - origin) / size).astype(np.int64) + 1
+    width = max(cells[:, 0].max(), query_cells[:, 0].max()) + 2
+    keys = cells[:, 1] * width + cells[:, 0]
+    query_keys = query_cells[:, 1] * width + query_cells[:, 0]
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+    indices = np.arange(len(queries))
+    firsts = []
+    seconds = []
+    for dy in (-1, 0, 1):
+        for dx in (-1, 0, 1):
+            neighbour_keys = query_keys + dy * width + dx
+            start = np.searchsorted(sorted_keys, neighbour_keys, side="left")
+            end = np.searchsorted(sorted_keys, neighbour_keys, side="right")
+            counts = end - start
+            total = counts.sum()
+            if total == 0:
+                continue
+            firsts.append(np.repeat(indices, counts))
+            offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+            seconds.append(order[np.repeat(start, counts) + offsets])
+    if len(firsts) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    first = np.concatenate(firsts)
+    second = np.concatenate(seconds)
+    vectors = queries[first] - points[second]
+    keep = np.einsum("ij,ij->i", vectors, vectors) <= np.square(distances[first])
+    return first[keep], second[keep]
+
+
+# Check which targets are in the fields of view (ranges and angles in degrees) of the viewers facing the rotations (in
+# degrees), with the tests of Particle.search. The vectors go from the viewers to the targets. Return the mask of the
+# visible targets and the distances between the centers.
+def in_fields_of_view(vectors, ranges, angles, rotations, target_radii):
+    squared_distances = np.einsum("ij,ij->i", vectors, vectors)
+    distances = np.sqrt(squared_distances)
+    half_angles = angles / 2
+    rotations = np.radians(rotations)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        angles = angles_between(np.column_stack((np.cos(rotations), np.sin(rotations))), vectors)
+        epsilons = (2 * squared_distances - np.square(target_radii)) / (2 * squared_distances)
+        epsilons = np.degrees(np.arccos(np.clip(epsilons, -1, 1)))
+        limits = ranges + target_radii
+        visible = (angles - epsilons < half_angles) | np.isclose(angles - epsilons, half_angles, rtol=1e-09, atol=0)
+        visible &= (distances < limits) | np.isclose(distances, limits, rtol=1e-09, atol=0)
+    return visible, distances
+
+
+# Pairs (i < j) of circles that collide, touching ones included (or that overlap, when touching is False), with the
+# tolerance of math.isclose on the squared distances.
+def colliding_pairs(centers, radii, touching=True):
+    centers = np.asarray(centers, dtype=float).reshape(-1, 2)
+    radii = np.asarray(radii, dtype=float)
+    if len(radii) < 2:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    # The pairs within the tolerance are kept by the prefilter as well.
+    first, second = close_pairs(centers, 2 * radii.max() * (1 + 1e-09) + 1e-12)
+    vectors = centers[first] - centers[second]
+    distances = np.einsum("ij,ij->i", vectors, vectors)
+    thresholds = np.square(radii[first] + radii[second])
+    close = np.abs(distances - thresholds) <= 1e-09 * np.maximum(distances, thresholds)
+    keep = (distances < thresholds) | close if touching else (distances < thresholds) & ~close
+    return first[keep], second[keep]
+
+
+# Place non-overlapping circles of the given radii at random coordinates (Poisson-disk sampling). The candidates are
+# checked against a background grid whose cells are small enough to hold a single circle. They are first drawn
+# anywhere with the generate function until few of them fit, then around the circles already placed (Bridson's
+# algorithm): a circle stops being used as soon as none of the attempts around it fits, so the sampling ends once
+# every circle is placed or no more room can be found. The circles already in the area (fixed_coords and fixed_radii)
+# are avoided. Return the coordinates and the indices of the radii placed.
+def poisson_disk(generate, confines, radii, bounds, attempts=30, batch=1024, fixed_coords=None, fixed_radii=None):
+    fixed = 0 if fixed_radii is None else len(fixed_radii)
+    radii = np.asarray(radii, dtype=float)
+    if len(radii) == 0:
+        return np.empty((0, 2)), np.empty(0, dtype=np.int64)
+    if fixed > 0:
+        radii = np.concatenate((np.asarray(fixed_radii, dtype=float), radii))
+    x1, y1, x2, y2 = bounds
+    cell_size = 2 * radii.min() / math.sqrt(2)
+    reach = int(math.ceil(2 * radii.max() / cell_size))
+    columns = int(math.ceil((x2 - x1) / cell_size)) + 1
+    rows = int(math.ceil((y2 - y1) / cell_size)) + 1
+    origin = np.array([x1, y1])
+    offsets = [(dx, dy) for dy in range(-reach, reach + 1) for dx in range(-reach, reach + 1)]
+
+    # The grid holds the index of the circle in each cell and is padded to avoid bound checks.
+    grid = np.full((rows + 2 * reach, columns + 2 * reach), -1, dtype=np.int64)
+    coords = np.empty((len(radii), 2))
+    placed = np.empty(len(radii), dtype=np.int64)
+    pending = np.random.permutation(len(radii) - fixed) + fixed
+    count = fixed
+
+    # Keep the candidates that fit and return their positions among the candidates, along with a mask of the
+    # candidates that cannot fit whatever the other candidates (outside the area or overlapping a circle placed).
+    def accept(candidates, indices):
+        nonlocal count, pending
+        keep = confines(candidates, radii[indices])
+        cells = np.floor((candidates - origin) / cell_size).astype(np.int64) + reach
+        cells = np.clip(cells, 0, np.array([grid.shape[1] - 1, grid.shape[0] - 1]))
+        keep &= grid[cells[:, 1], cells[:, 0]] < 0
+
+        # Reject the candidates overlapping a circle already placed.
+        for dx, dy in offsets:
+            candidates_kept = np.flatnonzero(keep)
+            owners = grid[cells[candidates_kept, 1] + dy, cells[candidates_kept, 0] + dx]
+            occupied = owners >= 0
+            vectors = candidates[candidates_kept[occupied]] - coords[owners[occupied]]
+            thresholds = radii[indices[candidates_kept[occupied]]] + radii[placed[owners[occupied]]]
+            overlapping = np.einsum("ij,ij->i", vectors, vectors) < np.square(thresholds)
+            keep[candidates_kept[occupied][overlapping]] = False
+        blocked = ~keep
+
+        # Among the remaining candidates, keep the first one of each cell and reject the ones overlapping an earlier
+        # candidate.
+        candidates_kept = np.flatnonzero(keep)
+        _, firsts = np.unique(cells[candidates_kept, 1] * grid.shape[1] + cells[candidates_kept, 0],
+                              return_index=True)
+        keep[candidates_kept] = False
+        keep[candidates_kept[firsts]] = True
+        survivors = np.flatnonzero(keep)
+        keys = cells[survivors, 1] * grid.shape[1] + cells[survivors, 0]
+        order = np.argsort(keys)
+        sorted_keys = keys[order]
+        for dx, dy in offsets:
+            if dx == 0 and dy == 0:
+                continue
+            neighbour_keys = keys + dy * grid.shape[1] + dx
+            positions = np.minimum(np.searchsorted(sorted_keys, neighbour_keys), len(sorted_keys) - 1)
+            found = sorted_keys[positions] == neighbour_keys
+            others = np.where(found, survivors[order[positions]], -1)
+            earlier = (others >= 0) & (others < survivors)
+            vectors = candidates[survivors[earlier]] - candidates[others[earlier]]
+            thresholds = radii[indices[survivors[earlier]]] + radii[indices[others[earlier]]]
+            overlapping = np.einsum("ij,ij->i", vectors, vectors) < np.square(thresholds)
+            keep[survivors[earlier][overlapping]] = False
+
+        # Each pending circle is placed once.
+        survivors = np.flatnonzero(keep)
+        _, firsts = np.unique(indices[survivors], return_index=True)
+        survivors = survivors[np.sort(firsts)]
+        total = count + len(survivors)
+        coords[count:total] = candidates[survivors]
+        placed[count:total] = indices[survivors]
+        grid[cells[survivors, 1], cells[survivors, 0]] = np.arange(count, total)
+        count = total
+        pending = pending[~np.isin(pending, indices[survivors])]
+        return survivors, blocked
+
+    if fixed > 0:
+        coords[:fixed] = fixed_coords
+        placed[:fixed] = np.arange(fixed)
+        cells = np.floor((coords[:fixed] - origin) / cell_size).astype(np.int64) + reach
+        cells = np.clip(cells, 0, np.array([grid.shape[1] - 1, grid.shape[0] - 1]))
+        grid[cells[:, 1], cells[:, 0]] = np.arange(fixed)
+
+    # Draw candidates anywhere in the area (more than needed, the radii of the pending circles are used in turn).
+    while len(pending) > 0:
+        indices = np.resize(pending, max(len(pending), batch))
+        if len(accept(generate(radii[indices]), indices)[0]) < len(indices) / 100:
+            break
+
+    # Draw candidates in the annulus around each active circle.
+    active = np.arange(count)
+    while len(pending) > 0 and len(active) > 0:
+        origins = np.repeat(active, attempts)
+        indices = np.resize(pending, len(origins))
+        distances = (radii[placed[origins]] + radii[indices]) * (1 + np.random.random(len(origins)))
+        angles = 2 * math.pi * np.random.random(len(origins))
+        candidates = coords[origins] + distances[:, np.newaxis] * np.column_stack((np.cos(angles), np.sin(angles)))
+        first = count
+        survivors, blocked = accept(candidates, indices)
+        full = blocked.reshape(-1, attempts).all(axis=1)
+        active = np.concatenate((active[~full], np.arange(first, count)))
+    return coords[fixed:count], placed[fixed:count] - fixed
@@ -56,6 +56,7 @@ class Shape2D(ABC, Graphic2D, Collider2D):
         self._center = np.array([x, y])
         self._rotation = rotation
         self._item = None
+        self._style = None
 
     def get_center(self):
         return np.copy(self._center)
@@ -74,6 +75,14 @@ class Shape2D(ABC, Graphic2D, Collider2D):
 
     def set_item(self, item):
         self._item = item
+        self._style = None
+
+    # Fill and outline the item was last drawn with.
+    def get_style(self):
+        return self._style
+
+    def set_style(self, fill, outline):
+        self._style = (fill, outline)
 
     def squared_distance_from_point(self, point):
         vector = point - self._center
@@ -100,7 +109,11 @@ class Circle(Shape2D):
         self._radius = radius
 
     def randomize_radius(self, min_radius, max_radius):
-        self._radius = random() * (min_radius - max_radius) + min_radius
+        self._radius = random() * (max_radius - min_radius) + min_radius
+
+    def bounds(self):
+        x, y = self._center
+        return x - self._radius, y - self._radius, x + self._radius, y + self._radius
 
     def draw(self, canvas, fill="", outline="black"):
         if not self._item:
@@ -110,7 +123,9 @@ class Circle(Shape2D):
             y1 = y - self._radius
             y2 = y + self._radius
             self._item = canvas.create_oval(x1, y1, x2, y2, fill=fill, outline=outline)
+            self._style = (fill, outline)
 
+    # The item is only configured again when its style changes.
     def redraw(self, canvas, fill="", outline="black"):
         if self._item:
             x, y = self._center
@@ -119,7 +134,9 @@ class Circle(Shape2D):
             y1 = y - self._radius
             y2 = y + self._radius
             canvas.coords(self._item, x1, y1, x2, y2)
-            canvas.itemconfig(self._item, fill=fill, outline=outline)
+            if self._style != (fill, outline):
+                canvas.itemconfig(self._item, fill=fill, outline=outline)
+                self._style = (fill, outline)
 
     def randomize_circle_coord(self, circle):
         # Generate x randomly inside the area.
@@ -135,6 +152,32 @@ class Circle(Shape2D):
         circle.set_center(x, y)
         # return np.array([x, y])
 
+    # Random coordinates, uniformly distributed over the area, at which circles of the given radii fit inside.
+    def random_circle_coords(self, radii):
+        distances = (self._radius - radii) * np.sqrt(np.random.random(len(radii)))
+        angles = 2 * math.pi * np.random.random(len(radii))
+        return self._center + distances[:, np.newaxis] * np.column_stack((np.cos(angles), np.sin(angles)))
+
+    # Check which circles are within the boundaries (vectorized over the circles).
+    def confines_circles(self, centers, radii):
+        vectors = centers - self._center
+        distances = np.einsum("ij,ij->i", vectors, vectors)
+        thresholds = np.square(self._radius - radii)
+        return (distances < thresholds) | np.isclose(distances, thresholds, rtol=1e-09, atol=0)
+
+    # Fraction of each displacement that keeps the circles inside the area (vectorized over the circles).
+    def confinement_limits(self, centers, radii, displacements):
+        vectors = centers - self._center
+        a = np.einsum("ij,ij->i", displacements, displacements)
+        b = 2 * np.einsum("ij,ij->i", vectors, displacements)
+        c = np.einsum("ij,ij->i", vectors, vectors) - np.square(self._radius - radii)
+        limits = np.ones(len(radii))
+        moving = a > 0
+        discriminant = np.maximum(np.square(b[moving]) - 4 * a[moving] * c[moving], 0)
+        limits[moving] = (-b[moving] + np.sqrt(discriminant)) / (2 * a[moving])
+        limits[c > 0] = 0
+        return np.clip(limits, 0, 1)
+
     def contains_point(self, point):
         vector = self._center - point
         distance = np.dot(vector, vector)
@@ -189,6 +232,10 @@ class Rectangle(Shape2D):
     def set_height(self, height):
         self._height = height
 
+    def bounds(self):
+        x, y = self._center
+        return x - self._width / 2, y - self._height / 2, x + self._width / 2, y + self._height / 2
+
     def draw(self, canvas, fill="", outline="black"):
         if not self._item:
             x = self._center[0]
@@ -200,10 +247,12 @@ class Rectangle(Shape2D):
             y1 = y - height
             y2 = y + height
             self._item = canvas.create_rectangle(x1, y1, x2, y2, fill=fill, outline=outline)
+            self._style = (fill, outline)
 
     def redraw(self, canvas, fill="", outline="black"):
-        if self._item:
+        if self._item and self._style != (fill, outline):
             canvas.itemconfig(self._item, fill=fill, outline=outline)
+            self._style = (fill, outline)
 
     def randomize_circle_coord(self, circle):
         # Generate x randomly inside the area.
@@ -218,6 +267,11 @@ class Rectangle(Shape2D):
         y = random() * y_range + min_y
         circle.set_center(x, y)
 
+    # Random coordinates, uniformly distributed over the area, at which circles of the given radii fit inside.
+    def random_circle_coords(self, radii):
+        ranges = np.array([self._width, self._height]) - 2 * radii[:, np.newaxis]
+        return self._center + (np.random.random((len(radii), 2)) - 0.5) * ranges
+
     # TODO: Fix this method.
     def confine_circle_coord(self, circle, start, end):
         center = self.get_center()
@@ -391,6 +445,25 @@ class Rectangle(Shape2D):
                 point[0], point[1] = x, y"""
         return point
 
+    # Check which circles are within the boundaries (vectorized over the circles).
+    def confines_circles(self, centers, radii):
+        half_size = np.array([self._width / 2, self._height / 2])
+        lower = self._center - half_size + radii[:, np.newaxis]
+        upper = self._center + half_size - radii[:, np.newaxis]
+        inside = ((centers > lower) | np.isclose(centers, lower, rtol=1e-09, atol=0)) \
+            & ((centers < upper) | np.isclose(centers, upper, rtol=1e-09, atol=0))
+        return inside.all(axis=1)
+
+    # Fraction of each displacement that keeps the circles inside the area (vectorized over the circles).
+    def confinement_limits(self, centers, radii, displacements):
+        half_size = np.array([self._width / 2, self._height / 2])
+        lower = self._center - half_size + radii[:, np.newaxis]
+        upper = self._center + half_size - radii[:, np.newaxis]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            limits = np.where(displacements > 0, (upper - centers) / displacements,
+                              np.where(displacements < 0, (lower - centers) / displacements, np.inf))
+        return np.clip(limits.min(axis=1), 0, 1)
+
     def contains_point(self, point):
         x, y = point
         cx, cy = self._center
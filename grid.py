@@ -0,0 +1,178 @@
+import math
+import numpy as np
+from broadphase import BroadPhase
+from graphic import Graphic2D
+
+
+# Uniform grid of square cells hashed by their position. A circle is stored in every cell overlapped by its bounding
+# box, so the cells should be about the size of the largest diameter (the diameter of the first circle by default).
+class HashGrid(Graphic2D, BroadPhase):
+    def __init__(self, x, y, width, height, cell_size=None):
+        self._origin = np.array([x - width / 2, y - height / 2])
+        self._width = width
+        self._height = height
+        self._cell_size = None
+        self._columns = 0
+        self._rows = 0
+        self._cells = {}
+        self._keys = {}
+        self._contents = []
+        if cell_size:
+            self.set_cell_size(cell_size)
+
+    @classmethod
+    def from_bounds(cls, x, y, width, height, **options):
+        return cls(x, y, width, height, **options)
+
+    def options(self):
+        return {"cell_size": self._cell_size}
+
+    def contents(self):
+        return self._contents
+
+    def get_cell_size(self):
+        return self._cell_size
+
+    def set_cell_size(self, cell_size):
+        assert len(self._contents) == 0, "The cell size cannot change once the grid holds circles."
+        self._cell_size = cell_size
+        self._columns = max(1, math.ceil(self._width / cell_size))
+        self._rows = max(1, math.ceil(self._height / cell_size))
+
+    # The cells are not drawn.
+    def draw(self, canvas, fill="", outline="black"):
+        pass
+
+    def redraw(self, canvas, fill="", outline="black"):
+        pass
+
+    # Range of columns and rows overlapped by a bounding box (cells outside the grid are clamped to its border).
+    def cell_range(self, x1, y1, x2, y2):
+        ox, oy = self._origin
+        column1 = min(max(math.floor((x1 - ox) / self._cell_size), 0), self._columns - 1)
+        column2 = min(max(math.floor((x2 - ox) / self._cell_size), 0), self._columns - 1)
+        row1 = min(max(math.floor((y1 - oy) / self._cell_size), 0), self._rows - 1)
+        row2 = min(max(math.floor((y2 - oy) / self._cell_size), 0), self._rows - 1)
+        return column1, column2, row1, row2
+
+    def circle_keys(self, circle):
+        x, y = circle.get_center()
+        radius = circle.get_radius()
+        column1, column2, row1, row2 = self.cell_range(x - radius, y - radius, x + radius, y + radius)
+        return tuple(row * self._columns + column for row in range(row1, row2 + 1)
+                     for column in range(column1, column2 + 1))
+
+    # Keys and centers of the cells overlapped by a bounding box.
+    def cells_in_range(self, x1, y1, x2, y2):
+        column1, column2, row1, row2 = self.cell_range(x1, y1, x2, y2)
+        columns, rows = np.meshgrid(np.arange(column1, column2 + 1), np.arange(row1, row2 + 1))
+        columns = columns.ravel()
+        rows = rows.ravel()
+        centers = self._origin + (np.column_stack((columns, rows)) + 0.5) * self._cell_size
+        return rows * self._columns + columns, centers
+
+    # Circles stored in the given cells, without duplicates.
+    def gather(self, keys):
+        circles = {}
+        for key in keys:
+            cell = self._cells.get(key)
+            if cell:
+                circles.update(cell)
+        return list(circles)
+
+    def insert(self, circle, overlap=False):
+        if self._cell_size is None:
+            self.set_cell_size(2 * circle.get_radius())
+        if not overlap:
+            for other in self.query_circle(circle):
+                if circle.overlaps_circle(other):
+                    return False
+        keys = self.circle_keys(circle)
+        for key in keys:
+            self._cells.setdefault(key, {})[circle] = None
+        self._keys[circle] = keys
+        self._contents.append(circle)
+        return True
+
+    def bulk_load(self, circles):
+        circles = list(circles)
+        if len(circles) == 0:
+            return
+        centers = np.array([circle.get_center() for circle in circles])
+        radii = np.array([circle.get_radius() for circle in circles])
+        if self._cell_size is None:
+            self.set_cell_size(2 * radii.max())
+        limits = np.array([self._columns - 1, self._rows - 1])
+        lower = np.clip(np.floor((centers - radii[:, np.newaxis] - self._origin) / self._cell_size), 0, limits)
+        upper = np.clip(np.floor((centers + radii[:, np.newaxis] - self._origin) / self._cell_size), 0, limits)
+        lower = lower.astype(np.int64).tolist()
+        upper = upper.astype(np.int64).tolist()
+        for circle, (column1, row1), (column2, row2) in zip(circles, lower, upper):
+            keys = tuple(row * self._columns + column for row in range(row1, row2 + 1)
+                         for column in range(column1, column2 + 1))
+            for key in keys:
+                self._cells.setdefault(key, {})[circle] = None
+            self._keys[circle] = keys
+        self._contents += circles
+
+    def remove(self, circle):
+        for key in self._keys.pop(circle):
+            self.discard(key, circle)
+        self._contents.remove(circle)
+
+    def relocate(self, circle):
+        former_keys = self._keys[circle]
+        keys = self.circle_keys(circle)
+        if keys != former_keys:
+            for key in former_keys:
+                if key not in keys:
+                    self.discard(key, circle)
+            for key in keys:
+                if key not in former_keys:
+                    self._cells.setdefault(key, {})[circle] = None
+            self._keys[circle] = keys
+
+    def discard(self, key, circle):
+        cell = self._cells[key]
+        del cell[circle]
+        if len(cell) == 0:
+            del self._cells[key]
+
+    def query_circle(self, circle):
+        if self._cell_size is None:
+            return []
+        return self.gather(self.circle_keys(circle))
+
+    def query_rectangle(self, start, end, margin):
+        if self._cell_size is None:
+            return []
+        x1, y1 = np.minimum(start, end) - margin
+        x2, y2 = np.maximum(start, end) + margin
+        keys, centers = self.cells_in_range(x1, y1, x2, y2)
+
+        # Keep the cells reached by the rectangle swept by the circle (distance from the trajectory to the centers).
+        vector = end - start
+        squared_length = np.dot(vector, vector)
+        t = np.clip((centers - start) @ vector / squared_length, 0, 1) if squared_length > 0 else np.zeros(len(keys))
+        offsets = centers - (start + t[:, np.newaxis] * vector)
+        distances = np.sqrt(np.einsum("ij,ij->i", offsets, offsets))
+        reach = margin + self._cell_size * math.sqrt(2) / 2
+        return self.gather(keys[distances <= reach])
+
+    def query_sector(self, center, direction, angle):
+        if self._cell_size is None:
+            return []
+        radius = math.sqrt(np.dot(direction, direction))
+        keys, centers = self.cells_in_range(center[0] - radius, center[1] - radius,
+                                            center[0] + radius, center[1] + radius)
+
+        # Keep the cells within range whose angular extent, seen from the center, meets the field of view.
+        half_diagonal = self._cell_size * math.sqrt(2) / 2
+        vectors = centers - center
+        distances = np.sqrt(np.einsum("ij,ij->i", vectors, vectors))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            cosines = vectors @ direction / (distances * radius)
+            angles = np.degrees(np.arccos(np.clip(cosines, -1, 1)))
+            extents = np.degrees(np.arcsin(np.clip(half_diagonal / distances, 0, 1)))
+        visible = (distances <= half_diagonal) | (angles <= angle / 2 + extents)
+        return self.gather(keys[visible & (distances <= radius + half_diagonal)])
@@ -0,0 +1,288 @@
+import math
+import numpy as np
+from broadphase import BroadPhase
+from graphic import Graphic2D
+
+
+# Spread the lower 32 bits of each integer over the even bits.
+def part_bits(values):
+    values = values.astype(np.uint64) & np.uint64(0xFFFFFFFF)
+    values = (values | (values << np.uint64(16))) & np.uint64(0x0000FFFF0000FFFF)
+    values = (values | (values << np.uint64(8))) & np.uint64(0x00FF00FF00FF00FF)
+    values = (values | (values << np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    values = (values | (values << np.uint64(2))) & np.uint64(0x3333333333333333)
+    values = (values | (values << np.uint64(1))) & np.uint64(0x5555555555555555)
+    return values
+
+
+# Gather the even bits of each integer (inverse of part_bits).
+def compact_bits(values):
+    values = values.astype(np.uint64) & np.uint64(0x5555555555555555)
+    values = (values | (values >> np.uint64(1))) & np.uint64(0x3333333333333333)
+    values = (values | (values >> np.uint64(2))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    values = (values | (values >> np.uint64(4))) & np.uint64(0x00FF00FF00FF00FF)
+    values = (values | (values >> np.uint64(8))) & np.uint64(0x0000FFFF0000FFFF)
+    values = (values | (values >> np.uint64(16))) & np.uint64(0x00000000FFFFFFFF)
+    return values.astype(np.int64)
+
+
+def morton_keys(columns, rows):
+    return part_bits(columns) | (part_bits(rows) << np.uint64(1))
+
+
+# Concatenation of the integer ranges [start, end).
+def concatenate_ranges(starts, ends):
+    counts = ends - starts
+    total = counts.sum()
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    return np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(total)
+
+
+# Quadtree flattened into NumPy arrays. The centers of the circles are binned into the cells of a 2^depth by 2^depth
+# grid and sorted by the Morton code of their cell, so that every quadrant of every level is a contiguous range of the
+# sorted circles. Each level keeps the sorted codes of its non-empty quadrants and their ranges, and the queries walk
+# the levels with vectorized range scans.
+# The arrays are rebuilt in bulk: the circles inserted or moved since the last build are kept aside and checked
+# one by one until there are too many of them (more than the square root of the number of circles).
+class LinearQuadtree(Graphic2D, BroadPhase):
+    def __init__(self, x, y, width, height, depth=None):
+        self._origin = np.array([x - width / 2, y - height / 2])
+        self._size = max(width, height)
+        self._requested_depth = depth
+        self._depth = depth
+        self._contents = []
+        self._built = None
+        self._positions = {}
+        self._valid = None
+        self._pending = {}
+        self._pending_arrays = None
+        self._store = None
+        self._rows = None
+        self._centers = None
+        self._radii = None
+        self._max_radius = 0
+        self._order = None
+        self._levels = []
+
+    @classmethod
+    def from_bounds(cls, x, y, width, height, **options):
+        return cls(x, y, width, height, **options)
+
+    def options(self):
+        return {"depth": self._requested_depth}
+
+    def contents(self):
+        return self._contents
+
+    def get_depth(self):
+        return self._depth
+
+    # The quadrants are not drawn.
+    def draw(self, canvas, fill="", outline="black"):
+        pass
+
+    def redraw(self, canvas, fill="", outline="black"):
+        pass
+
+    def insert(self, circle, overlap=False):
+        if not overlap:
+            for other in self.query_circle(circle):
+                if circle.overlaps_circle(other):
+                    return False
+        self._contents.append(circle)
+        self._pending[circle] = None
+        self._pending_arrays = None
+        self._max_radius = max(self._max_radius, circle.get_radius())
+        return True
+
+    def bulk_load(self, circles):
+        circles = list(circles)
+        self._contents += circles
+        self._built = None
+
+    def remove(self, circle):
+        self._contents.remove(circle)
+        self._pending.pop(circle, None)
+        self._pending_arrays = None
+        position = self._positions.pop(circle, None)
+        if position is not None:
+            self._valid[position] = False
+
+    def relocate(self, circle):
+        position = self._positions.get(circle)
+        if position is not None and self._valid[position]:
+            self._valid[position] = False
+            self._pending[circle] = None
+        self._pending_arrays = None
+
+    # Centers and radii of the circles, read straight from the arrays of their store when they all share one (the
+    # rows are only looked up again when the circles change).
+    def coordinates(self, circles):
+        if self._rows is None:
+            self._rows = False
+            if len(circles) > 0 and all(hasattr(circle, "get_store") for circle in circles):
+                store = circles[0].get_store()
+                if all(circle.get_store() is store for circle in circles):
+                    self._store = store
+                    self._rows = np.array([circle.get_index() for circle in circles], dtype=np.int64)
+        if self._rows is not False:
+            return self._store._centers[self._rows], self._store._radii[self._rows]
+        centers = np.array([circle.get_center() for circle in circles]).reshape(-1, 2)
+        radii = np.array([circle.get_radius() for circle in circles], dtype=float)
+        return centers, radii
+
+    def rebuild(self):
+        if self._built is None or len(self._built) != len(self._contents) \
+                or len(self._positions) != len(self._contents):
+            self._built = list(self._contents)
+            self._positions = dict(zip(self._built, range(len(self._built))))
+            self._rows = None
+        elif self._store is not None and len(self._built) > 0 and self._built[0].get_store() is not self._store:
+            # The circles moved to another store (see ParticleSystem.share).
+            self._store = None
+            self._rows = None
+        self._pending.clear()
+        self._pending_arrays = None
+        count = len(self._built)
+        self._valid = np.ones(count, dtype=bool)
+        self._centers, self._radii = self.coordinates(self._built)
+        self._max_radius = self._radii.max() if count > 0 else 0
+
+        # The cells are about the size of the largest diameter unless the depth is given.
+        self._depth = self._requested_depth
+        if self._depth is None:
+            cell_size = max(2 * self._max_radius, self._size / 2 ** 16) if count > 0 else self._size
+            self._depth = max(0, int(math.floor(math.log2(self._size / cell_size))))
+        side = 2 ** self._depth
+        cells = np.floor((self._centers - self._origin) / self._size * side).astype(np.int64)
+        cells = np.clip(cells, 0, side - 1)
+        keys = morton_keys(cells[:, 0], cells[:, 1])
+        self._order = np.argsort(keys, kind="stable")
+        keys = keys[self._order]
+
+        # The quadrants of each level, from the root to the cells.
+        self._levels = []
+        for level in range(self._depth + 1):
+            level_keys = keys >> np.uint64(2 * (self._depth - level))
+            starts = np.concatenate(([0], np.flatnonzero(level_keys[1:] != level_keys[:-1]) + 1)) if count > 0 \
+                else np.empty(0, dtype=np.int64)
+            ends = np.concatenate((starts[1:], [count])) if count > 0 else np.empty(0, dtype=np.int64)
+            self._levels.append((level_keys[starts], starts, ends))
+
+    def refresh(self):
+        if self._built is None or len(self._pending) > max(64, math.sqrt(len(self._contents))):
+            self.rebuild()
+
+    # Range of columns and rows of cells overlapped by a bounding box (clamped to the grid).
+    def cell_range(self, x1, y1, x2, y2):
+        side = 2 ** self._depth
+        cell_size = self._size / side
+        ox, oy = self._origin
+        column1 = min(max(math.floor((x1 - ox) / cell_size), 0), side - 1)
+        column2 = min(max(math.floor((x2 - ox) / cell_size), 0), side - 1)
+        row1 = min(max(math.floor((y1 - oy) / cell_size), 0), side - 1)
+        row2 = min(max(math.floor((y2 - oy) / cell_size), 0), side - 1)
+        return column1, column2, row1, row2
+
+    # Indices (in the last build) of the circles whose center is in a bounding box. A small box looks its cells up
+    # directly, a larger one walks down the levels and takes whole quadrants as soon as they are inside.
+    def box_candidates(self, x1, y1, x2, y2):
+        if len(self._built) == 0:
+            return np.empty(0, dtype=np.int64)
+        column1, column2, row1, row2 = self.cell_range(x1, y1, x2, y2)
+        if (column2 - column1 + 1) * (row2 - row1 + 1) <= 64:
+            columns, rows = np.meshgrid(np.arange(column1, column2 + 1), np.arange(row1, row2 + 1))
+            keys, level_starts, level_ends = self._levels[-1]
+            cell_keys = morton_keys(columns.ravel(), rows.ravel())
+            positions = np.minimum(np.searchsorted(keys, cell_keys), len(keys) - 1)
+            positions = positions[keys[positions] == cell_keys]
+            indices = self._order[concatenate_ranges(level_starts[positions], level_ends[positions])]
+            return indices[self._valid[indices]]
+
+        starts = []
+        ends = []
+        frontier = np.zeros(1, dtype=np.int64)
+        for level in range(self._depth + 1):
+            keys, level_starts, level_ends = self._levels[level]
+            node_keys = keys[frontier]
+            span = 2 ** (self._depth - level)
+            left = compact_bits(node_keys) * span
+            top = compact_bits(node_keys >> np.uint64(1)) * span
+            right = left + span - 1
+            bottom = top + span - 1
+            overlap = (left <= column2) & (right >= column1) & (top <= row2) & (bottom >= row1)
+            inside = (left >= column1) & (right <= column2) & (top >= row1) & (bottom <= row2)
+            emitted = frontier[overlap & inside]
+            starts.append(level_starts[emitted])
+            ends.append(level_ends[emitted])
+            partial = frontier[overlap & ~inside]
+            if len(partial) == 0 or level == self._depth:
+                break
+
+            # The leaves of a quadrant are the quadrants of the next level whose codes start with its code.
+            next_keys = self._levels[level + 1][0]
+            first_keys = keys[partial] << np.uint64(2)
+            frontier = concatenate_ranges(np.searchsorted(next_keys, first_keys),
+                                          np.searchsorted(next_keys, first_keys + np.uint64(4)))
+        indices = self._order[concatenate_ranges(np.concatenate(starts), np.concatenate(ends))]
+        return indices[self._valid[indices]]
+
+    # Candidates of a query: the circles of the last build whose center is in the bounding box enlarged by the
+    # largest radius, and the circles kept aside, that pass the given vectorized test.
+    def candidates(self, x1, y1, x2, y2, test):
+        self.refresh()
+        reach = self._max_radius
+        indices = self.box_candidates(x1 - reach, y1 - reach, x2 + reach, y2 + reach)
+        indices = indices[test(self._centers[indices], self._radii[indices])]
+        circles = [self._built[index] for index in indices]
+        if len(self._pending) > 0:
+            if self._pending_arrays is None:
+                pending = list(self._pending)
+                self._pending_arrays = (pending, np.array([circle.get_center() for circle in pending]),
+                                        np.array([circle.get_radius() for circle in pending], dtype=float))
+            pending, centers, radii = self._pending_arrays
+            circles += [pending[index] for index in np.flatnonzero(test(centers, radii))]
+        return circles
+
+    def query_circle(self, circle):
+        center = circle.get_center()
+        radius = circle.get_radius()
+
+        def test(centers, radii):
+            vectors = centers - center
+            thresholds = np.square(radius + radii)
+            return np.einsum("ij,ij->i", vectors, vectors) <= thresholds * (1 + 1e-09)
+
+        return self.candidates(center[0] - radius, center[1] - radius, center[0] + radius, center[1] + radius, test)
+
+    def query_rectangle(self, start, end, margin):
+        vector = end - start
+        squared_length = np.dot(vector, vector)
+
+        def test(centers, radii):
+            t = np.clip((centers - start) @ vector / squared_length, 0, 1) if squared_length > 0 \
+                else np.zeros(len(radii))
+            offsets = centers - (start + t[:, np.newaxis] * vector)
+            thresholds = np.square(margin + radii)
+            return np.einsum("ij,ij->i", offsets, offsets) <= thresholds * (1 + 1e-09)
+
+        x1, y1 = np.minimum(start, end) - margin
+        x2, y2 = np.maximum(start, end) + margin
+        return self.candidates(x1, y1, x2, y2, test)
+
+    # The angles are compared through their cosines, with the slack of formula.angle_between (which rounds them).
+    def query_sector(self, center, direction, angle):
+        radius = math.sqrt(np.dot(direction, direction))
+
+        def test(centers, radii):
+            vectors = centers - center
+            distances = np.sqrt(np.einsum("ij,ij->i", vectors, vectors))
+            with np.errstate(divide="ignore", invalid="ignore"):
+                cosines = vectors @ direction / (distances * radius)
+                extents = np.degrees(np.arcsin(np.clip(radii / distances, 0, 1)))
+            limits = np.cos(np.radians(np.minimum(angle / 2 + extents, 180)))
+            visible = (distances <= radii) | (cosines >= limits - 0.01)
+            return visible & (distances <= (radius + radii) * (1 + 1e-09))
+
+        return self.candidates(center[0] - radius, center[1] - radius, center[0] + radius, center[1] + radius, test)
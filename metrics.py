@@ -0,0 +1,193 @@
+import bisect
+import json
+import math
+import time
+from particle import SystemObserver
+
+# Upper bounds of the buckets of the latency histograms (in seconds): four per decade from a microsecond to 10 seconds.
+LATENCY_BUCKETS = [10 ** (exponent / 4) for exponent in range(-24, 5)]
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+
+    def increment(self, amount=1):
+        self.value += amount
+
+    def reset(self):
+        self.value = 0
+
+    def snapshot(self):
+        return self.value
+
+
+class Gauge:
+    def __init__(self):
+        self.value = None
+
+    def set(self, value):
+        self.value = value
+
+    # A gauge keeps its value until it is set again.
+    def reset(self):
+        pass
+
+    def snapshot(self):
+        return self.value
+
+
+# Distribution of values counted in buckets (the last one holds the values above every bound). The percentiles are the
+# upper bounds of the buckets where they fall, clamped to the largest value observed.
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self._buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self._buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, percent):
+        if self.count == 0:
+            return None
+        rank = percent / 100 * self.count
+        total = 0
+        for i, count in enumerate(self.counts):
+            total += count
+            if total >= rank and count > 0:
+                return min(self._buckets[i], self.max) if i < len(self._buckets) else self.max
+        return self.max
+
+    def reset(self):
+        self.counts = [0] * (len(self._buckets) + 1)
+        self.count = 0
+        self.sum = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def snapshot(self):
+        if self.count == 0:
+            return {"count": 0}
+        return {"count": self.count, "sum": self.sum, "mean": self.sum / self.count, "min": self.min, "max": self.max,
+                "p50": self.percentile(50), "p90": self.percentile(90), "p99": self.percentile(99)}
+
+
+# Time the phases of an operation one after another: each lap records the time since the previous one (or since the
+# stopwatch was started) in the latency histogram of the phase.
+class Stopwatch:
+    def __init__(self, registry, operation):
+        self._registry = registry
+        self._operation = operation
+        self._time = registry.clock()
+
+    def lap(self, phase):
+        now = self._registry.clock()
+        self._registry.observe(self._operation + "." + phase, now - self._time)
+        self._time = now
+
+
+class NullStopwatch:
+    def lap(self, phase):
+        pass
+
+
+NULL_STOPWATCH = NullStopwatch()
+
+
+# Counters, gauges and histograms created on first use and named with dots (operation.phase). A disabled registry
+# records nothing and hands out a stopwatch that does nothing, so the instrumented code only pays for a method call.
+class MetricsRegistry:
+    def __init__(self, enabled=True, clock=time.perf_counter):
+        self.enabled = enabled
+        self.clock = clock
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+
+    def counter(self, name):
+        if name not in self._counters:
+            self._counters[name] = Counter()
+        return self._counters[name]
+
+    def gauge(self, name):
+        if name not in self._gauges:
+            self._gauges[name] = Gauge()
+        return self._gauges[name]
+
+    def histogram(self, name):
+        if name not in self._histograms:
+            self._histograms[name] = Histogram()
+        return self._histograms[name]
+
+    def increment(self, name, amount=1):
+        if self.enabled:
+            self.counter(name).increment(amount)
+
+    def set(self, name, value):
+        if self.enabled:
+            self.gauge(name).set(value)
+
+    def observe(self, name, value):
+        if self.enabled:
+            self.histogram(name).observe(value)
+
+    def stopwatch(self, operation):
+        return Stopwatch(self, operation) if self.enabled else NULL_STOPWATCH
+
+    # Values of every metric, the counters and histograms being reset afterwards if asked (to report intervals).
+    def snapshot(self, reset=False):
+        snapshot = {
+            "counters": {name: counter.snapshot() for name, counter in sorted(self._counters.items())},
+            "gauges": {name: gauge.snapshot() for name, gauge in sorted(self._gauges.items())},
+            "histograms": {name: histogram.snapshot() for name, histogram in sorted(self._histograms.items())},
+        }
+        if reset:
+            self.reset()
+        return snapshot
+
+    def reset(self):
+        for metric in list(self._counters.values()) + list(self._histograms.values()):
+            metric.reset()
+
+
+# Write a snapshot of the metrics of a system as a line of JSON after every interval steps. The counters and histograms
+# of a line cover the steps since the previous one, the gauges include the counters kept by the broad phase.
+class MetricsExporter(SystemObserver):
+    def __init__(self, path, interval=1):
+        self._file = open(path, "w")
+        self._interval = interval
+        self.ticks = 0
+
+    def on_move(self, particle, departure, confined):
+        pass
+
+    def on_search(self, particle, targets, searched):
+        pass
+
+    def on_step(self, system, moved):
+        self.ticks += 1
+        if self.ticks % self._interval == 0:
+            self.write(system)
+
+    def write(self, system):
+        metrics = system.metrics
+        metrics.set("particles", len(system.store))
+        for name in ("quadtree_lookups", "quadtree_comparisons", "linear_comparisons", "collisions"):
+            if hasattr(system.grid, name):
+                metrics.set("grid." + name, getattr(system.grid, name))
+        line = {"tick": self.ticks, "time": time.time()}
+        line.update(metrics.snapshot(reset=True))
+        self._file.write(json.dumps(line) + "\n")
+
+    def close(self):
+        self._file.close()
@@ -1,13 +1,18 @@
 from graphic import Rectangle, Graphic2D
+from broadphase import BroadPhase
+import heapq
 import math
 import formula
 import numpy as np
 
 
+# The contents of a node are the keys of a dictionary (an ordered set with constant time membership and removal).
 class Node:
-    def __init__(self, index=None):
+    def __init__(self, index=None, parent=None):
         self._index = index
-        self._contents = []
+        self._parent = parent
+        self._depth = parent.depth() + 1 if parent else 0
+        self._contents = {}
         self._leaves = []
     
     def contents(self):
@@ -16,11 +21,43 @@ class Node:
     def leaves(self):
         return self._leaves
 
+    def parent(self):
+        return self._parent
+
+    def depth(self):
+        return self._depth
+
 
 class Quadrant(Node, Rectangle):
-    def __init__(self, x, y, width, height, index=None):
-        Node.__init__(self, index=index)
+    def __init__(self, x, y, width, height, index=None, parent=None):
+        Node.__init__(self, index=index, parent=parent)
         Rectangle.__init__(self, x, y, width, height)
+        self._extents = (x, y, width / 2, height / 2)
+
+    # Center and half sizes (the area of a quadrant never changes).
+    def extents(self):
+        return self._extents
+
+    # Same test as collides_circle, on the center and the radius of a circle given as floats (the traversals of the
+    # quadtree test many quadrants against the same circle).
+    def collides_disk(self, x, y, radius):
+        cx, cy, half_width, half_height = self._extents
+        x1 = cx - half_width
+        x2 = cx + half_width
+        y1 = cy - half_height
+        y2 = cy + half_height
+        return (x + radius > x1 or math.isclose(x + radius, x1)) and (x - radius < x2 or math.isclose(x - radius, x2)) \
+            and (y + radius > y1 or math.isclose(y + radius, y1)) and (y - radius < y2 or math.isclose(y - radius, y2))
+
+    # Same test as confines_circle, on the center and the radius of a circle given as floats.
+    def confines_disk(self, x, y, radius):
+        cx, cy, half_width, half_height = self._extents
+        x1 = cx - half_width
+        x2 = cx + half_width
+        y1 = cy - half_height
+        y2 = cy + half_height
+        return (x - radius > x1 or math.isclose(x - radius, x1)) and (x + radius < x2 or math.isclose(x + radius, x2)) \
+            and (y - radius > y1 or math.isclose(y - radius, y1)) and (y + radius < y2 or math.isclose(y + radius, y2))
 
     def draw(self, canvas, fill="", outline="black"):
         super(Quadrant, self).draw(canvas, fill=fill, outline=outline)
@@ -32,6 +69,7 @@ class Quadrant(Node, Rectangle):
         # for i in range(len(self._contents)):
             # self._contents[i].redraw(canvas, fill=fill, outline=outline)
         
+    # Split the quadrant in four and hand its contents down to the new leaves.
     def partition(self):
         if len(self._leaves) == 0:
             width = self._width / 2
@@ -39,7 +77,29 @@ class Quadrant(Node, Rectangle):
             for i in range(4):
                 coord = self.sub_quadrant_coord(i)
                 x, y = coord
-                self._leaves.append(Quadrant(x, y, width, height))
+                self._leaves.append(Quadrant(x, y, width, height, parent=self))
+            for circle in self._contents:
+                quadrants = circle.quadrants()
+                del quadrants[self]
+                x, y = circle.get_center().tolist()
+                radius = circle.get_radius()
+                for quadrant in self._leaves:
+                    if quadrant.collides_disk(x, y, radius):
+                        quadrant.contents()[circle] = None
+                        quadrants[quadrant] = None
+            self._contents.clear()
+
+    # Remove the leaves of the quadrant and take back their contents (the leaves must not be partitioned).
+    def merge(self):
+        for quadrant in self._leaves:
+            for circle in quadrant.contents():
+                quadrants = circle.quadrants()
+                del quadrants[quadrant]
+                quadrants[self] = None
+                self._contents[circle] = None
+        leaves = self._leaves
+        self._leaves = []
+        return leaves
                 
     def sub_quadrant_coord(self, index):
         assert 0 <= index < 4, "Index is out of bounds."
@@ -48,7 +108,7 @@ class Quadrant(Node, Rectangle):
         height = self._height / 4
         if index == 0:
             x += width
-            y -= width
+            y -= height
         elif index == 1:
             x -= width
             y -= height
@@ -60,6 +120,13 @@ class Quadrant(Node, Rectangle):
             y += height
         return np.array([x, y])
     
+    # Leaf whose area contains a point (on the borders, the leaf to the right and below).
+    def leaf_containing(self, point):
+        x, y = self._center
+        if point[0] >= x:
+            return self._leaves[3] if point[1] >= y else self._leaves[0]
+        return self._leaves[2] if point[1] >= y else self._leaves[1]
+
     def circle_overlap(self, circle):
         quadrants = []
         for quadrant in self._leaves:
@@ -68,15 +135,38 @@ class Quadrant(Node, Rectangle):
         return quadrants
 
 
-class Quadtree(Graphic2D):
-    def __init__(self, root=None):
+# A leaf is partitioned when it already holds capacity circles, unless it is at the maximum depth or its leaves would
+# be smaller than the minimum size (by default, the diameter of the circle being inserted). The leaves of a quadrant
+# are merged back as soon as they hold no more than collapse_threshold circles altogether (by default, half the
+# capacity but at least one, so that a lone circle does not keep a branch of leaves).
+# In a loose quadtree, the bounds of each quadrant are extended looseness times around its center and every circle is
+# stored in a single quadrant (leaf or not): the deepest one containing its center whose extended bounds contain it.
+class Quadtree(Graphic2D, BroadPhase):
+    def __init__(self, root=None, capacity=1, max_depth=None, min_size=None, collapse_threshold=None, loose=False,
+                 looseness=2):
         self._contents = []
         self._root = root
+        self._loose = loose
+        self._looseness = looseness
+        self._capacity = capacity
+        self._max_depth = max_depth
+        self._min_size = min_size
+        self._collapse_threshold = max(1, capacity // 2) if collapse_threshold is None else collapse_threshold
+        self._discarded = []
+        self._max_radius = 0
         self.quadtree_lookups = 0
         self.quadtree_comparisons = 0
         self.linear_comparisons = 0
         self.collisions = 0
 
+    @classmethod
+    def from_bounds(cls, x, y, width, height, **options):
+        return cls(Quadrant(x, y, width, height), **options)
+
+    def options(self):
+        return {"capacity": self._capacity, "max_depth": self._max_depth, "min_size": self._min_size,
+                "collapse_threshold": self._collapse_threshold, "loose": self._loose, "looseness": self._looseness}
+
     def contents(self):
         return self._contents
         
@@ -96,22 +186,211 @@ class Quadtree(Graphic2D):
 
     def redraw(self, canvas, fill="", outline="black"):
         def depth_first_search(quadrant):
-            quadrant.redraw(canvas, fill=fill, outline=outline)
+            if quadrant.get_item():
+                quadrant.redraw(canvas, fill=fill, outline=outline)
+            else:
+                quadrant.draw(canvas, fill=fill, outline=outline)
             leaves = quadrant.leaves()
             for i in range(len(leaves)):
                 depth_first_search(leaves[i])
+        for quadrant in self._discarded:
+            canvas.delete(quadrant.get_item())
+        self._discarded.clear()
         depth_first_search(self._root)
 
+    # Check if the split policy allows a leaf to be partitioned to make room for a circle.
+    def can_partition(self, quadrant, circle):
+        if len(quadrant.leaves()) > 0 or len(quadrant.contents()) < self._capacity:
+            return False
+        return self.divisible(quadrant, circle.get_radius())
+
+    # Check if the leaves of a quadrant would respect the maximum depth and the minimum size.
+    def divisible(self, quadrant, radius):
+        if self._max_depth is not None and quadrant.depth() >= self._max_depth:
+            return False
+        width = quadrant.get_width() / 2
+        height = quadrant.get_height() / 2
+        size = self._min_size if self._min_size is not None else 2 * radius
+        return (width > size or math.isclose(width, size)) and (height > size or math.isclose(height, size))
+
+    # Partition the leaves holding more circles than the capacity allows, as far as the split policy goes.
+    def split(self, quadrants, circle):
+        queue = list(quadrants)
+        while len(queue) > 0:
+            quadrant = queue.pop(0)
+            if len(quadrant.contents()) > self._capacity and self.can_partition(quadrant, circle):
+                quadrant.partition()
+                queue += quadrant.leaves()
+
+    # Merge the leaves of the quadrant and of its ancestors for as long as they hold few enough circles.
+    def collapse(self, quadrant):
+        while quadrant is not None:
+            leaves = quadrant.leaves()
+            if len(leaves) == 0 or any(len(leaf.leaves()) > 0 for leaf in leaves):
+                break
+            circles = set(quadrant.contents())
+            for leaf in leaves:
+                circles.update(leaf.contents())
+            if len(circles) > self._collapse_threshold:
+                break
+            self._discarded += [leaf for leaf in quadrant.merge() if leaf.get_item()]
+            quadrant = quadrant.parent()
+
+    # Colliding pairs of circles (touching ones included) and a summary of them: the number of circles, of collisions,
+    # of overlaps (collisions that are not mere contacts) and the deepest penetration.
+    def collision_audit(self):
+        centers = np.array([circle.get_center() for circle in self._contents]).reshape(-1, 2)
+        radii = np.array([circle.get_radius() for circle in self._contents], dtype=float)
+        first, second = formula.colliding_pairs(centers, radii)
+        overlaps = len(formula.colliding_pairs(centers, radii, touching=False)[0])
+        vectors = centers[first] - centers[second]
+        penetrations = radii[first] + radii[second] - np.sqrt(np.einsum("ij,ij->i", vectors, vectors))
+        pairs = [(self._contents[i], self._contents[j]) for i, j in zip(first.tolist(), second.tolist())]
+        summary = {"count": len(radii), "collisions": len(pairs), "overlaps": overlaps,
+                   "penetration": float(penetrations.max()) if len(pairs) > 0 else 0.0}
+        return pairs, summary
+
     def result(self, n):
-        count = len(self._contents)
-        for i in range(count):
-            for j in range(i + 1, count):
-                if self._contents[i].collides_circle(self._contents[j]):
-                    self.collisions += 1
+        pairs, summary = self.collision_audit()
+        count = summary["count"]
+        self.collisions = summary["collisions"]
         print("RESULT")
         print("Collisions: {} ({}%)".format(self.collisions, self.collisions / count * 100))
         print("Count: {}/{} ({}%)".format(count, n, count / n * 100))
 
+    def insert(self, circle, overlap=False):
+        if self._loose:
+            if not overlap:
+                for other in self.query_circle(circle):
+                    if circle.overlaps_circle(other):
+                        return False
+            self.loose_insert(circle, self.loose_quadrant(circle))
+            self._contents.append(circle)
+            self._max_radius = max(self._max_radius, circle.get_radius())
+            return True
+        if overlap:
+            quadrants = self.overlapped_by_circle(circle, leaves_only=True)
+        else:
+            quadrants = self.quadtree_search(circle)
+            if len(quadrants) == 0:
+                return False
+        for quadrant in quadrants:
+            quadrant.contents()[circle] = None
+            circle.quadrants()[quadrant] = None
+        if overlap:
+            self.split(quadrants, circle)
+        self._contents.append(circle)
+        self._max_radius = max(self._max_radius, circle.get_radius())
+        return True
+
+    # Build the quadtree top-down from all the circles at once. A quadtree that already holds circles gets them one at
+    # a time instead, and the leaves they fill are split as in relocate.
+    def bulk_load(self, circles):
+        circles = list(circles)
+        if self._loose or len(self._contents) > 0 or len(self._root.leaves()) > 0:
+            for circle in circles:
+                self.insert(circle, overlap=True)
+            return
+        centers = np.array([circle.get_center() for circle in circles]).reshape(-1, 2)
+        radii = np.array([circle.get_radius() for circle in circles])
+        queue = [(self._root, np.arange(len(circles)))]
+        while len(queue) > 0:
+            quadrant, indices = queue.pop(0)
+            if len(indices) > self._capacity and self.divisible(quadrant, radii[indices].max()):
+                quadrant.partition()
+                for leaf in quadrant.leaves():
+                    x1, y1, x2, y2 = leaf.bounds()
+                    x = centers[indices, 0]
+                    y = centers[indices, 1]
+                    r = radii[indices]
+                    left = (x + r > x1) | np.isclose(x + r, x1, rtol=1e-09, atol=0)
+                    right = (x - r < x2) | np.isclose(x - r, x2, rtol=1e-09, atol=0)
+                    top = (y + r > y1) | np.isclose(y + r, y1, rtol=1e-09, atol=0)
+                    bottom = (y - r < y2) | np.isclose(y - r, y2, rtol=1e-09, atol=0)
+                    queue.append((leaf, indices[left & right & top & bottom]))
+            else:
+                for index in indices:
+                    quadrant.contents()[circles[index]] = None
+                    circles[index].quadrants()[quadrant] = None
+        self._contents += circles
+        if len(circles) > 0:
+            self._max_radius = max(self._max_radius, radii.max())
+
+    # Structure of the quadtree, with the circles given by their positions in a list: whether each quadrant is
+    # partitioned (in breadth-first order), the contents of the quadrants as compressed rows (the contents of quadrant
+    # i are memberships[offsets[i]:offsets[i + 1]]) and the order of the circles in the quadtree.
+    def topology(self, circles):
+        positions = dict(zip(circles, range(len(circles))))
+        partitioned = []
+        counts = []
+        memberships = []
+        queue = [self._root]
+        while len(queue) > 0:
+            quadrant = queue.pop(0)
+            partitioned.append(len(quadrant.leaves()) > 0)
+            counts.append(len(quadrant.contents()))
+            memberships += [positions[circle] for circle in quadrant.contents()]
+            queue += quadrant.leaves()
+        offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(counts)
+        order = np.array([positions[circle] for circle in self._contents], dtype=np.int64)
+        return np.array(partitioned, dtype=bool), offsets, np.array(memberships, dtype=np.int64), order
+
+    # Rebuild a topology of the given circles in the quadtree (which must be empty) without testing them.
+    def restore(self, circles, partitioned, offsets, memberships, order):
+        partitioned = partitioned.tolist()
+        offsets = offsets.tolist()
+        memberships = memberships.tolist()
+        queue = [self._root]
+        i = 0
+        while len(queue) > 0:
+            quadrant = queue.pop(0)
+            if partitioned[i]:
+                quadrant.partition()
+            contents = quadrant.contents()
+            for index in memberships[offsets[i]:offsets[i + 1]]:
+                contents[circles[index]] = None
+                circles[index].quadrants()[quadrant] = None
+            queue += quadrant.leaves()
+            i += 1
+        self._contents += [circles[index] for index in order.tolist()]
+        if len(self._contents) > 0:
+            self._max_radius = max(self._max_radius, max(circle.get_radius() for circle in self._contents))
+
+    def remove(self, circle):
+        quadrants = list(circle.quadrants())
+        for quadrant in quadrants:
+            del quadrant.contents()[circle]
+        circle.quadrants().clear()
+        self._contents.remove(circle)
+        for quadrant in quadrants:
+            self.collapse(quadrant if len(quadrant.leaves()) > 0 else quadrant.parent())
+
+    # Update the leaves of a circle that has moved. The search starts from the closest ancestor of its former
+    # leaves that contains the whole circle instead of the root.
+    def relocate(self, circle):
+        if self._loose:
+            self.loose_relocate(circle)
+            return
+        former_quadrants = circle.quadrants()
+        x, y = circle.get_center().tolist()
+        radius = circle.get_radius()
+        quadrant = next(iter(former_quadrants)) if len(former_quadrants) > 0 else self._root
+        while quadrant.parent() is not None and not quadrant.confines_disk(x, y, radius):
+            quadrant = quadrant.parent()
+        quadrants = dict.fromkeys(self.overlapped_by_disk(x, y, radius, leaves_only=True, quadrant=quadrant))
+        vacated = [quadrant for quadrant in former_quadrants if quadrant not in quadrants]
+        for quadrant in vacated:
+            del quadrant.contents()[circle]
+        for quadrant in quadrants:
+            if quadrant not in former_quadrants:
+                quadrant.contents()[circle] = None
+        former_quadrants.clear()
+        former_quadrants.update(quadrants)
+        self.split(quadrants, circle)
+        for quadrant in vacated:
+            self.collapse(quadrant.parent())
+
     def linear_search(self, circle, overlap=False):
         if not overlap:
             for i in range(len(self._contents)):
@@ -124,19 +403,23 @@ class Quadtree(Graphic2D):
         print("LINEAR SEARCH")
         print("Comparisons: {}".format(self.linear_comparisons))
 
-    def overlapped_by_circle(self, circle, leaves_only=False):
-        queue = [self._root]
+    def overlapped_by_circle(self, circle, leaves_only=False, quadrant=None):
+        x, y = circle.get_center().tolist()
+        return self.overlapped_by_disk(x, y, circle.get_radius(), leaves_only, quadrant)
+
+    def overlapped_by_disk(self, x, y, radius, leaves_only=False, quadrant=None):
+        queue = [quadrant if quadrant else self._root]
         quadrants = []
         while len(queue) > 0:
             quadrant = queue.pop(0)
             if len(quadrant.leaves()) > 0:
-                if not leaves_only:
-                    if quadrant.collides_circle(circle):
+                # The leaves of a quadrant that the circle does not reach cannot be reached either.
+                if quadrant.collides_disk(x, y, radius):
+                    if not leaves_only:
                         quadrants.append(quadrant)
-                candidates = quadrant.leaves()
-                queue += candidates
+                    queue += quadrant.leaves()
             else:
-                if quadrant.collides_circle(circle):
+                if quadrant.collides_disk(x, y, radius):
                     quadrants.append(quadrant)
         return quadrants
 
@@ -153,18 +436,13 @@ class Quadtree(Graphic2D):
                     else:
                         queue += quadrant.circle_overlap(circle)
                 else:
-                    circles = quadrant.contents()
-                    for i in range(len(circles)):
+                    for content in quadrant.contents():
                         self.quadtree_comparisons += 1
-                        if circle.overlaps_circle(circles[i]):
+                        if circle.overlaps_circle(content):
                             quadrants.clear()
                             return quadrants
                     if len(quadrant.leaves()) == 0:
-                        width = quadrant.get_width() / 2
-                        height = quadrant.get_height() / 2
-                        radius = 2 * circle.get_radius()
-                        if (width > radius or math.isclose(width, radius))\
-                                and (height > radius or math.isclose(height, radius)):
+                        if self.can_partition(quadrant, circle):
                             quadrant.partition()
                         if len(quadrant.leaves()) == 0:
                             quadrants.append(quadrant)
@@ -175,115 +453,220 @@ class Quadtree(Graphic2D):
             return quadrants
         return [self._root]
 
+    # Quadrants overlapped by the rectangle swept by a circle of radius margin moving from start to end, a level of the
+    # tree at a time: separating axis test of the oriented rectangle against the extents of the quadrants, whose
+    # leaves are only tested when they are overlapped.
     def rectangle_overlap(self, start, end, margin, canvas):
-        queue = [self._root]
+        vector = end - start
+        length = math.sqrt(np.dot(vector, vector))
+        u = vector / length if length > 0 else np.array([1.0, 0.0])
+        v = np.array([-u[1], u[0]])
+        center = (start + end) / 2
+        half_length = length / 2 + margin
+
+        # Half extents of the rectangle along the axes of the quadrants.
+        rx = half_length * abs(u[0]) + margin * abs(v[0])
+        ry = half_length * abs(u[1]) + margin * abs(v[1])
+        tolerance = 1e-09 * (np.abs(center).max() + half_length)
+
         quadrants = []
+        level = [self._root]
+        while len(level) > 0:
+            extents = np.array([quadrant.extents() for quadrant in level])
+            offsets = extents[:, :2] - center
+            half_widths = extents[:, 2]
+            half_heights = extents[:, 3]
+            overlapped = (np.abs(offsets[:, 0]) <= half_widths + rx + tolerance) \
+                & (np.abs(offsets[:, 1]) <= half_heights + ry + tolerance) \
+                & (np.abs(offsets @ u) <= half_length + half_widths * abs(u[0]) + half_heights * abs(u[1])
+                   + tolerance) \
+                & (np.abs(offsets @ v) <= margin + half_widths * abs(v[0]) + half_heights * abs(v[1]) + tolerance)
+            level = [quadrant for quadrant, overlaps in zip(level, overlapped.tolist()) if overlaps]
+            quadrants += level
+            level = [leaf for quadrant in level for leaf in quadrant.leaves()]
+        return quadrants
+
+    # Quadrants overlapped by the field of view facing the direction vector (its magnitude is the range), a level of
+    # the tree at a time. The test keeps every quadrant that may hold the center of a circle seen by Particle.search:
+    # the sector is widened by the largest radius (a circle is seen as soon as it meets the sector) and by the rounding
+    # of the angles of the search (their cosines are rounded to 2 decimals by formula.angle_between). Seen from the
+    # center, a quadrant spans the angles of the circle around it.
+    def sector_overlap(self, center, direction, angle):
+        radius = math.sqrt(np.dot(direction, direction))
+        reach = radius + self._max_radius
+        tolerance = 1e-09 * (np.abs(center).max() + reach)
+
+        quadrants = []
+        level = [self._root]
+        while len(level) > 0:
+            extents = np.array([quadrant.extents() for quadrant in level])
+            offsets = extents[:, :2] - center
+            circumradii = np.hypot(extents[:, 2], extents[:, 3])
+            distances = np.sqrt(np.einsum("ij,ij->i", offsets, offsets))
+
+            # The closest point of the quadrant is within range.
+            gaps = np.maximum(np.abs(offsets) - extents[:, 2:], 0)
+            in_range = np.einsum("ij,ij->i", gaps, gaps) <= np.square(reach + tolerance)
+
+            # The angle of the quadrant meets the field of view (the quadrants around the center always do).
+            with np.errstate(divide="ignore", invalid="ignore"):
+                angles = np.degrees(np.arccos(np.clip(offsets @ direction / (distances * radius), -1, 1)))
+                widths = np.degrees(np.arcsin(np.clip(self._max_radius / (distances - circumradii), 0, 1)))
+                limits = np.cos(np.radians(np.minimum(angle / 2 + widths, 180))) - 0.01
+                limits = np.degrees(np.arccos(np.maximum(limits, -1)))
+                limits += np.degrees(np.arcsin(np.clip(circumradii / distances, 0, 1)))
+            near = distances <= circumradii + self._max_radius + tolerance
+            overlapped = in_range & (near | (angles <= limits + 1e-09))
+
+            level = [quadrant for quadrant, overlaps in zip(level, overlapped.tolist()) if overlaps]
+            quadrants += level
+            level = [leaf for quadrant in level for leaf in quadrant.leaves()]
+        return quadrants
+
+    # Circles stored in the given quadrants, without duplicates.
+    def gather(self, quadrants):
+        circles = {}
+        for quadrant in quadrants:
+            circles.update(quadrant.contents())
+        return list(circles)
+
+    def query_circle(self, circle):
+        if self._loose:
+            x, y = circle.get_center()
+            radius = circle.get_radius()
+            return self.loose_gather(x - radius, y - radius, x + radius, y + radius)
+        return self.gather(self.overlapped_by_circle(circle, leaves_only=True))
+
+    def query_rectangle(self, start, end, margin):
+        if self._loose:
+            x1, y1 = np.minimum(start, end) - margin
+            x2, y2 = np.maximum(start, end) + margin
+            return self.loose_gather(x1, y1, x2, y2)
+        return self.gather(self.rectangle_overlap(start, end, margin, None))
 
-        # Vectors used to find the four corners of the rectangle.
-        v1 = formula.resize_vector(end - start, margin)
-        v2 = -v1
-        v3 = formula.rotate_vector(v1, 90)
-        v4 = -v3
-
-        # The four corners of the rectangle.
-        p1 = start + v2 + v3
-        p2 = start + v2 + v4
-        p3 = end + v1 + v3
-        p4 = end + v1 + v4
-
-        # The borders of the rectangle
-        border_12 = formula.Segment(p1, p2)
-        border_13 = formula.Segment(p1, p3)
-        border_24 = formula.Segment(p2, p4)
-        border_34 = formula.Segment(p3, p4)
-
-        # Visual representation of the rectangle.
-        # canvas.create_line(p1[0], p1[1], p2[0], p2[1], fill="blue", width=2)
-        # canvas.create_line(p3[0], p3[1], p4[0], p4[1], fill="blue", width=2)
-        # canvas.create_line(p1[0], p1[1], p3[0], p3[1], fill="blue", width=2)
-        # canvas.create_line(p2[0], p2[1], p4[0], p4[1], fill="blue", width=2)
-
-        # Iterate through a list of quadrants overlapped by the rectangle.
+    def query_sector(self, center, direction, angle):
+        if self._loose:
+            radius = math.sqrt(np.dot(direction, direction))
+            return self.loose_gather(center[0] - radius, center[1] - radius, center[0] + radius, center[1] + radius)
+        return self.gather(self.sector_overlap(center, direction, angle))
+
+    # Lower bound of the distance from a point to the surface of the circles stored under a quadrant: they all meet
+    # its area (its extended area in a loose quadtree, the root of which may hold circles anywhere).
+    def distance_bound(self, point, quadrant):
+        if self._loose and quadrant.parent() is None:
+            return -self._max_radius
+        x, y, half_width, half_height = quadrant.extents()
+        if self._loose:
+            half_width *= self._looseness
+            half_height *= self._looseness
+        dx = max(abs(point[0] - x) - half_width, 0)
+        dy = max(abs(point[1] - y) - half_height, 0)
+        return math.sqrt(dx * dx + dy * dy) - 2 * self._max_radius
+
+    # Best-first traversal of the quadtree from a point: the circles are yielded by increasing distance from the point
+    # to their surface (negative inside them), the quadrants being opened only when they may hold a closer circle. The
+    # traversal stops at the first circle or quadrant farther than the limit.
+    def closest(self, point, exclude=None, limit=math.inf):
+        visited = {exclude: None} if exclude is not None else {}
+        heap = [(self.distance_bound(point, self._root), 0, False, self._root)]
+        count = 1
+        while len(heap) > 0:
+            distance, _, is_circle, item = heapq.heappop(heap)
+            if distance > limit and not math.isclose(distance, limit):
+                return
+            if is_circle:
+                yield item, distance
+                continue
+            for circle in item.contents():
+                if circle not in visited:
+                    visited[circle] = None
+                    vector = circle.get_center() - point
+                    surface_distance = math.sqrt(np.dot(vector, vector)) - circle.get_radius()
+                    heapq.heappush(heap, (surface_distance, count, True, circle))
+                    count += 1
+            for leaf in item.leaves():
+                heapq.heappush(heap, (self.distance_bound(point, leaf), count, False, leaf))
+                count += 1
+
+    # The k circles closest to a point, by distance to their surface.
+    def nearest(self, point, k=1, exclude=None):
+        circles = []
+        if k > 0:
+            for circle, distance in self.closest(np.asarray(point, dtype=float), exclude):
+                circles.append(circle)
+                if len(circles) == k:
+                    break
+        return circles
+
+    # Circles whose surface is within radius of a point, the closest first.
+    def within(self, point, radius, exclude=None):
+        circles = []
+        for circle, distance in self.closest(np.asarray(point, dtype=float), exclude, radius):
+            circles.append(circle)
+        return circles
+
+    def loose_bounds(self, quadrant):
+        x1, y1, x2, y2 = quadrant.bounds()
+        dx = (self._looseness - 1) * quadrant.get_width() / 2
+        dy = (self._looseness - 1) * quadrant.get_height() / 2
+        return x1 - dx, y1 - dy, x2 + dx, y2 + dy
+
+    # Check if the extended bounds of a quadrant containing the center of a circle also contain the whole circle.
+    def loosely_fits(self, quadrant, radius):
+        return quadrant.parent() is None \
+            or radius <= (self._looseness - 1) * min(quadrant.get_width(), quadrant.get_height()) / 2
+
+    def loose_quadrant(self, circle, quadrant=None):
+        quadrant = quadrant if quadrant else self._root
+        center = circle.get_center()
+        radius = circle.get_radius()
+        while len(quadrant.leaves()) > 0:
+            leaf = quadrant.leaf_containing(center)
+            if not self.loosely_fits(leaf, radius):
+                break
+            quadrant = leaf
+        return quadrant
+
+    # Store a circle in a quadrant of the loose quadtree, partitioning it if it holds too many circles.
+    def loose_insert(self, circle, quadrant):
+        quadrant.contents()[circle] = None
+        circle.quadrants()[quadrant] = None
+        if len(quadrant.leaves()) == 0 and len(quadrant.contents()) > self._capacity \
+                and self.divisible(quadrant, circle.get_radius()):
+            circles = list(quadrant.contents())
+            quadrant.contents().clear()
+            quadrant.partition()
+            for other in circles:
+                del other.quadrants()[quadrant]
+                self.loose_insert(other, self.loose_quadrant(other, quadrant))
+
+    # Climb from the quadrant of a circle that has moved until its center is inside, then descend again.
+    def loose_relocate(self, circle):
+        former_quadrant = next(iter(circle.quadrants()))
+        quadrant = former_quadrant
+        center = circle.get_center()
+        while quadrant.parent() is not None \
+                and not (quadrant.contains_point(center) and self.loosely_fits(quadrant, circle.get_radius())):
+            quadrant = quadrant.parent()
+        quadrant = self.loose_quadrant(circle, quadrant)
+        if quadrant is not former_quadrant:
+            del former_quadrant.contents()[circle]
+            del circle.quadrants()[former_quadrant]
+            self.loose_insert(circle, quadrant)
+            self.collapse(former_quadrant if len(former_quadrant.leaves()) > 0 else former_quadrant.parent())
+
+    # Circles stored in the quadrants whose extended bounds overlap a bounding box.
+    def loose_gather(self, x1, y1, x2, y2):
+        circles = []
+        queue = [self._root]
         while len(queue) > 0:
             quadrant = queue.pop(0)
-            center = quadrant.get_center()
-            width = quadrant.get_width()
-            height = quadrant.get_height()
-            centerline = formula.Segment(start, end)
-            distance_from_centerline = centerline.distance_from_point(center)
-
-            # The boundary of the current quadrant.
-            x1 = center[0] - width / 2
-            x2 = center[0] + width / 2
-            y1 = center[1] - height / 2
-            y2 = center[1] + height / 2
-
-            # The four corners of the current quadrant.
-            north_west = np.array([x1, y1])
-            north_east = np.array([x2, y1])
-            south_west = np.array([x1, y2])
-            south_east = np.array([x2, y2])
-
-            # The borders of the current quadrant.
-            north_border = formula.Segment(north_west, north_east)
-            south_border = formula.Segment(south_west, south_east)
-            west_border = formula.Segment(north_west, south_west)
-            east_border = formula.Segment(north_east, south_east)
-
-            # Check if the quadrant is inside the rectangle.
-            if distance_from_centerline < margin or math.isclose(distance_from_centerline, margin):
-                quadrants.append(quadrant)
+            qx1, qy1, qx2, qy2 = self.loose_bounds(quadrant)
+            if qx1 <= x2 and x1 <= qx2 and qy1 <= y2 and y1 <= qy2:
+                circles += quadrant.contents()
                 queue += quadrant.leaves()
+        return circles
 
-            # Check if one of the borders of the rectangle goes through the center of the current quadrant.
-            elif border_12.intersects_point(center)\
-                    or border_13.intersects_point(center)\
-                    or border_24.intersects_point(center)\
-                    or border_34.intersects_point(center):
-                quadrants.append(quadrant)
-                queue += quadrant.leaves()
-            
-            # Check if one of the corners of the rectangle is inside the current quadrant.
-            elif quadrant.contains_point(p1):
-                quadrants.append(quadrant)
-                queue += quadrant.leaves()
-            elif quadrant.contains_point(p2):
-                quadrants.append(quadrant)
-                queue += quadrant.leaves()
-            elif quadrant.contains_point(p3):
-                quadrants.append(quadrant)
-                queue += quadrant.leaves()
-            elif quadrant.contains_point(p4):
-                quadrants.append(quadrant)
-                queue += quadrant.leaves()
-                
-            # Check if one of the segments of the rectangle intersects a quadrant.
-            elif west_border.intersects_segment(border_12)\
-                    or east_border.intersects_segment(border_12)\
-                    or north_border.intersects_segment(border_12)\
-                    or south_border.intersects_segment(border_12):
-                quadrants.append(quadrant)
-                queue += quadrant.leaves()
-            elif west_border.intersects_segment(border_13)\
-                    or east_border.intersects_segment(border_13)\
-                    or north_border.intersects_segment(border_13)\
-                    or south_border.intersects_segment(border_13):
-                quadrants.append(quadrant)
-                queue += quadrant.leaves()
-            elif west_border.intersects_segment(border_24)\
-                    or east_border.intersects_segment(border_24)\
-                    or north_border.intersects_segment(border_24)\
-                    or south_border.intersects_segment(border_24):
-                quadrants.append(quadrant)
-                queue += quadrant.leaves()
-            elif west_border.intersects_segment(border_34)\
-                    or east_border.intersects_segment(border_34)\
-                    or north_border.intersects_segment(border_34)\
-                    or south_border.intersects_segment(border_34):
-                quadrants.append(quadrant)
-                queue += quadrant.leaves()
-        return quadrants
-                    
     def quadtree_search_result(self):
         print("QUADTREE SEARCH")
         print("Lookups: {}".format(self.quadtree_lookups))
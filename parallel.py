@@ -0,0 +1,253 @@
+import multiprocessing
+import numpy as np
+import collision
+import formula
+from multiprocessing import shared_memory
+
+
+# Arrays shared by a ParallelStepper and its workers for capacity particles: the positions, radii and moves of the
+# particles, the limits of the moves, the moved flags at the end of the revert rounds and the flags of the workers that
+# reverted moves in them (both by parity of the round, so that a round never overwrites the one being read).
+def exchange_fields(capacity, workers):
+    return (("centers", np.float64, (capacity, 2)), ("radii", np.float64, (capacity,)),
+            ("displacements", np.float64, (capacity, 2)), ("limits", np.float64, (capacity,)),
+            ("moved", np.bool_, (2, capacity)), ("reverted", np.bool_, (2, workers)))
+
+
+# The arrays of exchange_fields in a single shared memory segment, created by the stepper and attached to by name in
+# the workers.
+class Exchange:
+    def __init__(self, capacity, workers, name=None):
+        fields = exchange_fields(capacity, workers)
+        sizes = [-(-int(np.prod(shape)) * np.dtype(dtype).itemsize // 8) * 8 for field, dtype, shape in fields]
+        if name is None:
+            self._memory = shared_memory.SharedMemory(create=True, size=max(sum(sizes), 8))
+        else:
+            self._memory = shared_memory.SharedMemory(name=name)
+        self._owner = name is None
+        self.capacity = capacity
+        self.workers = workers
+        offset = 0
+        for (field, dtype, shape), size in zip(fields, sizes):
+            setattr(self, field, np.ndarray(shape, dtype=dtype, buffer=self._memory.buf, offset=offset))
+            offset += size
+
+    def get_name(self):
+        return self._memory.name
+
+    def close(self):
+        for field, dtype, shape in exchange_fields(0, 0):
+            setattr(self, field, None)
+        self._memory.close()
+        if self._owner:
+            self._memory.unlink()
+
+
+# Process owning a strip of the zone. Its index is the list of the close pairs of its particles (the ones inside the
+# strip when it is built first, then the halo of the particles close enough to collide with them), found within a
+# cutoff that covers the moves of the next steps: it is only rebuilt when the stepper asks. For every step it limits
+# the moves of its particles like ParticleSystem.step, then reverts the moves to the same place round after round. The
+# workers swap the limits and the moved flags of their particles through the exchange, the rounds being kept in step
+# by the barrier.
+def strip_worker(connection, shape, barrier, worker):
+    exchange = None
+    owned = None
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+        command = message[0]
+        if command == "exchange":
+            _, name, capacity, workers = message
+            if exchange is not None:
+                exchange.close()
+            exchange = Exchange(capacity, workers, name=name)
+        elif command == "step":
+            _, count, index = message
+            migrations = 0
+            if index is not None:
+                lower, upper, cutoff = index
+                x = exchange.centers[:count, 0]
+                band = cutoff * (1 + 1e-09)
+                inside = (x >= lower) & (x < upper)
+                halo = ~inside & (x >= lower - band) & (x < upper + band)
+                if owned is not None:
+                    migrations = len(np.setdiff1d(np.flatnonzero(inside), local[:owned], assume_unique=True))
+                local = np.concatenate((np.flatnonzero(inside), np.flatnonzero(halo)))
+                owned = np.count_nonzero(inside)
+
+                # The pairs are oriented by global index like in ParticleSystem.step, at least one particle is owned.
+                first, second = formula.close_pairs(exchange.centers[local], band)
+                keep = (first < owned) | (second < owned)
+                first = first[keep]
+                second = second[keep]
+                swap = local[first] > local[second]
+                first[swap], second[swap] = second[swap], first[swap]
+                radii = exchange.radii[local]
+                distances = radii[first] + radii[second]
+                squared_distances = np.square(distances)
+
+            # Limits of the moves (the zone and the first obstacle along the way).
+            centers = exchange.centers[local]
+            displacements = exchange.displacements[local]
+            vectors = centers[first] - centers[second]
+            limits = np.ones(len(local))
+            limits[:owned] = shape.confinement_limits(centers[:owned], radii[:owned], displacements[:owned])
+            np.minimum.at(limits, first, collision.time_of_impact(vectors, displacements[first], distances))
+            np.minimum.at(limits, second, collision.time_of_impact(-vectors, displacements[second], distances))
+            exchange.limits[local[:owned]] = limits[:owned]
+            barrier.wait()
+
+            # Revert the moves to the same place until no worker reverts any.
+            limits = exchange.limits[local]
+            destinations = centers + limits[:, np.newaxis] * displacements
+            moved = limits > 0
+            rounds = 0
+            while True:
+                rounds += 1
+                parity = rounds % 2
+                vectors = destinations[first] - destinations[second]
+                squared_gaps = np.einsum("ij,ij->i", vectors, vectors)
+                overlaps = (squared_gaps < squared_distances) \
+                    & ~np.isclose(squared_gaps, squared_distances, rtol=1e-09, atol=0) \
+                    & (moved[first] | moved[second])
+                reverted = np.where(moved[second[overlaps]], second[overlaps], first[overlaps])
+                reverted = reverted[reverted < owned]
+                moved[reverted] = False
+                exchange.moved[parity, local[:owned]] = moved[:owned]
+                exchange.reverted[parity, worker] = len(reverted) > 0
+                barrier.wait()
+                if not exchange.reverted[parity].any():
+                    break
+                moved = exchange.moved[parity, local]
+                destinations[~moved] = centers[~moved]
+            indices = np.flatnonzero(moved[:owned])
+            exchange.centers[local[indices]] = destinations[indices]
+            connection.send((migrations, rounds))
+    if exchange is not None:
+        exchange.close()
+    connection.close()
+
+
+# Step a particle system with the rule of ParticleSystem.step, the zone being split into vertical strips owned by
+# worker processes. The borders of the strips hold as many particles on each side (they are set again every rebalance
+# steps). The indexes of the workers cover the reach of a step plus a skin (by default the largest radius, rounded
+# down to whole steps), and are only rebuilt (taking the particles that crossed a border since the last build) once
+# the particles may have moved by half the skin, or when the system or the borders changed. The coordinator only draws
+# the moves, copies the particles that moved back to the store of the system and notifies the observers: the broad
+# phase of the system is brought up to date by sync (close calls it), each particle moved since being relocated once.
+class ParallelStepper:
+    def __init__(self, system, workers=None, rebalance=100, skin=None, context=None):
+        assert skin is None or skin >= 0, "The skin cannot be negative."
+        self._system = system
+        self._count = workers if workers is not None else multiprocessing.cpu_count()
+        self._rebalance = rebalance
+        self._skin = skin
+        self._borders = None
+        self._steps = 0
+        self._indexed = None
+        self._cutoff = 0
+        self._travelled = 0
+        self._pending = np.zeros(0, dtype=bool)
+        self._connections = []
+        self._processes = []
+        self.migrations = 0
+        self.rounds = 0
+        self.indexes = 0
+        context = context if context is not None else multiprocessing.get_context()
+        barrier = context.Barrier(self._count)
+
+        # The exchange is created before the workers so that they share the resource tracker of the coordinator.
+        self._exchange = Exchange(max(len(system.store), 1), self._count)
+        for i in range(self._count):
+            connection, worker_connection = context.Pipe()
+            process = context.Process(target=strip_worker, args=(worker_connection, system.shape, barrier, i),
+                                      daemon=True)
+            process.start()
+            worker_connection.close()
+            self._connections.append(connection)
+            self._processes.append(process)
+            connection.send(("exchange", self._exchange.get_name(), self._exchange.capacity, self._count))
+
+    def get_borders(self):
+        return self._borders
+
+    # Inner borders of the strips, splitting the particles in groups of the same size.
+    def balance(self, x):
+        self._borders = np.quantile(x, np.arange(1, self._count) / self._count) if len(x) > 0 else np.zeros(0)
+
+    def step(self, dt=1, speed=50):
+        system = self._system
+        count = len(system.store)
+        if count == 0:
+            return
+        centers = system.store.centers()
+        radii = system.store.radii()
+        angles = 2 * np.pi * np.random.random(count)
+        displacements = speed * dt * np.column_stack((np.cos(angles), np.sin(angles)))
+        reach = 2 * radii.max() + 2 * speed * dt
+        if self._exchange.capacity < count:
+            self._exchange.close()
+            self._exchange = Exchange(max(count, 2 * self._exchange.capacity), self._count)
+            for connection in self._connections:
+                connection.send(("exchange", self._exchange.get_name(), self._exchange.capacity, self._count))
+            self._indexed = None
+        exchange = self._exchange
+        exchange.displacements[:count] = displacements
+
+        # The indexes of the workers are rebuilt when a pair of particles may have come within reach since the last
+        # build, or the particles were changed outside the stepper.
+        rebalance = self._borders is None or self._steps % self._rebalance == 0
+        self._steps += 1
+        if rebalance or self._indexed != count or reach + 2 * self._travelled > self._cutoff \
+                or not np.array_equal(exchange.centers[:count], centers) \
+                or not np.array_equal(exchange.radii[:count], radii):
+            exchange.centers[:count] = centers
+            exchange.radii[:count] = radii
+            if rebalance:
+                self.balance(centers[:, 0])
+            borders = np.concatenate(([-np.inf], self._borders, [np.inf]))
+            skin = self._skin if self._skin is not None else radii.max()
+            self._cutoff = reach + (skin // (2 * speed * dt) * 2 * speed * dt if speed * dt > 0 else skin)
+            self._travelled = 0
+            self._indexed = count
+            self.indexes += 1
+            for i, connection in enumerate(self._connections):
+                connection.send(("step", count, (borders[i], borders[i + 1], self._cutoff)))
+        else:
+            for connection in self._connections:
+                connection.send(("step", count, None))
+
+        replies = [connection.recv() for connection in self._connections]
+        self.migrations += sum(migrations for migrations, rounds in replies)
+        rounds = replies[0][1]
+        self.rounds += rounds
+        self._travelled += speed * dt
+
+        indices = np.flatnonzero(exchange.moved[rounds % 2, :count])
+        centers[indices] = exchange.centers[indices]
+        if len(self._pending) < count:
+            self._pending = np.concatenate((self._pending, np.zeros(count - len(self._pending), dtype=bool)))
+        self._pending[indices] = True
+        system.notify("on_step", system, indices)
+
+    # Relocate in the broad phase of the system the particles moved since the last update, once each.
+    def sync(self):
+        system = self._system
+        indices = np.flatnonzero(self._pending)
+        self._pending[indices] = False
+        for index in indices:
+            system.grid.relocate(system.particles[index])
+
+    def close(self):
+        self.sync()
+        for connection in self._connections:
+            connection.send(None)
+            connection.close()
+        for process in self._processes:
+            process.join()
+        if self._exchange is not None:
+            self._exchange.close()
+            self._exchange = None
+        self._connections = []
+        self._processes = []
@@ -1,11 +1,22 @@
 import numpy as np
+import collision
 import formula
 import math
-import tkinter as tk
-from node import Quadtree, Quadrant
+from node import Quadtree
+from grid import HashGrid
 from abc import ABCMeta
 from graphic import Circle, Rectangle
-from random import random, seed
+from random import random
+from store import ParticleStore
+
+# The metrics, the checkpoints, the linear quadtree and the shared memory are imported where they are used, so that
+# importing the simulation core stays cheap.
+
+# Magic, version and length of the JSON header of the checkpoints of a particle system (a struct format).
+CHECKPOINT = "<4sII"
+CHECKPOINT_MAGIC = b"PSYS"
+# Version 2 adds the alive flags of the particles.
+CHECKPOINT_VERSION = 2
 
 
 # Particle behavior interfaces.
@@ -37,15 +48,97 @@ class TrackingBehavior(metaclass=ABCMeta):
         raise NotImplementedError
 
 
+# Observer of the state of a particle system (a renderer for instance), see ParticleSystem.subscribe.
+class SystemObserver(metaclass=ABCMeta):
+    @classmethod
+    def __subclasscheck__(cls, subclass):
+        return (hasattr(subclass, 'on_move') and callable(subclass.on_move) and
+                hasattr(subclass, 'on_search') and callable(subclass.on_search) and
+                hasattr(subclass, 'on_step') and callable(subclass.on_step) or
+                NotImplemented)
+
+    # A particle has moved from its departure, or could not be kept inside the zone.
+    def on_move(self, particle, departure, confined):
+        raise NotImplementedError
+
+    # A particle has found targets among the particles searched in its field of view.
+    def on_search(self, particle, targets, searched):
+        raise NotImplementedError
+
+    # Every particle has moved at once, moved holds the indices of the ones that did.
+    def on_step(self, system, moved):
+        raise NotImplementedError
+
+
+# The state of a particle is a row of a ParticleStore: a private one until the particle joins a system.
 class Particle(Circle, MotionBehavior, TrackingBehavior):
-    def __init__(self, x=0, y=0, radius=1, field_of_view=None, tag=None, world=None):
+    def __init__(self, x=0, y=0, radius=1, field_of_view=None, tag=None, world=None, store=None):
+        self._store = store if store is not None else ParticleStore(1)
+        self._index = self._store.allocate()
         super(Particle, self).__init__(x, y, radius)
         self.field_of_view = field_of_view
         self.tag = tag
         self.world = world
+        self._quadrants = {}
+
+    @property
+    def _center(self):
+        return self._store._centers[self._index]
+
+    @_center.setter
+    def _center(self, center):
+        self._store._centers[self._index] = center
+
+    @property
+    def _radius(self):
+        return self._store._radii[self._index]
+
+    @_radius.setter
+    def _radius(self, radius):
+        self._store._radii[self._index] = radius
+
+    @property
+    def _rotation(self):
+        return self._store._rotations[self._index]
+
+    @_rotation.setter
+    def _rotation(self, rotation):
+        self._store._rotations[self._index] = rotation
+
+    @property
+    def field_of_view(self):
+        field_of_view = self._store._fields_of_view[self._index]
+        return None if np.isnan(field_of_view[0]) else field_of_view
+
+    @field_of_view.setter
+    def field_of_view(self, field_of_view):
+        self._store._fields_of_view[self._index] = np.nan if field_of_view is None else field_of_view
+
+    def get_index(self):
+        return self._index
+
+    def get_store(self):
+        return self._store
+
+    # The leaves of the quadtree that contain the particle.
+    def quadrants(self):
+        return self._quadrants
+
+    # Move the state of the particle to a new row of the given store.
+    def attach(self, store):
+        index = store.allocate()
+        store._centers[index] = self._store._centers[self._index]
+        store._radii[index] = self._store._radii[self._index]
+        store._rotations[index] = self._store._rotations[self._index]
+        store._fields_of_view[index] = self._store._fields_of_view[self._index]
+        store._alive[index] = self._store._alive[self._index]
+        self._store = store
+        self._index = index
 
     def move(self, magnitude, direction=None, min_angle=0, max_angle=360, phasing=False):
         assert min_angle <= max_angle, "The minimum angle must be smaller than maximum angle."
+        metrics = self.world.metrics
+        stopwatch = metrics.stopwatch("move")
         angle = math.degrees(math.acos(direction[0] / 0)) if direction \
             else math.radians(random() * (max_angle - min_angle) + min_angle)
         x = magnitude * math.cos(angle)
@@ -55,6 +148,8 @@ class Particle(Circle, MotionBehavior, TrackingBehavior):
         departure = self.get_center()
         destination = departure + displacement
         self.set_center(destination[0], destination[1])
+        confined = True
+        moved = False
 
         # Check if the particle is still inside the zone.
         if not self.world.shape.confines_circle(self):
@@ -62,91 +157,41 @@ class Particle(Circle, MotionBehavior, TrackingBehavior):
             displacement = destination - departure
             squared_distance = np.dot(displacement, displacement)
             self.set_center(destination[0], destination[1])
-            if not self.world.shape.confines_circle(self):
-                canvas.create_oval(destination[0] - self.get_radius(), destination[1] - self.get_radius(),
-                                   destination[0] + self.get_radius(), destination[1] + self.get_radius(), fill="red")
+            confined = self.world.shape.confines_circle(self)
+        stopwatch.lap("confinement")
 
         # Check if the particle collides with other particles along its path.
         if not math.isclose(squared_distance, 0, rel_tol=1e-09):
             self.set_center(departure[0], departure[1])
-            quadrants = self.world.grid.rectangle_overlap(departure, destination, self.get_radius(), canvas)
-            trajectory = formula.Segment(departure, destination)
-            particles = set()
-            obstacles = set()
-            for quadrant in quadrants:
-                contents = quadrant.contents()
-                for content in contents:
-                    if content != self:
-                        particles.add(content)
-                        point = content.get_center()
-                        vector = point - departure
-                        theta = formula.angle_between(displacement, vector)
-                        if theta < 90 and not math.isclose(theta, 90):
-                            distance_from_trajectory = trajectory.squared_distance_from_point(point)
-                            distance_from_obstacle = self.squared_distance_from_point(point)
-                            rectangle_width = self.get_radius() + content.get_radius()
-                            if distance_from_trajectory < math.pow(rectangle_width, 2):
-                                distance_along_trajectory = distance_from_obstacle - distance_from_trajectory \
-                                    if not math.isclose(distance_from_trajectory, 0, rel_tol=1e-09) \
-                                    else distance_from_obstacle
-                                rectangle_length = math.sqrt(
-                                    squared_distance) + self.get_radius() + content.get_radius()
-                                if distance_along_trajectory < math.pow(rectangle_length, 2):
-                                    obstacles.add(content)
-                                    # content.redraw(canvas, fill="red")
-            obstacles = list(obstacles)
-            obstacles.sort(key=lambda particle: self.distance_from_circle(particle))
-            non_obstacles = list(particles.difference(obstacles))
-            non_obstacles.sort(key=lambda particle: self.distance_from_circle(particle))
-
-            # Movement stops at the nearest obstacle.
-            j = 0
-            while j < len(obstacles):
-                point = obstacles[j].get_center()
-                distance_from_trajectory = trajectory.squared_distance_from_point(point)
-                distance_from_obstacle = math.pow(obstacles[j].get_radius() + self.get_radius(), 2)
-                projection = formula.project_vector(point - departure, displacement)
-                distance_from_position = math.sqrt(distance_from_obstacle - distance_from_trajectory)
-                delta = formula.resize_vector(displacement, distance_from_position)
-                destination = departure + projection - delta
-                vector = destination - departure
-                squared_magnitude = np.dot(vector, vector)
-
-                # Check if the magnitude of the corrected displacement is less than or equal to the original.
-                if squared_magnitude > squared_distance and not math.isclose(squared_magnitude, squared_distance):
-                    displacement = formula.resize_vector(vector, math.sqrt(squared_distance))
-                    destination = departure + displacement
-                    squared_distance = np.dot(displacement, displacement)
-
-                # Check if the particle collides with other obstacles.
-                self.set_center(destination[0], destination[1])
-                j += 1
-                while j < len(obstacles):
-                    if self.overlaps_circle(obstacles[j]):
-                        break
-                    j += 1
-
-            # Check if the particle overlaps other particles that were outside the path.
-            for j in range(len(non_obstacles)):
-                if self.overlaps_circle(non_obstacles[j]):
-                    destination = departure
-                    break
+            contents = self.world.grid.query_rectangle(departure, destination, self.get_radius())
+            contents = [content for content in contents if content != self]
+            stopwatch.lap("broad_phase")
+            metrics.increment("move.candidates", len(contents))
+            centers = np.array([content.get_center() for content in contents]).reshape(-1, 2)
+            radii = np.array([content.get_radius() for content in contents], dtype=float)
+
+            # Movement stops at the first contact, or does not happen if the particle would still overlap another one.
+            time = collision.sweep_circle(departure, self.get_radius(), displacement, centers, radii)
+            destination = departure + time * displacement
+            if collision.overlapped_circles(destination, self.get_radius(), centers, radii).any():
+                destination = departure
 
             # Update the coordinate of the particle.
             displacement = destination - departure
             squared_distance = np.dot(displacement, displacement)
             self.set_center(destination[0], destination[1])
+            stopwatch.lap("narrow_phase")
 
             # Update the quadtree.
             if not math.isclose(squared_distance, 0, rel_tol=1e-09):
-                for quadrant in quadrants:
-                    if self in quadrant.contents():
-                        quadrant.contents().remove(self)
-                quadrants = self.world.grid.overlapped_by_circle(self)
-                for quadrant in quadrants:
-                    if self not in quadrant.contents() and len(quadrant.leaves()) == 0:
-                        quadrant.contents().append(self)
-                self.redraw(canvas)
+                self.world.grid.relocate(self)
+                moved = True
+                stopwatch.lap("reindex")
+        metrics.increment("move.calls")
+        metrics.increment("move.moved", moved)
+        metrics.increment("move.unconfined", not confined)
+        if moved or not confined:
+            self.world.notify("on_move", self, departure, confined)
 
     def rotate(self, angle):
         self._rotation += angle
@@ -157,130 +202,16 @@ class Particle(Circle, MotionBehavior, TrackingBehavior):
         return np.array([x, y])
 
     def search(self):
-        if self.field_of_view and len(self.field_of_view) == 2:
-            # Get the central vision.
+        if self.field_of_view is not None:
+            metrics = self.world.metrics
+            stopwatch = metrics.stopwatch("search")
             facing_direction_vector = self.direction()
-            # central_vision_extent = self._center + facing_direction_vector
-            # self._center = self._center + formula.resize_vector(facing_direction_vector, self._radius)
-
-            # Get the left outer boundary of the peripheral vision.
-            left_outer_boundary_vector = formula.rotate_vector(facing_direction_vector, self.field_of_view[1] / 2)
-            left_outer_boundary_extent = self._center + left_outer_boundary_vector
-            left_outer_boundary = formula.Segment(self._center, left_outer_boundary_extent)
-
-            # Get the right outer boundary of the peripheral vision.
-            right_outer_boundary_vector = formula.rotate_vector(facing_direction_vector, -self.field_of_view[1] / 2)
-            right_outer_boundary_extent = self._center + right_outer_boundary_vector
-            right_outer_boundary = formula.Segment(self._center, right_outer_boundary_extent)
-
-            # Draw the field of view.
-            canvas.create_line(self._center[0], self._center[1], left_outer_boundary_extent[0],
-                               left_outer_boundary_extent[1], fill="blue", width=2)
-            canvas.create_line(self._center[0], self._center[1], right_outer_boundary_extent[0],
-                               right_outer_boundary_extent[1], fill="blue", width=2)
-            # circle_zone.canvas.create_line(self._center[0], self._center[1], central_vision_extent[0],
-            # central_vision_extent[1], fill="blue", width=2)
-            canvas.create_arc(self._center[0] - self.field_of_view[0],
-                              self._center[1] - self.field_of_view[0],
-                              self._center[0] + self.field_of_view[0],
-                              self._center[1] + self.field_of_view[0],
-                              outline="blue", width=2, style=tk.ARC,
-                              start=360 - (self._rotation + self.field_of_view[1] / 2),
-                              extent=self.field_of_view[1])
-
-            # Find the quadrants of the world that are inside the field of view.
-            quadrants = []
-            queue = [self.world.grid.get_root()]
-            particles_searched = 0
-            particles_selected = 0
-            quadrants_searched = 0
-            quadrants_selected = 0
-            while len(queue) > 0:
-                quadrants_searched += 1
-                quadrant = queue.pop(0)
-                center = quadrant.get_center()
-                width = quadrant.get_width()
-                height = quadrant.get_height()
-
-                # The boundaries of the current quadrant.
-                x1 = center[0] - width / 2
-                x2 = center[0] + width / 2
-                y1 = center[1] - height / 2
-                y2 = center[1] + height / 2
-
-                # The four corners of the current quadrant.
-                north_west = np.array([x1, y1])
-                north_east = np.array([x2, y1])
-                south_west = np.array([x1, y2])
-                south_east = np.array([x2, y2])
-
-                # Vectors obtained by joining the center of the particle to each corner of the quadrant.
-                cnw = north_west - self._center
-                cne = north_east - self._center
-                csw = south_west - self._center
-                cse = south_east - self._center
-
-                # Angles between the central vision vector and the previously calculated vectors.
-                angle_cnw = formula.angle_between(facing_direction_vector, cnw)
-                angle_cne = formula.angle_between(facing_direction_vector, cne)
-                angle_csw = formula.angle_between(facing_direction_vector, csw)
-                angle_cse = formula.angle_between(facing_direction_vector, cse)
-                angle_threshold = self.field_of_view[1] / 2
-
-                # Squared distances obtained from previously calculated vectors.
-                sqrd_cnw = np.dot(cnw, cnw)
-                sqrd_cne = np.dot(cne, cne)
-                sqrd_csw = np.dot(csw, csw)
-                sqrd_cse = np.dot(cse, cse)
-                squared_distance_threshold = math.pow(self.field_of_view[0], 2)
-
-                # The borders of the current quadrant.
-                north_border = formula.Segment(north_west, north_east)
-                south_border = formula.Segment(south_west, south_east)
-                west_border = formula.Segment(north_west, south_west)
-                east_border = formula.Segment(north_east, south_east)
-
-                # Check if the quadrant contains the particle's coordinate or the furthest points of the outer boundaries.
-                if quadrant.contains_point(self._center) \
-                        or quadrant.contains_point(left_outer_boundary_extent) \
-                        or quadrant.contains_point(right_outer_boundary_extent):
-                    quadrants.append(quadrant)
-                    queue += quadrant.leaves()
-                    quadrants_selected += 1
-
-                # Check if the left outer boundary intersects with the quadrant.
-                elif north_border.intersects_segment(left_outer_boundary) \
-                        or south_border.intersects_segment(left_outer_boundary) \
-                        or west_border.intersects_segment(left_outer_boundary) \
-                        or east_border.intersects_segment(left_outer_boundary):
-                    quadrants.append(quadrant)
-                    queue += quadrant.leaves()
-                    quadrants_selected += 1
-
-                # Check if the right outer boundary intersects with the quadrant.
-                elif north_border.intersects_segment(right_outer_boundary) \
-                        or south_border.intersects_segment(right_outer_boundary) \
-                        or west_border.intersects_segment(right_outer_boundary) \
-                        or east_border.intersects_segment(right_outer_boundary):
-                    quadrants.append(quadrant)
-                    queue += quadrant.leaves()
-                    quadrants_selected += 1
-
-                # Check if quadrant is inside the field of view.
-                elif (angle_cnw < angle_threshold and sqrd_cnw < squared_distance_threshold) \
-                        or (angle_cne < angle_threshold and sqrd_cne < squared_distance_threshold) \
-                        or (angle_csw < angle_threshold and sqrd_csw < squared_distance_threshold) \
-                        or (angle_cse < angle_threshold and sqrd_cse < squared_distance_threshold):
-                    quadrants.append(quadrant)
-                    queue += quadrant.leaves()
-                    quadrants_selected += 1
 
             # Get the particles that are inside the field of view.
-            particles = set()
+            particles = self.world.grid.query_sector(self.get_center(), facing_direction_vector, self.field_of_view[1])
+            stopwatch.lap("broad_phase")
+            particles_searched = 0
             targets = []
-            for quadrant in quadrants:
-                quadrant.redraw(canvas, outline="red")
-                particles.update(quadrant.contents())
             for particle in particles:
                 particles_searched += 1
                 if particle != self:
@@ -296,14 +227,12 @@ class Particle(Circle, MotionBehavior, TrackingBehavior):
                                  or math.isclose(squared_distance, self.field_of_view[0] + particle.get_radius())):
                         # print(str(min_angle) + " <= " + str(a) + " <= " + str(max_angle))
                         targets.append(particle)
-                        particle.redraw(canvas, fill="red")
-                        particles_selected += 1
-            self.redraw(canvas, fill="blue")
             targets.sort(key=lambda target: self.distance_from_circle(target), reverse=True)
-            print()
-            print("SEARCH")
-            print("Quadrants (selected/searched): {}/{}".format(quadrants_selected, quadrants_searched))
-            print("Particles (selected/searched): {}/{}".format(particles_selected, particles_searched))
+            stopwatch.lap("narrow_phase")
+            metrics.increment("search.calls")
+            metrics.increment("search.candidates", particles_searched)
+            metrics.increment("search.targets", len(targets))
+            self.world.notify("on_search", self, targets, particles_searched)
             return targets
 
     def destroy(self, target):
@@ -311,23 +240,64 @@ class Particle(Circle, MotionBehavior, TrackingBehavior):
 
 
 class ParticleSystem:
-    def __init__(self):
+    def __init__(self, store=None):
         self.shape = None
         self.grid = None
         self.particles = []
+        from metrics import MetricsRegistry
+        self.store = store if store is not None else ParticleStore()
+        self.metrics = MetricsRegistry(enabled=False)
+        self._observers = []
+
+    # The observers are notified of the changes of the system, which has no side effects otherwise.
+    def subscribe(self, observer):
+        self._observers.append(observer)
+
+    def unsubscribe(self, observer):
+        self._observers.remove(observer)
 
-    def make_circle(self, x, y, radius):
+    def notify(self, event, *args):
+        for observer in self._observers:
+            getattr(observer, event)(*args)
+
+    # The broad phase is the class of the spatial index (Quadtree or HashGrid), the options are passed to it.
+    def make_circle(self, x, y, radius, broad_phase=Quadtree, **options):
         self.shape = Circle(x, y, radius)
-        self.grid = Quadtree(Quadrant(x, y, 2 * radius, 2 * radius))
+        self.grid = broad_phase.from_bounds(x, y, 2 * radius, 2 * radius, **options)
         # TODO: Update the grid if it was already created.
 
-    def make_rectangle(self, x, y, width, height):
+    def make_rectangle(self, x, y, width, height, broad_phase=Quadtree, **options):
         self.shape = Rectangle(x, y, width, height)
-        self.grid = Quadtree(Quadrant(x, y, width, height))
+        self.grid = broad_phase.from_bounds(x, y, width, height, **options)
         # TODO: Update the grid if it was already created.
 
+    # Return the number of particles placed. In bulk mode, the coordinates of the whole batch are drawn at once
+    # (Poisson-disk sampling) and the particles are loaded into the grid together, iterations is then the number of
+    # attempts around each particle placed before the area next to it is considered full.
     def add_particles(self, n=1, random_radius=False, min_radius=1, max_radius=10, radius=10, overlap=False,
-                      iterations=100):
+                      iterations=100, bulk=False):
+        if bulk:
+            if n <= 0:
+                return 0
+            if random_radius:
+                radii = np.random.random(n) * (max_radius - min_radius) + min_radius
+            else:
+                radii = np.full(n, float(radius))
+            if overlap:
+                coords = self.shape.random_circle_coords(radii)
+            else:
+                coords, placed = formula.poisson_disk(self.shape.random_circle_coords, self.shape.confines_circles,
+                                                      radii, self.shape.bounds(), iterations,
+                                                      fixed_coords=self.store.centers(), fixed_radii=self.store.radii())
+                radii = radii[placed]
+            self.store.reserve(len(self.store) + len(radii))
+            particles = [Particle(x, y, r, world=self, store=self.store)
+                         for (x, y), r in zip(coords.tolist(), radii.tolist())]
+            self.grid.bulk_load(particles)
+            self.particles += particles
+            return len(particles)
+
+        count = 0
         for i in range(n):
             particle = Particle()
             if random_radius:
@@ -338,24 +308,203 @@ class ParticleSystem:
             # particle.rotation = random() * 360
             # particle.field_of_view = np.array([200, 45])
             particle.world = self
-            if overlap:
-                quadrants = self.grid.quadtree_search(particle, overlap)
-                for quadrant in quadrants:
-                    quadrant.contents().append(particle)
-                self.grid.contents().append(particle)
-            else:
-                j = 0
-                while j < iterations:
-                    quadrants = self.grid.quadtree_search(particle, overlap)
-                    if len(quadrants) > 0:
-                        for quadrant in quadrants:
-                            quadrant.contents().append(particle)
-                        self.grid.contents().append(particle)
-                        self.particles.append(particle)
-                        break
-                    else:
-                        self.shape.randomize_circle_coord(particle)
-                        j += 1
+            j = 0
+            while j < iterations:
+                if self.grid.insert(particle, overlap):
+                    particle.attach(self.store)
+                    self.particles.append(particle)
+                    count += 1
+                    break
+                else:
+                    self.shape.randomize_circle_coord(particle)
+                    j += 1
+        return count
+
+    # Move the particles to a store in shared memory with room for capacity particles, which other processes can attach
+    # to by its name (see SharedParticleStore). The broad phase is rebuilt if it reads the store directly.
+    def share(self, capacity=None, name=None):
+        from shared import SharedParticleStore
+        store = SharedParticleStore(max(len(self.store), capacity if capacity is not None else 0, 1), name=name)
+        for particle in self.particles:
+            particle.attach(store)
+        self.store = store
+        if hasattr(self.grid, "rebuild"):
+            self.grid.rebuild()
+        return store
+
+    # Move every particle in a random direction at once, each one stopping at its first obstacle.
+    def step(self, dt=1, speed=50):
+        count = len(self.store)
+        if count == 0:
+            return
+        stopwatch = self.metrics.stopwatch("step")
+        centers = self.store.centers()
+        radii = self.store.radii()
+        angles = 2 * math.pi * np.random.random(count)
+        displacements = speed * dt * np.column_stack((np.cos(angles), np.sin(angles)))
+
+        # Keep the particles inside the zone.
+        limits = self.shape.confinement_limits(centers, radii, displacements)
+        stopwatch.lap("confinement")
+
+        # Stop each particle at the first particle along its path (the others are still at their departure).
+        reach = 2 * radii.max() + 2 * speed * dt
+        first, second = formula.close_pairs(centers, reach)
+        stopwatch.lap("broad_phase")
+        vectors = centers[first] - centers[second]
+        distances = radii[first] + radii[second]
+        np.minimum.at(limits, first, collision.time_of_impact(vectors, displacements[first], distances))
+        np.minimum.at(limits, second, collision.time_of_impact(-vectors, displacements[second], distances))
+
+        # Particles moving to the same place stay at their departure, the earliest one in the system keeps its move.
+        destinations = centers + limits[:, np.newaxis] * displacements
+        moved = limits > 0
+        squared_distances = np.square(distances)
+        while True:
+            vectors = destinations[first] - destinations[second]
+            squared_gaps = np.einsum("ij,ij->i", vectors, vectors)
+            overlaps = (squared_gaps < squared_distances) \
+                & ~np.isclose(squared_gaps, squared_distances, rtol=1e-09, atol=0) \
+                & (moved[first] | moved[second])
+            if not overlaps.any():
+                break
+            reverted = np.where(moved[second[overlaps]], second[overlaps], first[overlaps])
+            moved[reverted] = False
+            destinations[reverted] = centers[reverted]
+        stopwatch.lap("narrow_phase")
+
+        # Update the quadtree.
+        indices = np.flatnonzero(moved)
+        centers[indices] = destinations[indices]
+        for index in indices:
+            self.grid.relocate(self.particles[index])
+        stopwatch.lap("reindex")
+        self.metrics.increment("step.calls")
+        self.metrics.increment("step.pairs", len(first))
+        self.metrics.increment("step.moved", len(indices))
+        self.notify("on_step", self, indices)
+
+    # Targets in the field of view of every particle that has one, found in a single pass over the particles close to
+    # each observer (within its range plus the largest radius) with the tests of Particle.search (without drawing).
+    # They are returned as compressed rows: the targets of particle i are indices[offsets[i]:offsets[i + 1]], the
+    # nearest first (distance between the circles).
+    def search_all(self):
+        count = len(self.store)
+        offsets = np.zeros(count + 1, dtype=np.int64)
+        fields_of_view = self.store.fields_of_view()
+        observers = ~np.isnan(fields_of_view[:, 0])
+        if count < 2 or not observers.any():
+            return offsets, np.empty(0, dtype=np.int64)
+        stopwatch = self.metrics.stopwatch("search_all")
+        centers = self.store.centers()
+        radii = self.store.radii()
+        observers = np.flatnonzero(observers)
+        first, targets = formula.close_pairs_between(centers[observers], centers,
+                                                     fields_of_view[observers, 0] + radii.max())
+        viewers = observers[first]
+        keep = viewers != targets
+        viewers = viewers[keep]
+        targets = targets[keep]
+        pairs = len(targets)
+        stopwatch.lap("broad_phase")
+        visible, distances = formula.in_fields_of_view(centers[targets] - centers[viewers], fields_of_view[viewers, 0],
+                                                       fields_of_view[viewers, 1], self.store.rotations()[viewers],
+                                                       radii[targets])
+        viewers = viewers[visible]
+        targets = targets[visible]
+        gaps = distances[visible] - radii[viewers] - radii[targets]
+        order = np.lexsort((gaps, viewers))
+        offsets[1:] = np.cumsum(np.bincount(viewers, minlength=count))
+        stopwatch.lap("narrow_phase")
+        self.metrics.increment("search_all.calls")
+        self.metrics.increment("search_all.pairs", pairs)
+        self.metrics.increment("search_all.targets", len(targets))
+        return offsets, targets[order]
+
+    # Write the zone, the particles and the broad phase to a checkpoint: a JSON header describing them and the arrays
+    # that follow it in the file. A quadtree is saved with its partition and the contents of its quadrants, the other
+    # broad phases with the order of their contents only.
+    def save(self, path):
+        import json
+        import struct
+        count = len(self.store)
+        if hasattr(self.shape, "get_radius"):
+            shape = {"type": "circle", "center": self.shape.get_center().tolist(),
+                     "radius": float(self.shape.get_radius())}
+        else:
+            shape = {"type": "rectangle", "center": self.shape.get_center().tolist(),
+                     "width": float(self.shape.get_width()), "height": float(self.shape.get_height())}
+        arrays = [("centers", self.store.centers()), ("radii", self.store.radii()),
+                  ("rotations", self.store.rotations()), ("fields_of_view", self.store.fields_of_view()),
+                  ("alive", self.store.alive())]
+        if hasattr(self.grid, "topology"):
+            arrays += zip(("partitioned", "offsets", "memberships", "order"), self.grid.topology(self.particles))
+        else:
+            positions = dict(zip(self.particles, range(count)))
+            arrays.append(("order", np.array([positions[circle] for circle in self.grid.contents()], dtype=np.int64)))
+        tags = [particle.tag for particle in self.particles]
+        header = json.dumps({
+            "shape": shape,
+            "broad_phase": {"type": type(self.grid).__name__, "options": self.grid.options()},
+            "count": count,
+            "tags": tags if any(tag is not None for tag in tags) else None,
+            "arrays": [[name, array.dtype.str, list(array.shape)] for name, array in arrays],
+        }).encode()
+        with open(path, "wb") as file:
+            file.write(struct.pack(CHECKPOINT, CHECKPOINT_MAGIC, CHECKPOINT_VERSION, len(header)))
+            file.write(header)
+            for name, array in arrays:
+                file.write(np.ascontiguousarray(array).tobytes())
+
+    # Read a checkpoint written by save. The particles are put back in place without any collision test (and are all
+    # alive in the checkpoints of version 1).
+    @classmethod
+    def load(cls, path):
+        import json
+        import struct
+        from linear import LinearQuadtree
+        with open(path, "rb") as file:
+            data = file.read()
+        magic, version, length = struct.unpack_from(CHECKPOINT, data)
+        assert magic == CHECKPOINT_MAGIC, "The file is not a checkpoint of a particle system."
+        assert 1 <= version <= CHECKPOINT_VERSION, "The version of the checkpoint is not supported."
+        offset = struct.calcsize(CHECKPOINT)
+        header = json.loads(data[offset:offset + length])
+        arrays = {}
+        offset += length
+        for name, dtype, shape in header["arrays"]:
+            dtype = np.dtype(dtype)
+            size = int(np.prod(shape, dtype=np.int64))
+            arrays[name] = np.frombuffer(data, dtype, size, offset).reshape(shape)
+            offset += size * dtype.itemsize
+
+        system = cls()
+        shape = header["shape"]
+        broad_phases = {broad_phase.__name__: broad_phase for broad_phase in (Quadtree, HashGrid, LinearQuadtree)}
+        broad_phase = broad_phases[header["broad_phase"]["type"]]
+        options = header["broad_phase"]["options"]
+        x, y = shape["center"]
+        if shape["type"] == "circle":
+            system.make_circle(x, y, shape["radius"], broad_phase, **options)
+        else:
+            system.make_rectangle(x, y, shape["width"], shape["height"], broad_phase, **options)
+
+        count = header["count"]
+        tags = header["tags"] if header["tags"] is not None else [None] * count
+        system.store.reserve(count)
+        system.particles = [Particle(tag=tag, world=system, store=system.store) for tag in tags]
+        system.store.centers()[:] = arrays["centers"]
+        system.store.radii()[:] = arrays["radii"]
+        system.store.rotations()[:] = arrays["rotations"]
+        system.store.fields_of_view()[:] = arrays["fields_of_view"]
+        if "alive" in arrays:
+            system.store.alive()[:] = arrays["alive"]
+        if hasattr(system.grid, "restore"):
+            system.grid.restore(system.particles, arrays["partitioned"], arrays["offsets"], arrays["memberships"],
+                                arrays["order"])
+        else:
+            system.grid.bulk_load([system.particles[index] for index in arrays["order"].tolist()])
+        return system
 
     def draw(self, canvas, fill="", outline="black"):
         self.shape.draw(canvas, fill=fill, outline=outline)
@@ -379,22 +528,3 @@ class ParticleSystem:
         for particle in self.particles:
             particle.redraw(canvas, fill=fill, outline=outline)
 
-
-def animate():
-    for particle in particle_system.particles:
-        particle.move(50)
-    master.after(int(1000 / 60), animate)
-
-
-if __name__ == "__main__":
-    seed()
-    master = tk.Tk()
-    canvas = tk.Canvas(master, width=1000, height=1000)
-    canvas.pack()
-    particle_system = ParticleSystem()
-    particle_system.make_circle(500, 500, 200)
-    particle_system.add_particles(50)
-    particle_system.draw(canvas)
-    particle_system.draw_particles(canvas)
-    animate()
-    master.mainloop()
@@ -0,0 +1,223 @@
+import math
+import time
+import numpy as np
+import formula
+from concurrent.futures import ThreadPoolExecutor
+from linear import concatenate_ranges
+
+
+# Frozen copy of the particles of a system, indexed by a uniform grid: the particles are sorted by the key of their
+# cell (row by row), so that the cells of a row between two columns are a contiguous range of the sorted particles.
+# The cells are as large as the largest diameter (or larger when the particles are sparse).
+class Snapshot:
+    def __init__(self, centers, radii, rotations=None, fields_of_view=None, cell_size=None):
+        count = len(radii)
+        self.centers = np.array(centers, dtype=float).reshape(-1, 2)
+        self.radii = np.array(radii, dtype=float)
+        self.rotations = np.array(rotations, dtype=float) if rotations is not None else np.zeros(count)
+        self.fields_of_view = np.array(fields_of_view, dtype=float).reshape(-1, 2) if fields_of_view is not None \
+            else np.full((count, 2), np.nan)
+        for array in (self.centers, self.radii, self.rotations, self.fields_of_view):
+            array.flags.writeable = False
+        self.max_radius = self.radii.max() if count > 0 else 0.0
+
+        lower = self.centers.min(axis=0) if count > 0 else np.zeros(2)
+        upper = self.centers.max(axis=0) if count > 0 else np.zeros(2)
+        if cell_size is None:
+            extent = upper - lower
+            cell_size = max(2 * self.max_radius, math.sqrt(extent[0] * extent[1] / max(count, 1)), 1e-09)
+        self._origin = lower
+        self._cell_size = cell_size
+        self._columns = int((upper[0] - lower[0]) // cell_size) + 1
+        self._rows = int((upper[1] - lower[1]) // cell_size) + 1
+        cells = np.floor((self.centers - lower) / cell_size).astype(np.int64)
+        keys = cells[:, 1] * self._columns + cells[:, 0]
+        self._order = np.argsort(keys, kind="stable")
+        self._keys = keys[self._order]
+
+    @classmethod
+    def from_system(cls, system, cell_size=None):
+        store = system.store
+        return cls(store.centers(), store.radii(), store.rotations(), store.fields_of_view(), cell_size)
+
+    def __len__(self):
+        return len(self.radii)
+
+    # Pairs (query, particle) of the particles whose center is in the bounding box of each query.
+    def candidates(self, x1, y1, x2, y2):
+        column1 = np.clip(np.floor((x1 - self._origin[0]) / self._cell_size), 0, self._columns - 1).astype(np.int64)
+        column2 = np.clip(np.floor((x2 - self._origin[0]) / self._cell_size), 0, self._columns - 1).astype(np.int64)
+        row1 = np.clip(np.floor((y1 - self._origin[1]) / self._cell_size), 0, self._rows - 1).astype(np.int64)
+        row2 = np.clip(np.floor((y2 - self._origin[1]) / self._cell_size), 0, self._rows - 1).astype(np.int64)
+
+        # One range of sorted particles per row of cells of each query (the boxes outside the grid have none).
+        outside = (x2 < self._origin[0]) | (y2 < self._origin[1]) \
+            | (x1 > self._origin[0] + self._columns * self._cell_size) \
+            | (y1 > self._origin[1] + self._rows * self._cell_size)
+        counts = np.where(outside, 0, row2 - row1 + 1)
+        queries = np.repeat(np.arange(len(counts)), counts)
+        rows = row1[queries] + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        starts = np.searchsorted(self._keys, rows * self._columns + column1[queries], side="left")
+        ends = np.searchsorted(self._keys, rows * self._columns + column2[queries], side="right")
+        return np.repeat(queries, ends - starts), self._order[concatenate_ranges(starts, ends)]
+
+
+# Results of a batch as a list with an array of particles per query, from the pairs kept sorted by query.
+def split(queries, particles, count):
+    offsets = np.cumsum(np.bincount(queries, minlength=count))[:-1]
+    return np.split(particles, offsets)
+
+
+# Run batches of read-only queries on a snapshot with a pool of threads. The queries are split in chunks processed as
+# whole NumPy arrays (which release the GIL) and the results come back in the order of the queries.
+class QueryExecutor:
+    def __init__(self, snapshot, workers=4, chunk=256):
+        self.snapshot = snapshot
+        self._workers = workers
+        self._chunk = chunk
+        self._pool = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+
+    def run(self, function, count, *arrays, parallel=True):
+        chunks = [tuple(array[start:start + self._chunk] for array in arrays)
+                  for start in range(0, count, self._chunk)]
+        if parallel and self._pool is not None:
+            results = self._pool.map(lambda chunk: function(*chunk), chunks)
+        else:
+            results = map(lambda chunk: function(*chunk), chunks)
+        return [result for results_of_chunk in results for result in results_of_chunk]
+
+    # Targets in the field of view of each viewer (a particle of the snapshot), with the tests of Particle.search,
+    # the nearest first (distance between the circles) like ParticleSystem.search_all.
+    def fields_of_view(self, viewers, parallel=True):
+        viewers = np.asarray(viewers, dtype=np.int64)
+        return self.run(self.fields_of_view_chunk, len(viewers), viewers, parallel=parallel)
+
+    def fields_of_view_chunk(self, viewers):
+        snapshot = self.snapshot
+        ranges = snapshot.fields_of_view[viewers, 0]
+        reach = np.where(np.isnan(ranges), -np.inf, ranges + snapshot.max_radius)
+        x, y = snapshot.centers[viewers].T
+        queries, targets = snapshot.candidates(x - reach, y - reach, x + reach, y + reach)
+        owners = viewers[queries]
+        keep = targets != owners
+        queries = queries[keep]
+        targets = targets[keep]
+        owners = owners[keep]
+        visible, distances = formula.in_fields_of_view(snapshot.centers[targets] - snapshot.centers[owners],
+                                                       snapshot.fields_of_view[owners, 0],
+                                                       snapshot.fields_of_view[owners, 1],
+                                                       snapshot.rotations[owners], snapshot.radii[targets])
+        queries = queries[visible]
+        targets = targets[visible]
+        gaps = distances[visible] - snapshot.radii[owners[visible]] - snapshot.radii[targets]
+        order = np.lexsort((targets, gaps, queries))
+        return split(queries[order], targets[order], len(viewers))
+
+    # Particles whose surface is within a radius of each point (like Quadtree.within), the closest first. A particle
+    # can be excluded from each query (-1 for none).
+    def within(self, points, radii, exclude=None, parallel=True):
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        radii = np.broadcast_to(np.asarray(radii, dtype=float), len(points))
+        exclude = np.full(len(points), -1, dtype=np.int64) if exclude is None else np.asarray(exclude, dtype=np.int64)
+        return self.run(self.within_chunk, len(points), points, radii, exclude, parallel=parallel)
+
+    def within_chunk(self, points, radii, exclude):
+        snapshot = self.snapshot
+        reach = radii + snapshot.max_radius
+        x, y = points.T
+        queries, particles = snapshot.candidates(x - reach, y - reach, x + reach, y + reach)
+        keep = particles != exclude[queries]
+        queries = queries[keep]
+        particles = particles[keep]
+        vectors = snapshot.centers[particles] - points[queries]
+        distances = np.sqrt(np.einsum("ij,ij->i", vectors, vectors)) - snapshot.radii[particles]
+        limits = radii[queries]
+        keep = (distances <= limits) | np.isclose(distances, limits)
+        queries = queries[keep]
+        particles = particles[keep]
+        order = np.lexsort((particles, distances[keep], queries))
+        return split(queries[order], particles[order], len(points))
+
+    # The k particles closest to each point (by distance to their surface, like Quadtree.nearest), the closest first.
+    # The search radius of a query starts from the mean spacing of the particles and doubles until it holds k of them.
+    def nearest(self, points, k=1, exclude=None, parallel=True):
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        exclude = np.full(len(points), -1, dtype=np.int64) if exclude is None else np.asarray(exclude, dtype=np.int64)
+        return self.run(lambda points, exclude: self.nearest_chunk(points, k, exclude), len(points), points, exclude,
+                        parallel=parallel)
+
+    def nearest_chunk(self, points, k, exclude):
+        snapshot = self.snapshot
+        results = [np.empty(0, dtype=np.int64)] * len(points)
+        count = len(snapshot) - (exclude >= 0)
+        if len(snapshot) == 0 or k <= 0:
+            return results
+        # Past the farthest center (plus a radius), the search radius holds every particle.
+        lower = snapshot.centers.min(axis=0)
+        upper = snapshot.centers.max(axis=0)
+        extent = upper - lower
+        farthest = np.maximum(np.abs(points - lower), np.abs(points - upper))
+        spans = np.hypot(farthest[:, 0], farthest[:, 1]) + snapshot.max_radius
+        pending = np.arange(len(points))
+        radii = np.full(len(points), math.sqrt(k * max(extent[0] * extent[1], 1e-09) / (math.pi * len(snapshot))))
+        while len(pending) > 0:
+            reach = radii[pending] + snapshot.max_radius
+            x, y = points[pending].T
+            queries, particles = snapshot.candidates(x - reach, y - reach, x + reach, y + reach)
+            keep = particles != exclude[pending][queries]
+            queries = queries[keep]
+            particles = particles[keep]
+            vectors = snapshot.centers[particles] - points[pending][queries]
+            distances = np.sqrt(np.einsum("ij,ij->i", vectors, vectors)) - snapshot.radii[particles]
+            keep = distances <= radii[pending][queries]
+            queries = queries[keep]
+            particles = particles[keep]
+            order = np.lexsort((particles, distances[keep], queries))
+            queries = queries[order]
+            particles = particles[order]
+
+            # A query is done once it holds k particles (or every particle).
+            found = np.bincount(queries, minlength=len(pending))
+            done = (found >= np.minimum(k, count[pending])) | (radii[pending] > spans[pending])
+            starts = np.cumsum(found) - found
+            for i in np.flatnonzero(done).tolist():
+                results[pending[i]] = particles[starts[i]:starts[i] + min(k, found[i])]
+            radii[pending[~done]] *= 2
+            pending = pending[~done]
+        return results
+
+    # Run a batch of queries (the name of a method) serially then on the pool, and report the times and the speedup.
+    def compare(self, name, *args, **kwargs):
+        method = getattr(self, name)
+        start = time.perf_counter()
+        serial = method(*args, parallel=False, **kwargs)
+        serial_time = time.perf_counter() - start
+        start = time.perf_counter()
+        results = method(*args, **kwargs)
+        parallel_time = time.perf_counter() - start
+        assert all(np.array_equal(a, b) for a, b in zip(serial, results)), "The results depend on the threads."
+        return results, {"queries": len(results), "workers": self._workers, "serial": serial_time,
+                         "parallel": parallel_time, "speedup": serial_time / parallel_time}
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+
+
+if __name__ == "__main__":
+    from particle import ParticleSystem
+    particle_system = ParticleSystem()
+    particle_system.make_circle(1000, 1000, 1000)
+    particle_system.add_particles(20000, bulk=True)
+    for particle in particle_system.particles:
+        particle.field_of_view = np.array([100, 90])
+        particle.rotate(np.random.random() * 360)
+    executor = QueryExecutor(Snapshot.from_system(particle_system))
+    indices = np.arange(len(particle_system.store))
+    centers = particle_system.store.centers()
+    for name, args in (("fields_of_view", (indices,)), ("within", (centers, 30, indices)),
+                       ("nearest", (centers, 8, indices))):
+        results, report = executor.compare(name, *args)
+        print("{}: {queries} queries, serial {serial:.3f}s, {workers} threads {parallel:.3f}s, speedup {speedup:.2f}"
+              .format(name, **report))
+    executor.close()
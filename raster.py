@@ -0,0 +1,276 @@
+import math
+import struct
+import zlib
+import numpy as np
+from particle import ParticleSystem
+
+COLORS = {
+    "white": (255, 255, 255),
+    "black": (0, 0, 0),
+    "red": (255, 0, 0),
+    "green": (0, 128, 0),
+    "blue": (0, 0, 255),
+}
+
+
+# Points sampled every half pixel along the segments from the starts to the ends.
+def segment_points(starts, ends):
+    vectors = ends - starts
+    counts = np.ceil(2 * np.sqrt(np.einsum("ij,ij->i", vectors, vectors))).astype(np.int64) + 1
+    indices = np.repeat(np.arange(len(counts)), counts)
+    steps = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    t = steps / np.maximum(counts - 1, 1)[indices]
+    return starts[indices] + t[:, np.newaxis] * vectors[indices]
+
+
+# Points sampled every half pixel along the arcs of the given angles (in degrees), counterclockwise from the starts.
+def arc_points(centers, radii, starts, angles):
+    counts = np.ceil(2 * radii * np.radians(angles)).astype(np.int64) + 1
+    indices = np.repeat(np.arange(len(counts)), counts)
+    steps = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    theta = np.radians(starts[indices] + angles[indices] * steps / np.maximum(counts - 1, 1)[indices])
+    return centers[indices] + radii[indices, np.newaxis] * np.column_stack((np.cos(theta), np.sin(theta)))
+
+
+# Image drawn offscreen into a NumPy array of palette indices (a pixel covers [x, x + 1) by [y, y + 1) of the canvas
+# coordinates). The colors are names of COLORS (all in the palette from the start) or RGB tuples, up to 256 of them.
+class Raster:
+    def __init__(self, width, height, background="white"):
+        self.width = width
+        self.height = height
+        self.palette = []
+        self._indices = {}
+        self._background = self.color(background)
+        for color in COLORS:
+            self.color(color)
+        self.pixels = np.full((height, width), self._background, dtype=np.uint8)
+        self._templates = {}
+
+    def color(self, color):
+        rgb = tuple(COLORS[color] if isinstance(color, str) else color)
+        if rgb not in self._indices:
+            assert len(self.palette) < 256, "The palette is full."
+            self._indices[rgb] = len(self.palette)
+            self.palette.append(rgb)
+        return self._indices[rgb]
+
+    def clear(self):
+        self.pixels.fill(self._background)
+
+    # Image as an array of RGB pixels.
+    def rgb(self):
+        return np.array(self.palette, dtype=np.uint8)[self.pixels]
+
+    def plot(self, points, color):
+        points = np.floor(points).astype(np.int64)
+        inside = (points[:, 0] >= 0) & (points[:, 0] < self.width) & (points[:, 1] >= 0) & (points[:, 1] < self.height)
+        points = points[inside]
+        self.pixels[points[:, 1], points[:, 0]] = self.color(color)
+
+    # Offsets of the pixels of a ring (or a disk) of a given radius around a pixel.
+    def template(self, radius, filled):
+        key = (radius, filled)
+        if key not in self._templates:
+            reach = int(math.ceil(radius)) + 1
+            dx, dy = np.meshgrid(np.arange(-reach, reach + 1), np.arange(-reach, reach + 1))
+            distances = np.sqrt(np.square(dx) + np.square(dy))
+            mask = distances <= radius if filled else np.abs(distances - radius) <= 0.5
+            self._templates[key] = np.column_stack((dx[mask], dy[mask]))
+        return self._templates[key]
+
+    # Draw circles stamping the same pixels for every circle of a radius (rounded to half a pixel).
+    def draw_circles(self, centers, radii, outline="black", fill=None):
+        centers = np.floor(np.asarray(centers, dtype=float).reshape(-1, 2)).astype(np.int64)
+        radii = np.round(2 * np.asarray(radii, dtype=float)) / 2
+        for radius in np.unique(radii).tolist():
+            members = centers[radii == radius]
+            for color, filled in ((fill, True), (outline, False)):
+                if color is not None:
+                    offsets = self.template(radius, filled)
+                    self.plot((members[:, np.newaxis, :] + offsets).reshape(-1, 2), color)
+
+    # Draw the borders of rectangles given by their bounds (x1, y1, x2, y2).
+    def draw_rectangles(self, bounds, outline="black"):
+        bounds = np.asarray(bounds, dtype=float).reshape(-1, 4)
+        corners = [bounds[:, [0, 1]], bounds[:, [2, 1]], bounds[:, [2, 3]], bounds[:, [0, 3]]]
+        for i in range(4):
+            self.plot(segment_points(corners[i], corners[(i + 1) % 4]), outline)
+
+    def draw_lines(self, starts, ends, color="black"):
+        self.plot(segment_points(np.asarray(starts, dtype=float), np.asarray(ends, dtype=float)), color)
+
+    # Draw the borders of fields of view (ranges and angles) facing the rotations, like the tkinter view.
+    def draw_sectors(self, centers, rotations, fields_of_view, color="blue"):
+        centers = np.asarray(centers, dtype=float).reshape(-1, 2)
+        ranges = fields_of_view[:, 0]
+        angles = fields_of_view[:, 1]
+        starts = rotations - angles / 2
+        for boundary in (starts, starts + angles):
+            theta = np.radians(boundary)
+            ends = centers + ranges[:, np.newaxis] * np.column_stack((np.cos(theta), np.sin(theta)))
+            self.draw_lines(centers, ends, color)
+        self.plot(arc_points(centers, ranges, starts, angles), color)
+
+    # Draw the zone, the quadrants of the quadtree, the particles and their fields of view.
+    def draw_system(self, system, quadrants=True, fields_of_view=True):
+        if hasattr(system.shape, "get_radius"):
+            self.draw_circles([system.shape.get_center()], [system.shape.get_radius()])
+        else:
+            self.draw_rectangles([system.shape.bounds()])
+        if quadrants and hasattr(system.grid, "get_root"):
+            bounds = []
+            queue = [system.grid.get_root()]
+            while len(queue) > 0:
+                quadrant = queue.pop(0)
+                bounds.append(quadrant.bounds())
+                queue += quadrant.leaves()
+            self.draw_rectangles(bounds)
+        store = system.store
+        self.draw_circles(store.centers(), store.radii())
+        if fields_of_view:
+            observers = ~np.isnan(store.fields_of_view()[:, 0])
+            if observers.any():
+                self.draw_sectors(store.centers()[observers], store.rotations()[observers],
+                                  store.fields_of_view()[observers])
+
+
+def png_chunk(kind, data):
+    return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+
+# Write a raster as an indexed PNG file.
+def write_png(path, raster, level=6):
+    header = struct.pack(">IIBBBBB", raster.width, raster.height, 8, 3, 0, 0, 0)
+    palette = np.array(raster.palette, dtype=np.uint8).tobytes()
+
+    # Every row starts with its filter type (none).
+    rows = np.hstack((np.zeros((raster.height, 1), dtype=np.uint8), raster.pixels))
+    with open(path, "wb") as file:
+        file.write(b"\x89PNG\r\n\x1a\n")
+        file.write(png_chunk(b"IHDR", header))
+        file.write(png_chunk(b"PLTE", palette))
+        file.write(png_chunk(b"IDAT", zlib.compress(rows.tobytes(), level)))
+        file.write(png_chunk(b"IEND", b""))
+
+
+# Sequence of PNG files named after a pattern formatted with the number of each frame.
+class PngWriter:
+    def __init__(self, pattern="frame_{:05d}.png", level=6):
+        self._pattern = pattern
+        self._level = level
+        self.frames = 0
+
+    def write(self, raster):
+        write_png(self._pattern.format(self.frames), raster, self._level)
+        self.frames += 1
+
+    def close(self):
+        pass
+
+
+# Animated GIF written frame by frame. The palette of the rasters is the global color table (it must not change once
+# the first frame is written) and each frame only holds the rectangle that changed since the previous one (delay is in
+# hundredths of a second).
+class GifWriter:
+    def __init__(self, path, delay=2, loop=0):
+        self._file = open(path, "wb")
+        self._delay = delay
+        self._loop = loop
+        self._previous = None
+        self.frames = 0
+
+    def start(self, raster):
+        palette = np.zeros((256, 3), dtype=np.uint8)
+        palette[:len(raster.palette)] = raster.palette
+        self._file.write(b"GIF89a")
+        self._file.write(struct.pack("<HHBBB", raster.width, raster.height, 0xF7, 0, 0))
+        self._file.write(palette.tobytes())
+        self._file.write(b"\x21\xFF\x0BNETSCAPE2.0\x03\x01" + struct.pack("<H", self._loop) + b"\x00")
+
+    def write(self, raster):
+        if self._previous is None:
+            self.start(raster)
+            x1, y1, x2, y2 = 0, 0, raster.width, raster.height
+        else:
+            changed = raster.pixels != self._previous
+            rows = np.flatnonzero(changed.any(axis=1))
+            columns = np.flatnonzero(changed.any(axis=0))
+            if len(rows) == 0:
+                x1, y1, x2, y2 = 0, 0, 1, 1
+            else:
+                x1, y1, x2, y2 = columns[0], rows[0], columns[-1] + 1, rows[-1] + 1
+        self._previous = raster.pixels.copy()
+
+        self._file.write(b"\x21\xF9\x04\x04" + struct.pack("<H", self._delay) + b"\x00\x00")
+        self._file.write(b"\x2C" + struct.pack("<HHHHB", x1, y1, x2 - x1, y2 - y1, 0))
+        self._file.write(b"\x08")
+        self._file.write(self.encode(raster.pixels[y1:y2, x1:x2]))
+        self.frames += 1
+
+    # LZW data of the pixels in sub-blocks of 255 bytes. Since every prefix of a string of the table is also in the
+    # table, the longest string matching the pixels ahead is found by bisection. The codes are packed with NumPy.
+    @staticmethod
+    def encode(pixels):
+        data = pixels.tobytes()
+        length = len(data)
+        codes = [256]
+        widths = [9]
+        table = {bytes([i]): i for i in range(256)}
+        width = 9
+        next_code = 258
+        longest = 1
+        i = 0
+        while i < length:
+            low = 1
+            high = min(longest, length - i)
+            while low < high:
+                middle = (low + high + 1) // 2
+                if data[i:i + middle] in table:
+                    low = middle
+                else:
+                    high = middle - 1
+            codes.append(table[data[i:i + low]])
+            widths.append(width)
+            if i + low < length:
+                table[data[i:i + low + 1]] = next_code
+                next_code += 1
+                longest = max(longest, low + 1)
+                if next_code > 1 << width and width < 12:
+                    width += 1
+                if next_code == 4096:
+                    codes.append(256)
+                    widths.append(width)
+                    table = {bytes([j]): j for j in range(256)}
+                    width = 9
+                    next_code = 258
+                    longest = 1
+            i += low
+        codes.append(257)
+        widths.append(width)
+
+        codes = np.array(codes, dtype=np.int64)
+        widths = np.array(widths, dtype=np.int64)
+        shifts = np.arange(widths.sum()) - np.repeat(np.cumsum(widths) - widths, widths)
+        bits = (np.repeat(codes, widths) >> shifts) & 1
+        data = np.packbits(bits.astype(np.uint8), bitorder="little").tobytes()
+        blocks = [bytes([len(data[i:i + 255])]) + data[i:i + 255] for i in range(0, len(data), 255)]
+        return b"".join(blocks) + b"\x00"
+
+    def close(self):
+        if not self._file.closed:
+            self._file.write(b"\x3B")
+            self._file.close()
+
+
+if __name__ == "__main__":
+    particle_system = ParticleSystem()
+    particle_system.make_circle(250, 250, 240)
+    particle_system.add_particles(50)
+    raster = Raster(500, 500)
+    writer = GifWriter("moving_particles.gif")
+    for i in range(120):
+        raster.clear()
+        raster.draw_system(particle_system)
+        writer.write(raster)
+        particle_system.step()
+    writer.close()
@@ -0,0 +1,184 @@
+import struct
+import numpy as np
+from particle import SystemObserver
+
+MAGIC = b"PTRJ"
+VERSION = 1
+
+# Magic, version, columns, particles, frames, ticks between two frames and tick of the first frame, padded to 64
+# bytes.
+HEADER = struct.Struct("<4sHHQQQQ24x")
+FRAMES_OFFSET = 16
+
+# Columns of a row of a frame.
+COLUMNS = ("x", "y", "radius", "rotation")
+
+
+# Record the particles of a system into a memory-mapped file: a header followed by a frame of rows (x, y, radius,
+# rotation) every interval steps (the steps are the ticks, record writes the state before the first one). The file
+# grows by chunks of frames and the number of frames in the header is updated with every frame, so the file can be
+# replayed while it is still being written.
+class TrajectoryRecorder(SystemObserver):
+    def __init__(self, path, chunk=256, interval=1):
+        self._path = path
+        self._chunk = chunk
+        self._interval = interval
+        self._data = None
+        self._frames = None
+        self._count = 0
+        self._steps = 0
+        self.frames = 0
+
+    def get_path(self):
+        return self._path
+
+    def get_interval(self):
+        return self._interval
+
+    # Map the file with room for the given number of frames.
+    def map(self, capacity):
+        if self._data is not None:
+            self._data.flush()
+        size = HEADER.size + capacity * self._count * len(COLUMNS) * 8
+        with open(self._path, "r+b" if self._data is not None else "w+b") as file:
+            if self._data is None:
+                file.write(HEADER.pack(MAGIC, VERSION, len(COLUMNS), self._count, 0, self._interval, self._steps))
+            file.truncate(size)
+        self._data = np.memmap(self._path, dtype=np.uint8, mode="r+")
+        self._frames = self._data[HEADER.size:].view(np.float64).reshape(capacity, self._count, len(COLUMNS))
+
+    def record(self, system):
+        store = system.store
+        if self._data is None:
+            self._count = len(store)
+            self.map(self._chunk)
+        assert len(store) == self._count, "The number of particles cannot change during a recording."
+        if self.frames == len(self._frames):
+            self.map(len(self._frames) + self._chunk)
+        frame = self._frames[self.frames]
+        frame[:, :2] = store.centers()
+        frame[:, 2] = store.radii()
+        frame[:, 3] = store.rotations()
+        self.frames += 1
+        self._data[FRAMES_OFFSET:FRAMES_OFFSET + 8].view(np.uint64)[0] = self.frames
+
+    def on_move(self, particle, departure, confined):
+        pass
+
+    def on_search(self, particle, targets, searched):
+        pass
+
+    def on_step(self, system, moved):
+        self._steps += 1
+        if self._steps % self._interval == 0:
+            self.record(system)
+
+    # Write the frames to the disk and drop the chunk that was never used.
+    def close(self):
+        if self._data is not None:
+            self._data.flush()
+            self._data = None
+            self._frames = None
+            with open(self._path, "r+b") as file:
+                file.truncate(HEADER.size + self.frames * self._count * len(COLUMNS) * 8)
+
+
+# Read a recording without loading it: the frames are views of the memory-mapped file. The replayer reads the frames
+# one after another from the tick it was sought to, and can write a frame into a system (notifying its observers like a
+# step) to draw it.
+class TrajectoryReplayer:
+    def __init__(self, path):
+        self._data = np.memmap(path, dtype=np.uint8, mode="r")
+        magic, version, columns, count, frames, interval, first = HEADER.unpack(bytes(self._data[:HEADER.size]))
+        assert magic == MAGIC, "The file is not a trajectory recording."
+        assert version == VERSION, "The version of the recording is not supported."
+        self._interval = interval
+        self._first = first
+        size = frames * count * columns * 8
+        self._frames = self._data[HEADER.size:HEADER.size + size].view(np.float64).reshape(frames, count, columns)
+        self._position = 0
+
+    def __len__(self):
+        return len(self._frames)
+
+    def __iter__(self):
+        while self._position < len(self._frames):
+            yield self.read()
+
+    def get_interval(self):
+        return self._interval
+
+    def particles(self):
+        return self._frames.shape[1]
+
+    # Ticks of the frames.
+    def ticks(self):
+        return self._first + np.arange(len(self._frames)) * self._interval
+
+    # Frame recorded at a tick (the last one before it if the tick was not recorded).
+    def frame(self, tick):
+        index = (tick - self._first) // self._interval
+        assert 0 <= index < len(self._frames), "The tick was not recorded."
+        return self._frames[index]
+
+    def centers(self, tick):
+        return self.frame(tick)[:, :2]
+
+    def radii(self, tick):
+        return self.frame(tick)[:, 2]
+
+    def rotations(self, tick):
+        return self.frame(tick)[:, 3]
+
+    # Centers of a particle over the whole recording (frames by rows).
+    def trajectory(self, index):
+        return self._frames[:, index, :2]
+
+    def seek(self, tick):
+        self.frame(tick)
+        self._position = (tick - self._first) // self._interval
+
+    # Tick of the next frame read.
+    def tell(self):
+        return self._first + self._position * self._interval
+
+    def read(self):
+        frame = self.frame(self.tell())
+        self._position += 1
+        return frame
+
+    # Write the frame recorded at a tick into a system with the same particles, relocating the ones that changed.
+    def apply(self, system, tick):
+        frame = self.frame(tick)
+        store = system.store
+        assert len(store) == frame.shape[0], "The system does not have the particles of the recording."
+        changed = np.flatnonzero((store.centers() != frame[:, :2]).any(axis=1) | (store.radii() != frame[:, 2]))
+        store.centers()[:] = frame[:, :2]
+        store.radii()[:] = frame[:, 2]
+        store.rotations()[:] = frame[:, 3]
+        for index in changed:
+            system.grid.relocate(system.particles[index])
+        system.notify("on_step", system, changed)
+        return changed
+
+    # The file stays mapped as long as frames read from it are referenced.
+    def close(self):
+        self._data = None
+        self._frames = None
+
+
+if __name__ == "__main__":
+    from particle import ParticleSystem
+    particle_system = ParticleSystem()
+    particle_system.make_circle(500, 500, 400)
+    particle_system.add_particles(200)
+    recorder = TrajectoryRecorder("trajectory.ptrj")
+    particle_system.subscribe(recorder)
+    recorder.record(particle_system)
+    for i in range(200):
+        particle_system.step()
+    recorder.close()
+    replayer = TrajectoryReplayer("trajectory.ptrj")
+    distances = np.linalg.norm(np.diff(replayer.trajectory(0), axis=0), axis=1)
+    print("Frames: {}, distance travelled by the first particle: {:.1f}".format(len(replayer), distances.sum()))
+    replayer.close()
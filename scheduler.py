@@ -0,0 +1,86 @@
+import time
+
+
+# Fixed timestep loop decoupling the ticks of a simulation from its frames. Each frame runs the ticks due since the
+# last one (rate ticks per second of the clock) and renders the state interpolated between the last two ticks with the
+# fraction of a tick left over. Under load, up to max_skipped frames in a row are not rendered to let the ticks catch
+# up, and past max_ticks per frame the remaining lag is dropped (the simulation then runs slower than the clock).
+# The tick and frame rates are measured over windows of the given number of seconds.
+class Scheduler:
+    def __init__(self, tick, render, rate=60, max_ticks=5, max_skipped=5, window=1, clock=time.perf_counter):
+        self._tick = tick
+        self._render = render
+        self._timestep = 1 / rate
+        self._max_ticks = max_ticks
+        self._max_skipped = max_skipped
+        self._window = window
+        self._clock = clock
+        self._time = None
+        self._accumulator = 0
+        self._skipped = 0
+        self._window_start = None
+        self._window_ticks = 0
+        self._window_frames = 0
+        self._tick_rate = 0
+        self._frame_rate = 0
+        self._behind = False
+        self.ticks = 0
+        self.frames = 0
+        self.skipped_frames = 0
+        self.dropped_ticks = 0
+
+    def get_timestep(self):
+        return self._timestep
+
+    # Ticks and frames per second over the last window.
+    def tick_rate(self):
+        return self._tick_rate
+
+    def frame_rate(self):
+        return self._frame_rate
+
+    # Check if the ticks could not keep up with the clock during the last frame.
+    def behind(self):
+        return self._behind
+
+    # Milliseconds until the next tick is due (to schedule the next frame).
+    def delay(self):
+        return max(1, int((self._timestep - self._accumulator) * 1000))
+
+    def frame(self):
+        now = self._clock()
+        if self._time is None:
+            self._time = now
+            self._window_start = now
+        self._accumulator += now - self._time
+        self._time = now
+
+        ticks = 0
+        while self._accumulator >= self._timestep and ticks < self._max_ticks:
+            self._tick()
+            self._accumulator -= self._timestep
+            ticks += 1
+        self.ticks += ticks
+        self._window_ticks += ticks
+        self._behind = self._accumulator >= self._timestep
+
+        if self._behind and self._skipped < self._max_skipped:
+            self._skipped += 1
+            self.skipped_frames += 1
+        else:
+            if self._behind:
+                dropped = int(self._accumulator / self._timestep)
+                self.dropped_ticks += dropped
+                self._accumulator -= dropped * self._timestep
+            self._skipped = 0
+            self._render(self._accumulator / self._timestep)
+            self.frames += 1
+            self._window_frames += 1
+
+        elapsed = now - self._window_start
+        if elapsed >= self._window:
+            self._tick_rate = self._window_ticks / elapsed
+            self._frame_rate = self._window_frames / elapsed
+            self._window_start = now
+            self._window_ticks = 0
+            self._window_frames = 0
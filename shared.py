@@ -0,0 +1,99 @@
+import numpy as np
+from multiprocessing import shared_memory
+from store import ParticleStore
+
+# Arrays of a shared store after its header (number of rows in use and capacity), in this order.
+FIELDS = (("centers", np.float64, 2), ("radii", np.float64, 1), ("rotations", np.float64, 1),
+          ("fields_of_view", np.float64, 2), ("alive", np.bool_, 1))
+HEADER_SIZE = 16
+
+
+# Offsets of the arrays of a shared store of the given capacity (aligned on 8 bytes) and the size of the segment.
+def layout(capacity):
+    offsets = {}
+    offset = HEADER_SIZE
+    for name, dtype, columns in FIELDS:
+        offsets[name] = offset
+        offset += -(-capacity * columns * np.dtype(dtype).itemsize // 8) * 8
+    return offsets, offset
+
+
+# Particle store whose arrays live in a single shared memory segment, so other processes can attach to it by name and
+# read (or write) the state of the particles without copying it. The number of rows in use is kept in the segment as
+# well: the views of the attached stores follow the particles added by the owner. The capacity cannot grow since
+# the attached processes would keep the former segment.
+# Processes started by multiprocessing share the resource tracker of the owner, others should attach with Python 3.13
+# or later (or the segment is unlinked when they exit).
+class SharedParticleStore(ParticleStore):
+    def __init__(self, capacity=16, name=None, create=True, readonly=False):
+        if create:
+            self._memory = shared_memory.SharedMemory(name=name, create=True, size=layout(capacity)[1])
+        else:
+            self._memory = shared_memory.SharedMemory(name=name)
+            capacity = int(np.ndarray(2, dtype=np.int64, buffer=self._memory.buf)[1])
+        self._owner = create
+        self._header = np.ndarray(2, dtype=np.int64, buffer=self._memory.buf)
+        offsets = layout(capacity)[0]
+        arrays = {}
+        for field, dtype, columns in FIELDS:
+            shape = (capacity, columns) if columns > 1 else (capacity,)
+            arrays[field] = np.ndarray(shape, dtype=dtype, buffer=self._memory.buf, offset=offsets[field])
+        self._centers = arrays["centers"]
+        self._radii = arrays["radii"]
+        self._rotations = arrays["rotations"]
+        self._fields_of_view = arrays["fields_of_view"]
+        self._alive = arrays["alive"]
+        if create:
+            self._header[:] = (0, capacity)
+            self._centers.fill(0)
+            self._radii.fill(0)
+            self._rotations.fill(0)
+            self._fields_of_view.fill(np.nan)
+            self._alive.fill(False)
+        if readonly:
+            for array in arrays.values():
+                array.flags.writeable = False
+
+    # Store of another process (read-only by default).
+    @classmethod
+    def attach(cls, name, readonly=True):
+        return cls(name=name, create=False, readonly=readonly)
+
+    # Copy of a store in shared memory, with room for capacity rows.
+    @classmethod
+    def copy(cls, store, capacity=None, name=None):
+        count = len(store)
+        shared_store = cls(max(count, capacity if capacity is not None else count, 1), name=name)
+        shared_store._centers[:count] = store.centers()
+        shared_store._radii[:count] = store.radii()
+        shared_store._rotations[:count] = store.rotations()
+        shared_store._fields_of_view[:count] = store.fields_of_view()
+        shared_store._alive[:count] = store.alive()
+        shared_store._count = count
+        return shared_store
+
+    def get_name(self):
+        return self._memory.name
+
+    @property
+    def _count(self):
+        return int(self._header[0])
+
+    @_count.setter
+    def _count(self, count):
+        self._header[0] = count
+
+    def reserve(self, capacity):
+        assert capacity <= self.capacity(), "The capacity of a shared store cannot grow."
+
+    # Release the segment (every view of the arrays must be gone), removing it if this store created it.
+    def close(self):
+        self._header = None
+        self._centers = None
+        self._radii = None
+        self._rotations = None
+        self._fields_of_view = None
+        self._alive = None
+        self._memory.close()
+        if self._owner:
+            self._memory.unlink()
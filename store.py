@@ -0,0 +1,62 @@
+import numpy as np
+
+
+# Contiguous arrays holding the state of a group of particles (one row per particle).
+class ParticleStore:
+    def __init__(self, capacity=16):
+        self._count = 0
+        self._centers = np.zeros((capacity, 2))
+        self._radii = np.zeros(capacity)
+        self._rotations = np.zeros(capacity)
+        self._fields_of_view = np.full((capacity, 2), np.nan)
+        self._alive = np.zeros(capacity, dtype=bool)
+
+    def __len__(self):
+        return self._count
+
+    def capacity(self):
+        return len(self._radii)
+
+    # Views of the rows currently in use (writes go straight to the particles).
+    def centers(self):
+        return self._centers[:self._count]
+
+    def radii(self):
+        return self._radii[:self._count]
+
+    def rotations(self):
+        return self._rotations[:self._count]
+
+    def fields_of_view(self):
+        return self._fields_of_view[:self._count]
+
+    def alive(self):
+        return self._alive[:self._count]
+
+    def reserve(self, capacity):
+        if capacity > self.capacity():
+            count = self._count
+            centers = np.zeros((capacity, 2))
+            radii = np.zeros(capacity)
+            rotations = np.zeros(capacity)
+            fields_of_view = np.full((capacity, 2), np.nan)
+            alive = np.zeros(capacity, dtype=bool)
+            centers[:count] = self._centers[:count]
+            radii[:count] = self._radii[:count]
+            rotations[:count] = self._rotations[:count]
+            fields_of_view[:count] = self._fields_of_view[:count]
+            alive[:count] = self._alive[:count]
+            self._centers = centers
+            self._radii = radii
+            self._rotations = rotations
+            self._fields_of_view = fields_of_view
+            self._alive = alive
+
+    # Return the index of a new row, growing the arrays geometrically when they are full.
+    def allocate(self):
+        if self._count == self.capacity():
+            self.reserve(max(1, 2 * self.capacity()))
+        index = self._count
+        self._count += 1
+        self._alive[index] = True
+        return index
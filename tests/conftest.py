@@ -0,0 +1,28 @@
+import os
+import random
+import sys
+import numpy as np
+import pytest
+
+# The modules of the package sit at the top of the repository.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from node import Quadtree
+from particle import ParticleSystem
+
+
+# Make a system in a circular zone (x, y, radius) or a rectangular one (x, y, width, height) with a broad phase and its
+# options, and place count particles with the options of add_particles. The same seed places the same particles.
+@pytest.fixture
+def make_system():
+    def make_system(count, zone=(500, 500, 400), broad_phase=Quadtree, options=None, seed=0, **placement):
+        random.seed(seed)
+        np.random.seed(seed)
+        particle_system = ParticleSystem()
+        if len(zone) == 3:
+            particle_system.make_circle(*zone, broad_phase, **(options or {}))
+        else:
+            particle_system.make_rectangle(*zone, broad_phase, **(options or {}))
+        particle_system.add_particles(count, **placement)
+        return particle_system
+    return make_system
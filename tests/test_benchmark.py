@@ -0,0 +1,32 @@
+import json
+import os
+import subprocess
+import sys
+import benchmark
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TINY = ["--counts", "20", "--densities", "0.2", "--shapes", "circle", "--operations", "3", "--repeats", "1",
+        "--steps", "2", "--workers", "2", "--quiet"]
+
+
+def test_benchmark(tmp_path):
+    path = str(tmp_path / "benchmark.json")
+    assert benchmark.main(TINY + ["--output", path]) == 0
+    with open(path) as file:
+        report = json.load(file)
+    assert sorted(result["benchmark"] for result in report["results"]) == sorted(benchmark.BENCHMARKS)
+    assert all(result["seconds"] > 0 for result in report["results"])
+    assert all(result["speedup"] > 0 for result in report["results"] if result["benchmark"] in ("step", "parallel"))
+
+    # The same run compared with a baseline 100 times faster fails.
+    for result in report["results"]:
+        result["seconds"] /= 100
+    baseline = str(tmp_path / "baseline.json")
+    with open(baseline, "w") as file:
+        json.dump(report, file)
+    process = subprocess.run([sys.executable, "benchmark.py"] + TINY + ["--output", path, "--compare", baseline],
+                             cwd=ROOT, stderr=subprocess.PIPE, universal_newlines=True)
+    assert process.returncode == 1
+    assert "Regression: move quadtree circle 20 0.2" in process.stderr
+    with open(path) as file:
+        assert len(json.load(file)["regressions"]) == len(benchmark.BENCHMARKS)
@@ -0,0 +1,86 @@
+import math
+import numpy as np
+import pytest
+import formula
+from graphic import Circle
+from grid import HashGrid
+from linear import LinearQuadtree
+from node import Quadtree
+
+BROAD_PHASES = {"quadtree": (Quadtree, {}), "loose": (Quadtree, {"loose": True}),
+                "capacity": (Quadtree, {"capacity": 4}), "grid": (HashGrid, {}), "linear": (LinearQuadtree, {})}
+
+
+# A system whose particles have moved (and were relocated in the broad phase) since they were placed.
+def moved_system(make_system, broad_phase, options):
+    particle_system = make_system(600, zone=(500, 400, 1000, 800), broad_phase=broad_phase, options=options, seed=4,
+                                  bulk=True, random_radius=True, min_radius=3, max_radius=15)
+    for i in range(3):
+        particle_system.step()
+    for particle in particle_system.particles[:50]:
+        particle.move(40)
+    return particle_system
+
+
+@pytest.fixture(params=sorted(BROAD_PHASES))
+def particle_system(request, make_system):
+    return moved_system(make_system, *BROAD_PHASES[request.param])
+
+
+def indices(circles):
+    positions = [circle.get_index() for circle in circles]
+    assert len(positions) == len(set(positions)), "The query returned duplicates."
+    return set(positions)
+
+
+def test_contents(particle_system):
+    assert indices(particle_system.grid.contents()) == set(range(len(particle_system.particles)))
+
+
+def test_query_circle(particle_system):
+    centers = particle_system.store.centers()
+    radii = particle_system.store.radii()
+    for x, y, radius in np.random.random((100, 3)) * (1000, 800, 60):
+        vectors = centers - (x, y)
+        expected = np.flatnonzero(np.einsum("ij,ij->i", vectors, vectors) <= np.square(radii + radius))
+        assert indices(particle_system.grid.query_circle(Circle(x, y, radius))) >= set(expected.tolist())
+
+
+def test_query_rectangle(particle_system):
+    centers = particle_system.store.centers()
+    radii = particle_system.store.radii()
+    for x, y, angle, length, margin in np.random.random((100, 5)) * (1000, 800, 2 * math.pi, 100, 15):
+        start = np.array([x, y])
+        end = start + length * np.array([math.cos(angle), math.sin(angle)])
+        vector = end - start
+        t = np.clip((centers - start) @ vector / np.dot(vector, vector), 0, 1)
+        offsets = centers - (start + t[:, np.newaxis] * vector)
+        expected = np.flatnonzero(np.einsum("ij,ij->i", offsets, offsets) <= np.square(radii + margin))
+        assert indices(particle_system.grid.query_rectangle(start, end, margin)) >= set(expected.tolist())
+
+
+def test_query_sector(particle_system):
+    centers = particle_system.store.centers()
+    radii = particle_system.store.radii()
+    for x, y, rotation, reach, angle in np.random.random((100, 5)) * (1000, 800, 360, 200, 360):
+        center = np.array([x, y])
+        direction = reach * np.array([math.cos(math.radians(rotation)), math.sin(math.radians(rotation))])
+        count = len(radii)
+        visible, distances = formula.in_fields_of_view(centers - center, np.full(count, reach), np.full(count, angle),
+                                                       np.full(count, rotation), radii)
+        expected = np.flatnonzero(visible)
+        assert indices(particle_system.grid.query_sector(center, direction, angle)) >= set(expected.tolist())
+
+
+@pytest.mark.parametrize("name", ["quadtree", "loose"])
+def test_within_and_nearest(make_system, name):
+    particle_system = moved_system(make_system, *BROAD_PHASES[name])
+    centers = particle_system.store.centers()
+    radii = particle_system.store.radii()
+    for x, y, radius in np.random.random((50, 3)) * (1000, 800, 60):
+        distances = np.sqrt(np.einsum("ij,ij->i", centers - (x, y), centers - (x, y))) - radii
+        order = np.lexsort((np.arange(len(radii)), distances))
+        within = [circle.get_index() for circle in particle_system.grid.within((x, y), radius)]
+        assert sorted(within) == sorted(np.flatnonzero(distances <= radius).tolist())
+        nearest = [circle.get_index() for circle in particle_system.grid.nearest((x, y), 5)]
+        assert np.allclose(distances[nearest], distances[order[:5]])
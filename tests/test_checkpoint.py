@@ -0,0 +1,85 @@
+import json
+import struct
+import numpy as np
+import pytest
+from grid import HashGrid
+from linear import LinearQuadtree
+from node import Quadtree
+from particle import CHECKPOINT, CHECKPOINT_MAGIC, ParticleSystem
+
+ZONES = {"circle": (500, 500, 400), "rectangle": (500, 500, 900, 500)}
+
+
+def filled_system(make_system, zone, broad_phase):
+    particle_system = make_system(300, zone=ZONES[zone], broad_phase=broad_phase, bulk=True, random_radius=True,
+                                  min_radius=3, max_radius=9)
+    for particle in particle_system.particles[::3]:
+        particle.field_of_view = np.array([100, 90])
+        particle.tag = "observer"
+    particle_system.step()
+    return particle_system
+
+
+def contents(particle_system):
+    positions = dict(zip(particle_system.particles, range(len(particle_system.particles))))
+    return sorted(positions[circle] for circle in particle_system.grid.contents())
+
+
+# Rewrite a checkpoint as version 1, which had no alive flags.
+def downgrade(path):
+    with open(path, "rb") as file:
+        data = file.read()
+    magic, version, length = struct.unpack_from(CHECKPOINT, data)
+    offset = struct.calcsize(CHECKPOINT)
+    header = json.loads(data[offset:offset + length])
+    offset += length
+    arrays = []
+    for name, dtype, shape in header["arrays"]:
+        size = int(np.prod(shape, dtype=np.int64)) * np.dtype(dtype).itemsize
+        if name != "alive":
+            arrays.append(([name, dtype, shape], data[offset:offset + size]))
+        offset += size
+    header["arrays"] = [spec for spec, array in arrays]
+    header = json.dumps(header).encode()
+    with open(path, "wb") as file:
+        file.write(struct.pack(CHECKPOINT, CHECKPOINT_MAGIC, 1, len(header)))
+        file.write(header)
+        for spec, array in arrays:
+            file.write(array)
+
+
+@pytest.mark.parametrize("zone", sorted(ZONES))
+@pytest.mark.parametrize("broad_phase", [Quadtree, HashGrid, LinearQuadtree])
+def test_round_trip(tmp_path, make_system, zone, broad_phase):
+    particle_system = filled_system(make_system, zone, broad_phase)
+    path = str(tmp_path / "system.ckpt")
+    particle_system.save(path)
+    loaded = ParticleSystem.load(path)
+
+    assert type(loaded.grid) is broad_phase
+    assert loaded.grid.options() == particle_system.grid.options()
+    for name in ("centers", "radii", "rotations", "fields_of_view", "alive"):
+        assert np.array_equal(getattr(loaded.store, name)(), getattr(particle_system.store, name)(), equal_nan=True)
+    assert [particle.tag for particle in loaded.particles] == [particle.tag for particle in particle_system.particles]
+    assert contents(loaded) == contents(particle_system)
+    if broad_phase is Quadtree:
+        for saved, restored in zip(particle_system.grid.topology(particle_system.particles),
+                                   loaded.grid.topology(loaded.particles)):
+            assert np.array_equal(saved, restored)
+
+    # Both systems go on the same way.
+    np.random.seed(1)
+    particle_system.step()
+    np.random.seed(1)
+    loaded.step()
+    assert np.array_equal(loaded.store.centers(), particle_system.store.centers())
+
+
+def test_version_1(tmp_path, make_system):
+    particle_system = filled_system(make_system, "circle", Quadtree)
+    path = str(tmp_path / "system.ckpt")
+    particle_system.save(path)
+    downgrade(path)
+    loaded = ParticleSystem.load(path)
+    assert np.array_equal(loaded.store.centers(), particle_system.store.centers())
+    assert loaded.store.alive().all()
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+from collision import overlapped_circles, sweep_circle, time_of_impact
+
+
+# A circle of radius 1 at the origin moves by the displacement past a circle of radius 1 at the given center.
+@pytest.mark.parametrize("center,displacement,expected", [
+    ((5, 0), (10, 0), 0.3),
+    ((5, 2), (10, 0), 0.5),
+    ((5, 2.001), (10, 0), 1),
+    ((20, 0), (10, 0), 1),
+    ((-2, 0), (10, 0), 1),
+    ((2, 0), (10, 0), 0),
+    ((1, 0), (10, 0), 0),
+    ((-1, 0), (10, 0), 1),
+    ((3, 0), (0, 10), 1),
+], ids=["head-on", "tangent", "miss", "short", "touching apart", "touching", "overlapping", "overlapping apart",
+        "sideways"])
+def test_time_of_impact(center, displacement, expected):
+    vectors = -np.array([center], dtype=float)
+    times = time_of_impact(vectors, np.array([displacement], dtype=float), np.array([2.0]))
+    assert times[0] == pytest.approx(expected)
+
+
+def test_sweep_circle():
+    centers = np.array([[5.0, 0], [5, 2], [-3, 0], [30, 0]])
+    radii = np.array([1.0, 1, 1, 1])
+    assert sweep_circle(np.zeros(2), 1, np.array([10.0, 0]), centers, radii) == pytest.approx(0.3)
+    assert sweep_circle(np.zeros(2), 1, np.array([10.0, 0]), centers[1:], radii[1:]) == pytest.approx(0.5)
+    assert sweep_circle(np.zeros(2), 1, np.array([-10.0, 0]), centers[3:], radii[3:]) == 1
+    assert sweep_circle(np.zeros(2), 1, np.array([10.0, 0]), np.empty((0, 2)), np.empty(0)) == 1
+
+
+def test_overlapped_circles():
+    centers = np.array([[2.0, 0], [1.5, 0], [0, 3], [0.1 + 0.2, 1.9]])
+    radii = np.array([1.0, 1, 1, 1])
+    assert overlapped_circles(np.zeros(2), 1, centers, radii).tolist() == [False, True, False, True]
@@ -0,0 +1,119 @@
+import numpy as np
+import pytest
+import formula
+from graphic import Circle
+
+
+def overlapping_pairs(particle_system):
+    centers = particle_system.store.centers()
+    radii = particle_system.store.radii()
+    vectors = centers[:, np.newaxis] - centers[np.newaxis]
+    gaps = np.sqrt(np.einsum("ijk,ijk->ij", vectors, vectors)) - (radii[:, np.newaxis] + radii[np.newaxis])
+    first, second = np.nonzero(np.triu(gaps < -1e-09, 1))
+    return list(zip(first.tolist(), second.tolist()))
+
+
+@pytest.mark.parametrize("zone", [(300, 300, 300), (300, 200, 600, 300)])
+def test_bulk_placement(make_system, zone):
+    particle_system = make_system(300, zone=zone, bulk=True, random_radius=True, min_radius=2, max_radius=12)
+    assert len(particle_system.particles) == 300
+    assert particle_system.shape.confines_circles(particle_system.store.centers(), particle_system.store.radii()).all()
+    assert overlapping_pairs(particle_system) == []
+    assert sorted(circle.get_index() for circle in particle_system.grid.contents()) == list(range(300))
+
+
+def test_bulk_placement_avoids_the_particles_in_place(make_system):
+    particle_system = make_system(200, zone=(300, 300, 300), seed=3, bulk=True)
+    particle_system.add_particles(200, bulk=True, random_radius=True, min_radius=2, max_radius=12)
+    assert overlapping_pairs(particle_system) == []
+
+
+def brute_force_collisions(circles, touching=True):
+    return [(i, j) for i in range(len(circles)) for j in range(i + 1, len(circles))
+            if (circles[i].collides_circle(circles[j]) if touching else circles[i].overlaps_circle(circles[j]))]
+
+
+def test_colliding_pairs_match_brute_force():
+    np.random.seed(0)
+    centers = np.random.random((400, 2)) * 200
+    radii = np.random.uniform(2, 8, 400)
+    circles = [Circle(x, y, r) for (x, y), r in zip(centers, radii)]
+    for touching in (True, False):
+        first, second = formula.colliding_pairs(centers, radii, touching)
+        assert sorted(zip(first.tolist(), second.tolist())) == brute_force_collisions(circles, touching)
+
+
+# Pairs touching up to the rounding of their distance.
+def test_colliding_pairs_keep_touching_pairs():
+    np.random.seed(0)
+    centers = np.random.random((400, 2)) * 200
+    radii = np.full(400, 5.0)
+    angles = np.random.random(100) * 2 * np.pi
+    centers[1::4] = centers[::4] + 10 * np.column_stack((np.cos(angles), np.sin(angles)))
+    circles = [Circle(x, y, r) for (x, y), r in zip(centers, radii)]
+    first, second = formula.colliding_pairs(centers, radii)
+    expected = brute_force_collisions(circles)
+    assert len(expected) >= 100
+    assert sorted(zip(first.tolist(), second.tolist())) == expected
+
+
+# The particles stopped by step touch the ones they ran into.
+def test_collision_audit(make_system):
+    particle_system = make_system(500, zone=(300, 300, 300), seed=1, bulk=True)
+    for i in range(3):
+        particle_system.step()
+    pairs, summary = particle_system.grid.collision_audit()
+    assert summary["count"] == len(particle_system.particles)
+    assert summary["collisions"] == len(brute_force_collisions(particle_system.grid.contents()))
+    assert summary["overlaps"] == 0
+    assert len(pairs) == summary["collisions"]
+
+
+def test_batch_kernels_match_scalar():
+    np.random.seed(3)
+    u = np.random.uniform(-50, 50, (200, 2))
+    v = np.random.uniform(-50, 50, (200, 2))
+    values = np.random.uniform(-50, 50, 200)
+    assert np.allclose(formula.resize_vectors(u, values), [formula.resize_vector(a, m) for a, m in zip(u, values)])
+    assert np.allclose(formula.rotate_vectors(u, values), [formula.rotate_vector(a, m) for a, m in zip(u, values)])
+    assert np.allclose(formula.project_vectors(u, v), [formula.project_vector(a, b) for a, b in zip(u, v)])
+    for signed in (False, True):
+        assert np.allclose(formula.angles_between(u, v, signed),
+                           [formula.angle_between(a, b, signed) for a, b in zip(u, v)])
+
+    a, b, c = np.random.uniform(-5, 5, (3, 200))
+    assert np.allclose(np.column_stack(formula.quadratics(a, b, c)),
+                       [formula.quadratic(*coefficients) for coefficients in zip(a, b, c)], equal_nan=True)
+
+    # Segments ending inside the circles, and a few whose line misses them.
+    radii = np.random.uniform(1, 20, 200)
+    centers = np.random.uniform(-50, 50, (200, 2))
+    ends = centers + formula.rotate_vectors([[1, 0]], values * 7.2) * (radii * np.random.random(200))[:, np.newaxis]
+    starts = ends + np.random.uniform(-60, 60, (200, 2))
+    starts[:10] = centers[:10] + (100, 0)
+    ends[:10] = centers[:10] + (-100, 0)
+    starts[:10, 1] = ends[:10, 1] = centers[:10, 1] + radii[:10] * 1.5
+    expected = [formula.point_on_circumference(*arguments) for arguments in zip(radii, centers, starts, ends)]
+    assert np.allclose(formula.points_on_circumference(radii, centers, starts, ends), expected)
+
+
+def test_poisson_disk_without_circles(make_system):
+    particle_system = make_system(0)
+    coords, placed = formula.poisson_disk(particle_system.shape.random_circle_coords,
+                                          particle_system.shape.confines_circles, [], particle_system.shape.bounds())
+    assert coords.shape == (0, 2) and len(placed) == 0
+    assert particle_system.add_particles(0, bulk=True) == 0
+    particle_system.add_particles(10, bulk=True)
+    assert particle_system.add_particles(0, bulk=True) == 0
+    assert len(particle_system.particles) == 10
+
+
+def test_close_pairs_between_match_brute_force():
+    np.random.seed(6)
+    queries = np.random.random((150, 2)) * 500
+    points = np.random.random((400, 2)) * 600 - 50
+    distances = np.random.random(150) * 40
+    first, second = formula.close_pairs_between(queries, points, distances)
+    vectors = queries[:, np.newaxis] - points[np.newaxis]
+    expected = np.argwhere(np.einsum("ijk,ijk->ij", vectors, vectors) <= np.square(distances)[:, np.newaxis])
+    assert sorted(zip(first.tolist(), second.tolist())) == sorted(map(tuple, expected.tolist()))
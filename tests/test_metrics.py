@@ -0,0 +1,72 @@
+import itertools
+import json
+import numpy as np
+from metrics import Histogram, MetricsExporter, MetricsRegistry
+from particle import SystemObserver
+
+
+def test_histogram():
+    histogram = Histogram(buckets=[1, 2, 4, 8])
+    for value in (0.5, 1.5, 1.5, 3, 100):
+        histogram.observe(value)
+    assert histogram.counts == [1, 2, 1, 0, 1]
+    assert histogram.percentile(50) == 2
+    assert histogram.percentile(100) == 100
+    snapshot = histogram.snapshot()
+    assert (snapshot["count"], snapshot["min"], snapshot["max"]) == (5, 0.5, 100)
+    histogram.reset()
+    assert histogram.snapshot() == {"count": 0}
+
+
+def test_disabled_registry():
+    registry = MetricsRegistry(enabled=False)
+    registry.increment("calls")
+    registry.observe("latency", 1)
+    registry.stopwatch("move").lap("query")
+    assert registry.snapshot() == {"counters": {}, "gauges": {}, "histograms": {}}
+
+
+def test_exporter(tmp_path, make_system):
+    particle_system = make_system(40, zone=(300, 300, 250), seed=2, bulk=True)
+    particle_system.metrics = MetricsRegistry()
+    path = str(tmp_path / "metrics.jsonl")
+    exporter = MetricsExporter(path, interval=2)
+    assert isinstance(exporter, SystemObserver)
+    particle_system.subscribe(exporter)
+    for i in range(6):
+        particle_system.step()
+    exporter.close()
+
+    with open(path) as file:
+        lines = [json.loads(line) for line in file]
+    assert [line["tick"] for line in lines] == [2, 4, 6]
+    for line in lines:
+        # Each line covers the two steps since the previous one.
+        assert line["counters"]["step.calls"] == 2
+        for phase in ("confinement", "broad_phase", "narrow_phase", "reindex"):
+            assert line["histograms"]["step." + phase]["count"] == 2
+        assert line["gauges"]["particles"] == 40
+
+
+# Every phase lasts a tick of the clock.
+def test_move_and_search_phases(make_system):
+    particle_system = make_system(100, bulk=True)
+    particle_system.metrics = MetricsRegistry(clock=itertools.count().__next__)
+    for particle in particle_system.particles[:20]:
+        particle.move(30)
+    targets = 0
+    for particle in particle_system.particles[20:30]:
+        particle.field_of_view = np.array([200, 90])
+        targets += len(particle.search())
+
+    snapshot = particle_system.metrics.snapshot()
+    counters = snapshot["counters"]
+    histograms = snapshot["histograms"]
+    assert counters["move.calls"] == 20 and counters["search.calls"] == 10
+    assert counters["search.targets"] == targets
+    assert histograms["move.confinement"]["count"] == 20
+    assert histograms["move.broad_phase"]["count"] == histograms["move.narrow_phase"]["count"] == 20
+    assert histograms["move.reindex"]["count"] == counters["move.moved"] > 0
+    assert histograms["search.broad_phase"]["count"] == histograms["search.narrow_phase"]["count"] == 10
+    for histogram in histograms.values():
+        assert histogram["sum"] == histogram["count"] and histogram["max"] == 1
@@ -0,0 +1,90 @@
+import random
+import numpy as np
+import pytest
+from grid import HashGrid
+from node import Quadtree
+from parallel import ParallelStepper
+
+ZONES = {"circle": (500, 500, 480), "rectangle": (500, 500, 900, 500)}
+
+
+def filled_system(make_system, zone, broad_phase, count=800):
+    return make_system(count, zone=ZONES[zone], broad_phase=broad_phase, seed=7, bulk=True, random_radius=True,
+                       min_radius=3, max_radius=9)
+
+
+# The stepper moves the particles exactly like ParticleSystem.step with the same random moves. The indexes of the
+# workers are reused between the rebalances when the skin (by default the largest radius, 9) covers a step at least.
+@pytest.mark.parametrize("zone,broad_phase,workers,speed,skin,shared,reused", [
+    ("circle", Quadtree, 3, 50, None, False, False),
+    ("rectangle", HashGrid, 2, 20, 100, False, True),
+    ("circle", Quadtree, 3, 2, None, False, True),
+    ("circle", Quadtree, 4, 80, None, True, False),
+])
+def test_parallel_step_matches_step(make_system, zone, broad_phase, workers, speed, skin, shared, reused):
+    serial = filled_system(make_system, zone, broad_phase)
+    parallel = filled_system(make_system, zone, broad_phase)
+    store = parallel.share() if shared else None
+    stepper = ParallelStepper(parallel, workers=workers, rebalance=3, skin=skin)
+    try:
+        for i in range(8):
+            np.random.seed(100 + i)
+            serial.step(speed=speed)
+            np.random.seed(100 + i)
+            stepper.step(speed=speed)
+            assert np.array_equal(parallel.store.centers(), serial.store.centers())
+        assert stepper.migrations > 0
+        assert (stepper.indexes < 8) == reused
+        stepper.sync()
+        for particle in parallel.particles:
+            assert particle in parallel.grid.query_circle(particle)
+    finally:
+        stepper.close()
+        if store is not None:
+            store.close()
+
+
+def test_parallel_step_with_few_particles(make_system):
+    serial = filled_system(make_system, "circle", Quadtree, count=5)
+    parallel = filled_system(make_system, "circle", Quadtree, count=5)
+    stepper = ParallelStepper(parallel, workers=4)
+    try:
+        for i in range(3):
+            np.random.seed(i)
+            serial.step()
+            np.random.seed(i)
+            stepper.step()
+        assert np.array_equal(parallel.store.centers(), serial.store.centers())
+    finally:
+        stepper.close()
+
+
+# Particles added or moved between the steps are taken into the indexes of the workers (the broad phase of the system
+# must be synced before).
+def test_parallel_step_after_changes(make_system):
+    serial = filled_system(make_system, "circle", Quadtree, count=300)
+    parallel = filled_system(make_system, "circle", Quadtree, count=300)
+    stepper = ParallelStepper(parallel, workers=3)
+    try:
+        for i in range(6):
+            if i == 2:
+                stepper.sync()
+                for particle_system in (serial, parallel):
+                    random.seed(50)
+                    np.random.seed(50)
+                    particle_system.add_particles(300, bulk=True)
+            if i == 4:
+                stepper.sync()
+                for particle_system in (serial, parallel):
+                    random.seed(60)
+                    np.random.seed(60)
+                    for particle in particle_system.particles[::10]:
+                        particle.move(30)
+            np.random.seed(100 + i)
+            serial.step()
+            np.random.seed(100 + i)
+            stepper.step()
+            assert np.array_equal(parallel.store.centers(), serial.store.centers())
+        assert len(parallel.particles) > 300 and stepper.indexes >= 3
+    finally:
+        stepper.close()
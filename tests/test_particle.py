@@ -0,0 +1,59 @@
+import os
+import subprocess
+import sys
+import numpy as np
+from particle import SystemObserver
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class EventLog(SystemObserver):
+    def __init__(self):
+        self.events = []
+
+    def on_move(self, particle, departure, confined):
+        self.events.append(("on_move", particle, departure.copy(), confined))
+
+    def on_search(self, particle, targets, searched):
+        self.events.append(("on_search", particle, list(targets), searched))
+
+    def on_step(self, system, moved):
+        self.events.append(("on_step", system, np.array(moved)))
+
+
+def test_core_imports_neither_tkinter_nor_the_optional_modules():
+    modules = ["tkinter", "multiprocessing.shared_memory", "shared", "metrics", "linear"]
+    script = "import sys, particle; assert not set({}) & set(sys.modules), sorted(sys.modules)".format(modules)
+    subprocess.run([sys.executable, "-c", script], cwd=ROOT, check=True)
+
+
+def test_observers(make_system):
+    particle_system = make_system(30, bulk=True)
+    log = EventLog()
+    particle_system.subscribe(log)
+
+    particle = particle_system.particles[0]
+    departure = particle.get_center().copy()
+    particle.move(20)
+    assert len(log.events) == 1
+    event, moved, position, confined = log.events.pop()
+    assert (event, moved, confined) == ("on_move", particle, True)
+    assert np.array_equal(position, departure)
+
+    particle.field_of_view = np.array([800, 360])
+    targets = particle.search()
+    event, searcher, found, searched = log.events.pop()
+    assert (event, searcher, found) == ("on_search", particle, targets)
+    assert len(targets) == 29 and searched >= 29
+
+    centers = particle_system.store.centers().copy()
+    particle_system.step()
+    event, system, indices = log.events.pop()
+    assert (event, system) == ("on_step", particle_system)
+    changed = np.flatnonzero((particle_system.store.centers() != centers).any(axis=1))
+    assert sorted(indices.tolist()) == changed.tolist()
+    assert log.events == []
+
+    particle_system.unsubscribe(log)
+    particle_system.step()
+    assert log.events == []
@@ -0,0 +1,141 @@
+import math
+import numpy as np
+import pytest
+from node import Quadrant
+
+
+def quadrants(quadtree):
+    queue = [quadtree.get_root()]
+    while len(queue) > 0:
+        quadrant = queue.pop()
+        queue += quadrant.leaves()
+        yield quadrant
+
+
+def leaves(quadtree):
+    return [quadrant for quadrant in quadrants(quadtree) if len(quadrant.leaves()) == 0]
+
+
+# A leaf may only hold more than capacity circles when the split policy stops it from being partitioned.
+def splittable(quadrant, max_depth, min_size):
+    if max_depth is not None and quadrant.depth() >= max_depth:
+        return False
+    width = quadrant.get_width() / 2
+    height = quadrant.get_height() / 2
+    return min(width, height) > min_size or math.isclose(min(width, height), min_size)
+
+
+@pytest.mark.parametrize("options", [{"capacity": 1, "min_size": 10}, {"capacity": 4, "min_size": 10},
+                                     {"capacity": 2, "max_depth": 3, "min_size": 10},
+                                     {"capacity": 1, "min_size": 100}])
+def test_split_policy(make_system, options):
+    particle_system = make_system(300, options=options, radius=5)
+    for i in range(3):
+        particle_system.step(speed=20)
+    grid = particle_system.grid
+    for leaf in leaves(grid):
+        if len(leaf.contents()) > options["capacity"]:
+            assert not splittable(leaf, options.get("max_depth"), options["min_size"])
+        if "max_depth" in options:
+            assert leaf.depth() <= options["max_depth"]
+        assert min(leaf.get_width(), leaf.get_height()) >= options["min_size"]
+    assert sum(len(leaf.contents()) > 0 for leaf in leaves(grid)) > 1
+
+
+# The second batch goes into a quadtree that already holds circles, so its leaves must be split one circle at a time.
+@pytest.mark.parametrize("options", [{"capacity": 1, "min_size": 10}, {"capacity": 4, "min_size": 10},
+                                     {"capacity": 2, "max_depth": 3, "min_size": 10}])
+def test_bulk_load_into_a_filled_tree(make_system, options):
+    particle_system = make_system(200, options=options, bulk=True, radius=5)
+    particle_system.add_particles(200, bulk=True, radius=5)
+    grid = particle_system.grid
+    assert len(grid.contents()) > 300
+    for leaf in leaves(grid):
+        if len(leaf.contents()) > options["capacity"]:
+            assert not splittable(leaf, options.get("max_depth"), options["min_size"])
+
+
+@pytest.mark.parametrize("capacity", [2, 4])
+def test_collapse(make_system, capacity):
+    particle_system = make_system(300, options={"capacity": capacity}, radius=5)
+    grid = particle_system.grid
+    count = grid.quadrants_count()
+
+    # Empty the left half of the zone.
+    for particle in particle_system.particles:
+        if particle.get_center()[0] < 450:
+            grid.remove(particle)
+    assert grid.quadrants_count() < count
+    for quadrant in quadrants(grid):
+        if quadrant.get_center()[0] + quadrant.get_width() / 2 < 440:
+            assert len(quadrant.leaves()) == 0
+
+
+@pytest.mark.parametrize("capacity", [1, 2, 4])
+def test_collapse_to_the_root(make_system, capacity):
+    particle_system = make_system(100, options={"capacity": capacity}, radius=5)
+    grid = particle_system.grid
+    assert grid.quadrants_count() > 1
+    for particle in particle_system.particles[1:]:
+        grid.remove(particle)
+    assert grid.quadrants_count() == 1
+
+
+def test_partition_tiles_the_quadrant():
+    quadrant = Quadrant(100, 50, 200, 60)
+    quadrant.partition()
+    bounds = []
+    for leaf in quadrant.leaves():
+        x, y = leaf.get_center()
+        bounds.append([x - leaf.get_width() / 2, y - leaf.get_height() / 2, x + leaf.get_width() / 2,
+                       y + leaf.get_height() / 2])
+    bounds = np.array(bounds)
+    assert np.allclose(bounds[:, 2] - bounds[:, 0], 100) and np.allclose(bounds[:, 3] - bounds[:, 1], 30)
+    assert sorted(map(tuple, bounds[:, :2].tolist())) == [(0, 20), (0, 50), (100, 20), (100, 50)]
+
+
+# Sign of the turn from a to b to c, for every row.
+def orientations(a, b, c):
+    ab = b - a
+    ac = c - a
+    return np.sign(ab[..., 0] * ac[..., 1] - ab[..., 1] * ac[..., 0])
+
+
+# Check whether a rectangle (its corners in order) overlaps boxes (rows of x1, y1, x2, y2): a corner of one is inside
+# the other or two of their edges cross.
+def rectangle_overlaps_boxes(rectangle, boxes):
+    x1, y1, x2, y2 = boxes.T[:, :, np.newaxis]
+    x, y = rectangle.T
+    overlaps = ((x1 <= x) & (x <= x2) & (y1 <= y) & (y <= y2)).any(axis=1)
+    box_corners = boxes[:, [[0, 1], [2, 1], [2, 3], [0, 3]]]
+    edges = np.roll(rectangle, -1, axis=0) - rectangle
+    offsets = box_corners[:, :, np.newaxis] - rectangle
+    turns = edges[:, 0] * offsets[..., 1] - edges[:, 1] * offsets[..., 0]
+    overlaps |= ((turns >= 0).all(axis=2) | (turns <= 0).all(axis=2)).any(axis=1)
+    for i in range(4):
+        p1, p2 = rectangle[i], rectangle[(i + 1) % 4]
+        for j in range(4):
+            q1, q2 = box_corners[:, j], box_corners[:, (j + 1) % 4]
+            overlaps |= (orientations(p1, p2, q1) != orientations(p1, p2, q2)) \
+                & (orientations(q1, q2, p1) != orientations(q1, q2, p2))
+    return overlaps
+
+
+def test_rectangle_overlap(make_system):
+    particle_system = make_system(400, seed=7, bulk=True, random_radius=True, min_radius=3, max_radius=12)
+    grid = particle_system.grid
+    nodes = list(quadrants(grid))
+    boxes = np.array([[quadrant.get_center()[0] - quadrant.get_width() / 2,
+                       quadrant.get_center()[1] - quadrant.get_height() / 2,
+                       quadrant.get_center()[0] + quadrant.get_width() / 2,
+                       quadrant.get_center()[1] + quadrant.get_height() / 2] for quadrant in nodes])
+    for x, y, angle, length, margin in np.random.random((200, 5)) * (1000, 1000, 2 * math.pi, 300, 20):
+        start = np.array([x, y])
+        u = np.array([math.cos(angle), math.sin(angle)])
+        v = np.array([-u[1], u[0]])
+        end = start + length * u
+        rectangle = np.array([start - margin * u - margin * v, end + margin * u - margin * v,
+                              end + margin * u + margin * v, start - margin * u + margin * v])
+        overlapped = rectangle_overlaps_boxes(rectangle, boxes)
+        expected = [quadrant for quadrant, overlaps in zip(nodes, overlapped) if overlaps]
+        assert set(grid.rectangle_overlap(start, end, margin, None)) == set(expected)
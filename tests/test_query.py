@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from query import QueryExecutor, Snapshot
+
+
+@pytest.fixture(params=[(500, 500, 480), (500, 500, 900, 400)], ids=["circle", "rectangle"])
+def particle_system(request, make_system):
+    particle_system = make_system(1200, zone=request.param, seed=8, bulk=True, random_radius=True, min_radius=2,
+                                  max_radius=9)
+    for particle in particle_system.particles[::2]:
+        particle.field_of_view = np.array([np.random.uniform(20, 150), np.random.uniform(10, 360)])
+        particle.set_rotation(np.random.random() * 360)
+    return particle_system
+
+
+@pytest.fixture
+def executor(particle_system):
+    executor = QueryExecutor(Snapshot.from_system(particle_system), workers=4, chunk=100)
+    yield executor
+    executor.close()
+
+
+# The results on the pool equal the serial ones (compare asserts it) and those of the system, in the same order.
+def test_fields_of_view(particle_system, executor):
+    count = len(particle_system.store)
+    results, report = executor.compare("fields_of_view", np.arange(count))
+    assert report["queries"] == count
+    offsets, targets = particle_system.search_all()
+    for i in range(count):
+        assert np.array_equal(results[i], targets[offsets[i]:offsets[i + 1]])
+
+
+def test_within(particle_system, executor):
+    count = len(particle_system.store)
+    points = particle_system.store.centers() + np.random.normal(0, 5, (count, 2))
+    results, report = executor.compare("within", points, 25.0, np.arange(count))
+    for i in range(0, count, 5):
+        expected = particle_system.grid.within(points[i], 25.0, exclude=particle_system.particles[i])
+        assert results[i].tolist() == [circle.get_index() for circle in expected]
+
+
+def test_nearest(particle_system, executor):
+    count = len(particle_system.store)
+    points = particle_system.store.centers() + np.random.normal(0, 5, (count, 2))
+    results, report = executor.compare("nearest", points, 6, np.arange(count))
+    for i in range(0, count, 5):
+        expected = particle_system.grid.nearest(points[i], 6, exclude=particle_system.particles[i])
+        assert results[i].tolist() == [circle.get_index() for circle in expected]
+
+    # A point far from every particle still gets its nearest ones.
+    far = executor.nearest(np.array([[5000.0, 5000.0]]), 3)
+    expected = particle_system.grid.nearest(np.array([5000.0, 5000.0]), 3)
+    assert far[0].tolist() == [circle.get_index() for circle in expected]
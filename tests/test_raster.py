@@ -0,0 +1,149 @@
+import struct
+import zlib
+import numpy as np
+import pytest
+from raster import GifWriter, PngWriter, Raster, write_png
+
+
+# Pixels (RGB) of an indexed PNG without filters, like write_png writes them.
+def read_png(path):
+    with open(path, "rb") as file:
+        data = file.read()
+    assert data[:8] == b"\x89PNG\r\n\x1a\n"
+    chunks = {}
+    offset = 8
+    while offset < len(data):
+        length, kind = struct.unpack_from(">I4s", data, offset)
+        chunk = data[offset + 8:offset + 8 + length]
+        assert struct.unpack_from(">I", data, offset + 8 + length)[0] == zlib.crc32(kind + chunk) & 0xFFFFFFFF
+        chunks[kind] = chunks.get(kind, b"") + chunk
+        offset += 12 + length
+    width, height, depth, color_type = struct.unpack_from(">IIBB", chunks[b"IHDR"])
+    assert (depth, color_type) == (8, 3)
+    palette = np.frombuffer(chunks[b"PLTE"], dtype=np.uint8).reshape(-1, 3)
+    rows = np.frombuffer(zlib.decompress(chunks[b"IDAT"]), dtype=np.uint8).reshape(height, width + 1)
+    assert not rows[:, 0].any()
+    return palette[rows[:, 1:]]
+
+
+# Variable-width LZW codes of GIF (least significant bit first).
+def lzw_decode(data, minimum_size):
+    clear = 1 << minimum_size
+    stream = int.from_bytes(data, "little")
+    position = 0
+    width = minimum_size + 1
+    table = [bytes([i]) for i in range(clear)] + [b"", b""]
+    previous = None
+    output = bytearray()
+    while True:
+        code = (stream >> position) & ((1 << width) - 1)
+        position += width
+        if code == clear:
+            table = table[:clear + 2]
+            width = minimum_size + 1
+            previous = None
+            continue
+        if code == clear + 1:
+            return bytes(output)
+        if code < len(table):
+            entry = table[code]
+            if previous is not None:
+                table.append(previous + entry[:1])
+        else:
+            entry = previous + previous[:1]
+            table.append(entry)
+        output += entry
+        previous = entry
+        if len(table) == 1 << width and width < 12:
+            width += 1
+
+
+# Frames (RGB) of a GIF whose frames are drawn over the previous ones, like GifWriter writes them.
+def read_gif(path):
+    with open(path, "rb") as file:
+        data = file.read()
+    assert data[:6] == b"GIF89a"
+    width, height, flags = struct.unpack_from("<HHB", data, 6)
+    palette = np.frombuffer(data, dtype=np.uint8, count=3 * (2 << (flags & 7)), offset=13).reshape(-1, 3)
+    offset = 13 + 3 * (2 << (flags & 7))
+    canvas = np.zeros((height, width), dtype=np.uint8)
+    frames = []
+    while data[offset] != 0x3B:
+        if data[offset] == 0x21:
+            offset += 2
+            while data[offset] != 0:
+                offset += data[offset] + 1
+            offset += 1
+            continue
+        assert data[offset] == 0x2C
+        x, y, frame_width, frame_height, frame_flags = struct.unpack_from("<HHHHB", data, offset + 1)
+        assert frame_flags == 0
+        minimum_size = data[offset + 10]
+        offset += 11
+        blocks = bytearray()
+        while data[offset] != 0:
+            blocks += data[offset + 1:offset + 1 + data[offset]]
+            offset += data[offset] + 1
+        offset += 1
+        pixels = np.frombuffer(lzw_decode(bytes(blocks), minimum_size), dtype=np.uint8)
+        canvas[y:y + frame_height, x:x + frame_width] = pixels.reshape(frame_height, frame_width)
+        frames.append(palette[canvas])
+    return frames
+
+
+def drawn_system(make_system):
+    particle_system = make_system(40, zone=(100, 60, 190, 110), seed=5, bulk=True, random_radius=True, min_radius=2,
+                                  max_radius=8)
+    for particle in particle_system.particles[::4]:
+        particle.field_of_view = np.array([30, 60])
+        particle.set_rotation(np.random.random() * 360)
+    return particle_system
+
+
+def test_png(tmp_path, make_system):
+    raster = Raster(200, 120)
+    raster.draw_system(drawn_system(make_system))
+    raster.draw_circles([[20, 20]], [10], fill=(12, 34, 56))
+    path = str(tmp_path / "frame.png")
+    write_png(path, raster)
+    assert np.array_equal(read_png(path), raster.rgb())
+
+    writer = PngWriter(str(tmp_path / "frame_{:02d}.png"))
+    writer.write(raster)
+    writer.close()
+    assert np.array_equal(read_png(str(tmp_path / "frame_00.png")), raster.rgb())
+
+
+def test_gif(tmp_path, make_system):
+    particle_system = drawn_system(make_system)
+    raster = Raster(200, 120)
+    path = str(tmp_path / "frames.gif")
+    writer = GifWriter(path)
+    expected = []
+    for i in range(6):
+        raster.clear()
+        raster.draw_system(particle_system)
+        writer.write(raster)
+        expected.append(raster.rgb())
+        if i != 2:
+            particle_system.step()
+    writer.close()
+    frames = read_gif(path)
+    assert len(frames) == len(expected)
+    for frame, image in zip(frames, expected):
+        assert np.array_equal(frame, image)
+
+
+# Noise fills the table of codes, which is cleared when it reaches 4096 codes.
+@pytest.mark.parametrize("shape", [(1, 1), (3, 500), (300, 300)])
+def test_gif_encoding(tmp_path, shape):
+    np.random.seed(6)
+    raster = Raster(shape[1], shape[0])
+    for i in range(16):
+        raster.color((i, 2 * i, 3 * i))
+    raster.pixels[:] = np.random.randint(0, len(raster.palette), shape)
+    path = str(tmp_path / "noise.gif")
+    writer = GifWriter(path)
+    writer.write(raster)
+    writer.close()
+    assert np.array_equal(read_gif(path)[0], raster.rgb())
@@ -0,0 +1,30 @@
+import numpy as np
+from recorder import TrajectoryRecorder, TrajectoryReplayer
+
+
+def test_record_and_replay(tmp_path, make_system):
+    path = str(tmp_path / "trajectory.ptrj")
+    particle_system = make_system(60, zone=(300, 300, 280), seed=9, bulk=True)
+    recorder = TrajectoryRecorder(path, chunk=7, interval=3)
+    particle_system.subscribe(recorder)
+    expected = {}
+    for tick in range(1, 50):
+        particle_system.step()
+        if tick % 3 == 0:
+            expected[tick] = particle_system.store.centers().copy()
+    recorder.close()
+
+    replayer = TrajectoryReplayer(path)
+    assert len(replayer) == len(expected)
+    assert list(replayer.ticks()) == sorted(expected)
+    for tick, centers in expected.items():
+        assert np.array_equal(replayer.centers(tick), centers)
+    assert np.array_equal(replayer.trajectory(5), np.array([expected[tick][5] for tick in sorted(expected)]))
+
+    # Replaying a frame moves the particles of another system and keeps its broad phase up to date.
+    other = make_system(60, zone=(300, 300, 280), seed=9, bulk=True)
+    replayer.apply(other, 45)
+    assert np.array_equal(other.store.centers(), expected[45])
+    for particle in other.particles:
+        assert particle in other.grid.query_circle(particle)
+    replayer.close()
@@ -0,0 +1,71 @@
+import pytest
+from scheduler import Scheduler
+
+
+class FakeClock:
+    def __init__(self):
+        self.time = 0.0
+
+    def __call__(self):
+        return self.time
+
+
+# A scheduler at 8 ticks per second (the timesteps add up exactly) recording its ticks and the alpha of its frames.
+def make_scheduler(**options):
+    clock = FakeClock()
+    ticks = []
+    alphas = []
+    scheduler = Scheduler(lambda: ticks.append(clock.time), alphas.append, rate=8, clock=clock, **options)
+    return scheduler, clock, ticks, alphas
+
+
+def test_ticks_follow_the_clock():
+    scheduler, clock, ticks, alphas = make_scheduler()
+    for i in range(33):
+        clock.time = i / 16
+        scheduler.frame()
+    assert scheduler.ticks == len(ticks) == 16
+    assert scheduler.frames == len(alphas) == 33
+    assert alphas == [0] + [0.5, 0] * 16
+    assert not scheduler.behind()
+
+
+def test_alpha():
+    scheduler, clock, ticks, alphas = make_scheduler()
+    scheduler.frame()
+    clock.time = 0.1875
+    scheduler.frame()
+    assert len(ticks) == 1 and alphas[-1] == 0.5
+    assert scheduler.delay() == 62
+    clock.time = 0.25
+    scheduler.frame()
+    assert len(ticks) == 2 and alphas[-1] == 0
+
+
+def test_catch_up_is_capped():
+    scheduler, clock, ticks, alphas = make_scheduler(max_ticks=5, max_skipped=2)
+    scheduler.frame()
+    clock.time = 2
+    scheduler.frame()
+    assert len(ticks) == 5 and scheduler.behind() and len(alphas) == 1
+    scheduler.frame()
+    assert len(ticks) == 10 and scheduler.behind() and len(alphas) == 1
+    assert scheduler.skipped_frames == 2
+
+    # The third frame in a row is rendered and the ticks still due are dropped.
+    scheduler.frame()
+    assert len(ticks) == 15 and len(alphas) == 2 and alphas[-1] == 0
+    assert scheduler.dropped_ticks == 1
+    clock.time = 2.125
+    scheduler.frame()
+    assert len(ticks) == 16 and not scheduler.behind()
+
+
+def test_rates():
+    scheduler, clock, ticks, alphas = make_scheduler(window=1)
+    assert scheduler.tick_rate() == scheduler.frame_rate() == 0
+    for i in range(17):
+        clock.time = i / 16
+        scheduler.frame()
+    assert scheduler.tick_rate() == pytest.approx(8)
+    assert scheduler.frame_rate() == pytest.approx(17)
@@ -0,0 +1,62 @@
+import contextlib
+import io
+import math
+import numpy as np
+import pytest
+import formula
+from grid import HashGrid
+from linear import LinearQuadtree
+from node import Quadtree
+
+BROAD_PHASES = [(Quadtree, {}), (Quadtree, {"loose": True}), (HashGrid, {}), (LinearQuadtree, {})]
+
+
+# The tests of Particle.search, one pair at a time.
+def in_field_of_view(particle, target):
+    vector = target.get_center() - particle.get_center()
+    squared_distance = np.dot(vector, vector)
+    distance = math.sqrt(squared_distance)
+    angle = formula.angle_between(particle.direction(), vector) - math.degrees(
+        math.acos((2 * squared_distance - math.pow(target.get_radius(), 2)) / (2 * squared_distance)))
+    half_angle = particle.field_of_view[1] / 2
+    limit = particle.field_of_view[0] + target.get_radius()
+    return (angle < half_angle or math.isclose(angle, half_angle)) \
+        and (distance < limit or math.isclose(distance, limit))
+
+
+@pytest.mark.parametrize("zone", [(500, 500, 480), (500, 500, 900, 400)])
+def test_search_all(make_system, zone):
+    particle_system = make_system(300, zone=zone, seed=2, bulk=True, random_radius=True, min_radius=2, max_radius=9)
+    for particle in particle_system.particles[::3]:
+        particle.field_of_view = np.array([np.random.uniform(5, 250), np.random.uniform(1, 360)])
+        particle.set_rotation(np.random.random() * 360)
+
+    offsets, targets = particle_system.search_all()
+    for i, particle in enumerate(particle_system.particles):
+        found = targets[offsets[i]:offsets[i + 1]].tolist()
+        if particle.field_of_view is None:
+            assert found == []
+            continue
+        expected = [j for j, target in enumerate(particle_system.particles)
+                    if j != i and in_field_of_view(particle, target)]
+        assert sorted(found) == expected
+        gaps = [particle.distance_from_circle(particle_system.particles[j]) for j in found]
+        assert np.all(np.diff(gaps) >= -1e-09)
+
+
+@pytest.mark.parametrize("zone", [(500, 500, 480), (500, 500, 900, 400)])
+@pytest.mark.parametrize("broad_phase,options", BROAD_PHASES)
+def test_search_all_matches_search(make_system, zone, broad_phase, options):
+    particle_system = make_system(800, zone=zone, broad_phase=broad_phase, options=options, seed=2, bulk=True,
+                                  random_radius=True, min_radius=2, max_radius=9)
+    for particle in particle_system.particles[::2]:
+        particle.field_of_view = np.array([np.random.uniform(5, 150), np.random.uniform(1, 360)])
+        particle.set_rotation(np.random.random() * 360)
+
+    offsets, targets = particle_system.search_all()
+    for i, particle in enumerate(particle_system.particles):
+        if particle.field_of_view is None:
+            continue
+        with contextlib.redirect_stdout(io.StringIO()):
+            searched = [target.get_index() for target in particle.search()]
+        assert sorted(targets[offsets[i]:offsets[i + 1]].tolist()) == sorted(searched), i
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+import formula
+from grid import HashGrid
+from linear import LinearQuadtree
+from node import Quadtree
+from shared import SharedParticleStore
+
+
+@pytest.mark.parametrize("broad_phase", [Quadtree, HashGrid, LinearQuadtree])
+def test_share(make_system, broad_phase):
+    particle_system = make_system(300, broad_phase=broad_phase, bulk=True)
+    centers = particle_system.store.centers().copy()
+
+    # The broad phase is built (and may cache the arrays of the store) before the particles are shared.
+    for particle in particle_system.particles:
+        assert particle in particle_system.grid.query_circle(particle)
+    store = particle_system.share()
+    try:
+        assert particle_system.store is store
+        assert np.array_equal(store.centers(), centers)
+        for i in range(5):
+            particle_system.step()
+        for particle in particle_system.particles:
+            assert particle in particle_system.grid.query_circle(particle)
+        assert len(formula.colliding_pairs(store.centers(), store.radii(), touching=False)[0]) == 0
+    finally:
+        store.close()
+
+
+def test_attach_reads_the_live_state():
+    store = SharedParticleStore(4)
+    try:
+        index = store.allocate()
+        store.centers()[index] = (1, 2)
+        attached = SharedParticleStore.attach(store.get_name())
+        assert len(attached) == 1
+        assert np.array_equal(attached.centers()[0], [1, 2])
+        with pytest.raises(ValueError):
+            attached.centers()[0] = (3, 4)
+        attached.close()
+    finally:
+        store.close()
@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("tkinter")
+from view import TkRenderer
+
+
+class FakeTk:
+    def __init__(self):
+        self.scripts = []
+
+    def eval(self, script):
+        self.scripts.append(script)
+
+
+# The items created on a canvas are numbered, the Tcl scripts are recorded instead of being run.
+class FakeCanvas:
+    def __init__(self):
+        self.tk = FakeTk()
+        self.items = 0
+
+    def __str__(self):
+        return ".canvas"
+
+    def create_oval(self, *args, **options):
+        self.items += 1
+        return self.items
+
+
+# Commands of the script of a frame by item: the bounds of the coords command and the style of the itemconfigure one.
+def parse(script):
+    coords = {}
+    styles = {}
+    for line in script.split("\n"):
+        words = line.split()
+        assert words[0] == ".canvas"
+        if words[1] == "coords":
+            coords[int(words[2])] = [float(word) for word in words[3:]]
+        else:
+            assert words[1] == "itemconfigure"
+            styles[int(words[2])] = line
+    return coords, styles
+
+
+def drawn_system(make_system, interpolate=False):
+    particle_system = make_system(60, bulk=True)
+    canvas = FakeCanvas()
+    particle_system.draw_particles(canvas)
+    renderer = TkRenderer(canvas, interpolate)
+    particle_system.subscribe(renderer)
+    return particle_system, canvas, renderer
+
+
+def test_flush(make_system):
+    particle_system, canvas, renderer = drawn_system(make_system)
+    centers = particle_system.store.centers().copy()
+    particle_system.step()
+    moved = np.flatnonzero((particle_system.store.centers() != centers).any(axis=1))
+    renderer.render()
+    assert len(canvas.tk.scripts) == 1
+    coords, styles = parse(canvas.tk.scripts[-1])
+    assert sorted(coords) == sorted(particle_system.particles[i].get_item() for i in moved)
+    for i in moved:
+        particle = particle_system.particles[i]
+        assert np.allclose(coords[particle.get_item()], particle.bounds())
+    assert styles == {}
+
+    # The style of a particle is only sent when it changes.
+    particle = particle_system.particles[0]
+    renderer.mark(particle, fill="red")
+    renderer.render()
+    coords, styles = parse(canvas.tk.scripts[-1])
+    assert list(coords) == list(styles) == [particle.get_item()]
+    assert styles[particle.get_item()] == ".canvas itemconfigure 1 -fill {red} -outline {black}"
+    renderer.mark(particle, fill="red")
+    renderer.render()
+    coords, styles = parse(canvas.tk.scripts[-1])
+    assert list(coords) == [particle.get_item()] and styles == {}
+    renderer.render()
+    assert len(canvas.tk.scripts) == 3
+
+
+def test_interpolation(make_system):
+    particle_system, canvas, renderer = drawn_system(make_system, interpolate=True)
+    centers = particle_system.store.centers().copy()
+    particle_system.step()
+    renderer.render(1)
+    first = np.flatnonzero((particle_system.store.centers() != centers).any(axis=1))
+
+    # The particles that moved in the last step are drawn between their positions, the ones that moved in the step
+    # before at their final position.
+    before = particle_system.store.centers().copy()
+    particle_system.step()
+    after = particle_system.store.centers()
+    second = np.flatnonzero((after != before).any(axis=1))
+    assert len(second) > 0
+    renderer.render(0.25)
+    coords, styles = parse(canvas.tk.scripts[-1])
+    indices = np.union1d(first, second)
+    assert sorted(coords) == sorted(particle_system.particles[i].get_item() for i in indices)
+    radii = particle_system.store.radii()
+    for i in indices:
+        center = before[i] + 0.25 * (after[i] - before[i])
+        expected = np.concatenate((center - radii[i], center + radii[i]))
+        assert np.allclose(coords[particle_system.particles[i].get_item()], expected)
@@ -0,0 +1,138 @@
+import formula
+import numpy as np
+import tkinter as tk
+from particle import ParticleSystem, SystemObserver
+from random import seed
+from scheduler import Scheduler
+
+
+# Draw the changes of a particle system on a tkinter canvas. The particles that changed are only marked as dirty, and
+# render flushes them once per frame: their coordinates and the styles that changed are sent in a single Tcl script.
+# When interpolating, the particles moved by the steps are drawn between their positions before and after the last
+# step.
+class TkRenderer(SystemObserver):
+    def __init__(self, canvas, interpolate=False):
+        self.canvas = canvas
+        self._interpolate = interpolate
+        self._system = None
+        self._previous = None
+        self._current = None
+        self._moving = np.empty(0, dtype=np.int64)
+        self._stale = np.empty(0, dtype=np.int64)
+        self._dirty = {}
+
+    # Draw a particle with the given style at the next flush (at its center unless the bounds are given).
+    def mark(self, particle, fill="", outline="black", bounds=None):
+        if particle.get_item():
+            self._dirty[particle] = (bounds if bounds is not None else particle.bounds(), fill, outline)
+
+    def flush(self):
+        path = str(self.canvas)
+        commands = []
+        for particle, (bounds, fill, outline) in self._dirty.items():
+            item = particle.get_item()
+            commands.append("{} coords {} {!r} {!r} {!r} {!r}".format(path, item, *map(float, bounds)))
+            if particle.get_style() != (fill, outline):
+                commands.append("{} itemconfigure {} -fill {{{}}} -outline {{{}}}".format(path, item, fill, outline))
+                particle.set_style(fill, outline)
+        if len(commands) > 0:
+            self.canvas.tk.eval("\n".join(commands))
+        self._dirty.clear()
+
+    def on_move(self, particle, departure, confined):
+        if not confined:
+            x, y = particle.get_center()
+            radius = particle.get_radius()
+            self.canvas.create_oval(x - radius, y - radius, x + radius, y + radius, fill="red")
+        self.mark(particle)
+
+    def on_search(self, particle, targets, searched):
+        center = particle.get_center()
+        field_of_view = particle.field_of_view
+
+        # Get the central vision.
+        facing_direction_vector = particle.direction()
+        # central_vision_extent = center + facing_direction_vector
+
+        # Get the left outer boundary of the peripheral vision.
+        left_outer_boundary_vector = formula.rotate_vector(facing_direction_vector, field_of_view[1] / 2)
+        left_outer_boundary_extent = center + left_outer_boundary_vector
+
+        # Get the right outer boundary of the peripheral vision.
+        right_outer_boundary_vector = formula.rotate_vector(facing_direction_vector, -field_of_view[1] / 2)
+        right_outer_boundary_extent = center + right_outer_boundary_vector
+
+        # Draw the field of view.
+        self.canvas.create_line(center[0], center[1], left_outer_boundary_extent[0], left_outer_boundary_extent[1],
+                                fill="blue", width=2)
+        self.canvas.create_line(center[0], center[1], right_outer_boundary_extent[0], right_outer_boundary_extent[1],
+                                fill="blue", width=2)
+        # self.canvas.create_line(center[0], center[1], central_vision_extent[0], central_vision_extent[1],
+        # fill="blue", width=2)
+        self.canvas.create_arc(center[0] - field_of_view[0], center[1] - field_of_view[0],
+                               center[0] + field_of_view[0], center[1] + field_of_view[0],
+                               outline="blue", width=2, style=tk.ARC,
+                               start=360 - (particle.get_rotation() + field_of_view[1] / 2), extent=field_of_view[1])
+
+        for target in targets:
+            self.mark(target, fill="red")
+        self.mark(particle, fill="blue")
+        print()
+        print("SEARCH")
+        print("Particles (selected/searched): {}/{}".format(len(targets), searched))
+
+    def on_step(self, system, moved):
+        self._system = system
+        if not self._interpolate:
+            for index in moved:
+                self.mark(system.particles[index])
+            return
+        centers = system.store.centers()
+
+        # The first step (or the first one after particles were added) is not interpolated.
+        if self._current is None or len(self._current) != len(centers):
+            self._current = centers.copy()
+        self._previous = self._current
+        self._current = centers.copy()
+
+        # The particles that moved during the step before have to be drawn at their final position.
+        self._stale = np.union1d(self._stale, self._moving)
+        self._moving = moved
+
+    # Draw the dirty particles, the moving ones at the given fraction of the last step.
+    def render(self, alpha=1):
+        if self._interpolate and self._current is not None:
+            indices = np.union1d(self._stale, self._moving)
+            centers = self._previous[indices] + alpha * (self._current[indices] - self._previous[indices])
+            radii = self._system.store.radii()[indices][:, np.newaxis]
+            bounds = np.hstack((centers - radii, centers + radii)).tolist()
+            for index, particle_bounds in zip(indices.tolist(), bounds):
+                particle = self._system.particles[index]
+                fill, outline = self._dirty[particle][1:] if particle in self._dirty else ("", "black")
+                self.mark(particle, fill, outline, particle_bounds)
+            self._stale = np.empty(0, dtype=np.int64)
+        self.flush()
+
+
+def animate():
+    scheduler.frame()
+    master.title("Particles - {:.0f} ticks/s, {:.0f} frames/s{}".format(
+        scheduler.tick_rate(), scheduler.frame_rate(), " (behind)" if scheduler.behind() else ""))
+    master.after(scheduler.delay(), animate)
+
+
+if __name__ == "__main__":
+    seed()
+    master = tk.Tk()
+    canvas = tk.Canvas(master, width=1000, height=1000)
+    canvas.pack()
+    particle_system = ParticleSystem()
+    renderer = TkRenderer(canvas, interpolate=True)
+    particle_system.subscribe(renderer)
+    scheduler = Scheduler(particle_system.step, renderer.render, rate=60)
+    particle_system.make_circle(500, 500, 200)
+    particle_system.add_particles(50)
+    particle_system.draw(canvas)
+    particle_system.draw_particles(canvas)
+    animate()
+    master.mainloop()